@@ -0,0 +1,184 @@
+# Quick Export Plugin for Krita
+# Based on Quick Export Layers Docker by fullmontis (public domain)
+
+# Offline export benchmark. Drives QuickExportDocker through a set of export
+# scenarios against the stub krita module next to this file, and reports the
+# wall time and the Krita API calls (clones, scales, saves, ...) of each.
+#
+#   python benchmarks/benchmark.py
+#   python benchmarks/benchmark.py --canvas 4096 --save-cost 0.02 --scenario "100 layers"
+#
+# Simulated costs are in seconds per megapixel, so the numbers show how the
+# export paths scale rather than how fast Krita itself is. Parallel encoding
+# scenarios encode real PNG and JPEG files with Qt.
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARK_DIR))
+sys.path.insert(0, BENCHMARK_DIR)
+
+from PyQt5.QtWidgets import QApplication
+
+import krita  # The stub in this folder
+
+
+PNG, JPEG, JXL, KRA, PSD = range(5)
+
+ONE_ROW = [(1.0, PNG)]
+SIX_ROWS = [(1.0, PNG), (0.5, PNG), (0.25, PNG), (1.0, JPEG), (0.5, JPEG), (0.25, JPEG)]
+
+LAYERS = {"exportLayersSeparately": True}
+NESTED = {"exportLayersSeparately": True, "groupAsLayer": False}
+
+# (name, makeDocument() arguments, format rows as (scale, format index), docker checkboxes)
+SCENARIOS = [
+    ("flattened, 1 row", {"layers": 1}, ONE_ROW, {}),
+    ("flattened, 6 rows", {"layers": 1}, SIX_ROWS, {}),
+    ("1 layer, 1 row", {"layers": 1}, ONE_ROW, LAYERS),
+    ("1 layer, 6 rows", {"layers": 1}, SIX_ROWS, LAYERS),
+    ("100 layers, 1 row", {"layers": 100}, ONE_ROW, LAYERS),
+    ("100 layers, 6 rows", {"layers": 100}, SIX_ROWS, LAYERS),
+    ("100 layers, 6 rows, parallel", {"layers": 100}, SIX_ROWS,
+     dict(LAYERS, parallelEncoding=True)),
+    ("100 layers, 6 rows, cropped", {"layers": 100, "cropped": True}, SIX_ROWS,
+     dict(LAYERS, cropToContent=True)),
+    ("100 layers, 6 rows, atlas", {"layers": 100, "cropped": True}, SIX_ROWS,
+     dict(LAYERS, atlas=True)),
+    ("100 layers, 1 row, unchanged", {"layers": 100}, ONE_ROW,
+     dict(LAYERS, skipUnchanged=True, warmup=True)),
+    ("100 layers, 6 rows, zip", {"layers": 100}, SIX_ROWS, dict(LAYERS, archive="zip")),
+    ("nested groups, 1 row", {"layers": 64, "group_depth": 3}, ONE_ROW, NESTED),
+    ("nested groups, 6 rows", {"layers": 64, "group_depth": 3}, SIX_ROWS, NESTED),
+]
+
+REPORTED_CALLS = ["clone", "scale", "refresh", "save", "saveAs", "exportImage", "pixelData", "close"]
+
+
+def configureDocker(docker, directory, rows, options):
+    """Set the docker's widgets up for one scenario"""
+    document = krita.Application.activeDocument()
+    docker.directoryTextField.setText(directory)
+    docker.filenameTextField.setText("benchmark")
+    for name in ["exportLayersSeparately", "groupAsLayer", "cropToContent",
+                 "parallelEncoding", "skipUnchanged", "tiledExport", "profile", "atlas"]:
+        getattr(docker, name + "CheckBox").setChecked(options.get(name, name == "groupAsLayer"))
+    docker.archiveComboBox.setCurrentIndex(docker.archiveComboBox.findData(options.get("archive", "")))
+
+    while len(docker._formatRows) < len(rows):
+        docker.addFormatRow()
+    while len(docker._formatRows) > len(rows):
+        docker.removeFormatRow(docker._formatRows[-1])
+    for formatRow, (scale, formatIndex) in zip(docker._formatRows, rows):
+        formatRow.updateFromDocument(document.width(), document.height())
+        formatRow.widthInput.setText(str(max(1, int(round(document.width() * scale)))))
+        formatRow.heightInput.setText(str(max(1, int(round(document.height() * scale)))))
+        formatRow.setFormatIndex(formatIndex)
+
+
+def runExport(app, docker, timeout):
+    """Start an export and pump the event loop until the engine finishes"""
+    started = time.perf_counter()
+    docker.exportAction()
+    while docker._isExporting:
+        if time.perf_counter() - started > timeout:
+            docker.cancelExport()
+        app.processEvents()
+        time.sleep(0.001)
+    return time.perf_counter() - started
+
+
+def runScenario(app, docker, scenario, args):
+    name, documentOptions, rows, options = scenario
+    documentOptions = dict(documentOptions, width=args.canvas, height=args.canvas)
+    krita.Application.document = krita.makeDocument(**documentOptions)
+    docker.updateFormatRowsFromDocument()
+
+    timings = []
+    calls = {}
+    for _ in range(args.repeat):
+        directory = tempfile.mkdtemp(prefix="quickexport-benchmark-")
+        try:
+            configureDocker(docker, directory, rows, options)
+            if options.get("warmup"):
+                runExport(app, docker, args.timeout)
+            krita.resetCalls()
+            timings.append(runExport(app, docker, args.timeout))
+            calls = dict(krita.CALLS)
+            files = sum(len([f for f in fileNames if not f.startswith(".")])
+                        for _, _, fileNames in os.walk(directory))
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    return {
+        "scenario": name,
+        "seconds": min(timings),
+        "median": sorted(timings)[len(timings) // 2],
+        "files": files,
+        "message": docker.exportMessage.text().splitlines()[0],
+        "calls": {key: calls.get(key, 0) for key in REPORTED_CALLS},
+    }
+
+
+def printHeader():
+    header = f"{'scenario':34} {'best':>8} {'median':>8} {'files':>6} " + \
+             " ".join(f"{key:>9}" for key in REPORTED_CALLS)
+    print(header)
+    print("-" * len(header))
+
+
+def printResult(result):
+    print(f"{result['scenario']:34} {result['seconds']:8.3f} {result['median']:8.3f} "
+          f"{result['files']:6} " +
+          " ".join(f"{result['calls'][key]:9}" for key in REPORTED_CALLS), flush=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark Quick Export against a stub Krita API.")
+    parser.add_argument("--scenario", action="append", default=[],
+                        help="Only run scenarios whose name contains this text (repeatable)")
+    parser.add_argument("--canvas", type=int, default=1024, help="Canvas width and height in pixels")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per scenario, the best is reported")
+    parser.add_argument("--clone-cost", type=float, default=0.01, help="Seconds per megapixel")
+    parser.add_argument("--scale-cost", type=float, default=0.02, help="Seconds per megapixel")
+    parser.add_argument("--refresh-cost", type=float, default=0.01, help="Seconds per megapixel")
+    parser.add_argument("--save-cost", type=float, default=0.005, help="Seconds per megapixel")
+    parser.add_argument("--timeout", type=float, default=300.0, help="Cancel an export after this many seconds")
+    parser.add_argument("--json", help="Also write the results to this JSON file")
+    args = parser.parse_args(argv)
+
+    krita.COSTS.update({
+        "clone": (0.0, args.clone_cost),
+        "scale": (0.0, args.scale_cost),
+        "refresh": (0.0, args.refresh_cost),
+        "save": (0.0, args.save_cost),
+    })
+
+    app = QApplication.instance() or QApplication([])
+    from quickexportdocker.quickexportdocker import QuickExportDocker
+    docker = QuickExportDocker()
+
+    scenarios = [scenario for scenario in SCENARIOS
+                 if not args.scenario or any(text in scenario[0] for text in args.scenario)]
+    results = []
+    printHeader()
+    for scenario in scenarios:
+        results.append(runScenario(app, docker, scenario, args))
+        printResult(results[-1])
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=1)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,342 @@
+# Quick Export Plugin for Krita
+# Based on Quick Export Layers Docker by fullmontis (public domain)
+
+# Stand-in for Krita's krita module, just enough of the API for the plugin's
+# export paths to run outside Krita. Documents hold no real image data:
+# pixels are a repeating colour per layer and saved files are tiny, while
+# clone, scale, refresh and save sleep for a configurable simulated cost.
+# Every API call that matters for performance is counted in CALLS.
+
+import builtins
+import itertools
+import threading
+import time
+
+from PyQt5.QtCore import QByteArray, QObject, QRect, pyqtSignal
+from PyQt5.QtGui import QIcon
+from PyQt5.QtWidgets import QDockWidget
+
+
+# Simulated cost of each operation: (seconds per call, seconds per megapixel)
+COSTS = {
+    "clone": (0.0, 0.0),
+    "scale": (0.0, 0.0),
+    "refresh": (0.0, 0.0),
+    "save": (0.0, 0.0),
+}
+
+CALLS = {}
+_callsLock = threading.Lock()
+_nodeIds = itertools.count(1)
+
+
+def countCall(name):
+    with _callsLock:
+        CALLS[name] = CALLS.get(name, 0) + 1
+
+
+def resetCalls():
+    with _callsLock:
+        CALLS.clear()
+
+
+def simulateCost(name, pixels):
+    fixed, perMegapixel = COSTS.get(name, (0.0, 0.0))
+    seconds = fixed + perMegapixel * pixels / 1e6
+    if seconds > 0:
+        time.sleep(seconds)
+
+
+class DockWidget(QDockWidget):
+    def canvasChanged(self, canvas):
+        pass
+
+
+class DockWidgetFactoryBase(object):
+    DockRight = 1
+
+
+class DockWidgetFactory(object):
+    def __init__(self, *args):
+        pass
+
+
+class InfoObject(object):
+    def __init__(self):
+        self._properties = {}
+
+    def setProperty(self, key, value):
+        self._properties[key] = value
+
+    def property(self, key):
+        return self._properties.get(key)
+
+    def properties(self):
+        return dict(self._properties)
+
+
+class Node(object):
+    """A layer; bounds is an (x, y, width, height) tuple, None for the whole canvas"""
+
+    def __init__(self, name, node_type="paintlayer", children=(), visible=True,
+                 bounds=None, color=1):
+        self._name = name
+        self._type = node_type
+        self._children = list(children)
+        self._visible = visible
+        self._bounds = bounds
+        self._color = color
+        self._id = next(_nodeIds)
+        self._parent = None
+        self.document = None
+        for child in self._children:
+            child._parent = self
+
+    def name(self):
+        return self._name
+
+    def type(self):
+        return self._type
+
+    def visible(self):
+        return self._visible
+
+    def childNodes(self):
+        return list(self._children)
+
+    def parentNode(self):
+        return self._parent
+
+    def uniqueId(self):
+        return self._id
+
+    def bounds(self):
+        if self._bounds is None:
+            return QRect(0, 0, self.document.width(), self.document.height())
+        x, y, width, height = self._bounds
+        scaleX = self.document.width() / self.document.originalWidth
+        scaleY = self.document.height() / self.document.originalHeight
+        return QRect(int(x * scaleX), int(y * scaleY),
+                     max(1, int(width * scaleX)), max(1, int(height * scaleY)))
+
+    def colorModel(self):
+        return "RGBA"
+
+    def colorDepth(self):
+        return "U8"
+
+    def projectionPixelData(self, x, y, width, height):
+        countCall("pixelData")
+        pixel = bytes([(self._color * 37 + i * 61) % 256 for i in range(3)]) + b"\xff"
+        return QByteArray(pixel * (width * height))
+
+    pixelData = projectionPixelData
+
+    def save(self, path, x_res, y_res, info, rect):
+        countCall("save")
+        simulateCost("save", rect.width() * rect.height())
+        with open(path, "wb") as f:
+            f.write(b"\0" * 16)
+        return True
+
+    def copyTree(self):
+        """Copy of this node and its children keeping ids, like Document.clone()"""
+        copy = Node(self._name, self._type, [child.copyTree() for child in self._children],
+                    self._visible, self._bounds, self._color)
+        copy._id = self._id
+        return copy
+
+
+class Document(object):
+    def __init__(self, root, width, height, file_name="/tmp/benchmark.kra", resolution=300):
+        self._root = root
+        self._width = width
+        self._height = height
+        self._fileName = file_name
+        self._resolution = resolution
+        self.originalWidth = width
+        self.originalHeight = height
+        self._attach(root)
+
+    def _attach(self, node):
+        node.document = self
+        for child in node._children:
+            self._attach(child)
+
+    def rootNode(self):
+        return self._root
+
+    def activeNode(self):
+        return self._root
+
+    def width(self):
+        return self._width
+
+    def height(self):
+        return self._height
+
+    def resolution(self):
+        return self._resolution
+
+    def xRes(self):
+        return float(self._resolution)
+
+    def yRes(self):
+        return float(self._resolution)
+
+    def fileName(self):
+        return self._fileName
+
+    def colorModel(self):
+        return "RGBA"
+
+    def colorDepth(self):
+        return "U8"
+
+    def colorProfile(self):
+        return "sRGB-elle-V2-srgbtrc.icc"
+
+    def setBatchmode(self, value):
+        pass
+
+    def clone(self):
+        countCall("clone")
+        simulateCost("clone", self._width * self._height)
+        copy = Document(self._root.copyTree(), self._width, self._height,
+                        self._fileName, self._resolution)
+        copy.originalWidth = self.originalWidth
+        copy.originalHeight = self.originalHeight
+        return copy
+
+    def scaleImage(self, width, height, x_res, y_res, filter_name):
+        countCall("scale")
+        simulateCost("scale", max(self._width * self._height, width * height))
+        self._width = width
+        self._height = height
+        return True
+
+    def refreshProjection(self):
+        countCall("refresh")
+        simulateCost("refresh", self._width * self._height)
+
+    def waitForDone(self):
+        pass
+
+    def saveAs(self, path):
+        countCall("saveAs")
+        simulateCost("save", self._width * self._height)
+        with open(path, "wb") as f:
+            f.write(b"\0" * 16)
+        return True
+
+    def exportImage(self, path, info):
+        countCall("exportImage")
+        simulateCost("save", self._width * self._height)
+        with open(path, "wb") as f:
+            f.write(b"\0" * 16)
+        return True
+
+    def close(self):
+        countCall("close")
+        return True
+
+
+class Notifier(QObject):
+    imageSaved = pyqtSignal(str)
+    imageClosed = pyqtSignal(str)
+
+
+class _Application(object):
+    """The Krita instance; set document to the document the plugin should export.
+
+    otherDocuments are open too, but not active.
+    """
+
+    def __init__(self):
+        self.document = None
+        self.otherDocuments = []
+        self.settings = {}
+        self._notifier = None
+
+    def activeDocument(self):
+        return self.document
+
+    def documents(self):
+        return ([self.document] if self.document else []) + list(self.otherDocuments)
+
+    def openDocument(self, path):
+        return self.document
+
+    def icon(self, name):
+        return QIcon()
+
+    def setBatchmode(self, value):
+        pass
+
+    def batchmode(self):
+        return True
+
+    def readSetting(self, group, name, default):
+        return self.settings.get((group, name), default)
+
+    def writeSetting(self, group, name, value):
+        self.settings[(group, name)] = value
+
+    def addDockWidgetFactory(self, factory):
+        pass
+
+    def notifier(self):
+        if self._notifier is None:
+            self._notifier = Notifier()
+        return self._notifier
+
+
+Application = _Application()
+
+
+class Krita(object):
+    @staticmethod
+    def instance():
+        return Application
+
+
+# Krita's Python plugins see these as builtins
+builtins.Application = Application
+builtins.Krita = Krita
+builtins.i18n = lambda text: text
+
+
+def makeDocument(layers=1, width=1024, height=1024, group_depth=0, group_width=2,
+                 cropped=False):
+    """Build a document with a number of paint layers.
+
+    With group_depth, the layers are spread over nested groups group_width
+    wide at every level. With cropped, each layer covers a different
+    quarter-sized area instead of the whole canvas.
+    """
+    colors = itertools.count(1)
+
+    def makeLayer(index):
+        bounds = None
+        if cropped:
+            quarterWidth, quarterHeight = max(1, width // 4), max(1, height // 4)
+            bounds = ((index * 37) % (width - quarterWidth + 1),
+                      (index * 53) % (height - quarterHeight + 1),
+                      quarterWidth, quarterHeight)
+        return Node(f"Layer {index}", bounds=bounds, color=next(colors))
+
+    def makeChildren(count, depth, prefix, start):
+        if depth == 0 or count <= group_width:
+            return [makeLayer(start + i) for i in range(count)]
+        perGroup = -(-count // group_width)
+        children = []
+        for i in range(group_width):
+            first = start + i * perGroup
+            groupCount = max(0, min(perGroup, count - i * perGroup))
+            if groupCount:
+                children.append(Node(f"{prefix}{i}", "grouplayer",
+                                     makeChildren(groupCount, depth - 1, f"{prefix}{i}_", first)))
+        return children
+
+    root = Node("root", "grouplayer", makeChildren(layers, group_depth, "Group ", 0))
+    return Document(root, width, height)
@@ -0,0 +1,184 @@
+# Quick Export Plugin for Krita
+# Based on Quick Export Layers Docker by fullmontis (public domain)
+
+# Headless batch export of .kra files with a preset saved from the docker.
+#
+#   kritarunner -s quickexportdocker.batchexport -- --preset preset.json --jobs 4 *.kra
+#
+# Every document is exported by its own Krita process, so N jobs export N
+# documents at once. Each worker opens, exports and closes one file and
+# reports back a single result line; the main process prints a summary.
+# From Krita's scripter, batchExport() does the same.
+
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import krita
+
+from .exportengine import runTasks
+from .exportplan import formatBytes
+from .exportsession import ExportSession, loadPreset
+
+
+RESULT_PREFIX = "QUICKEXPORT-RESULT "
+
+
+def exportDocument(path, preset):
+    """Open a document, export it with the preset, close it and report what happened"""
+    started = time.monotonic()
+    result = {"file": path, "status": "ok", "files": 0, "skipped": 0, "error": ""}
+    application = krita.Krita.instance()
+    document = application.openDocument(path)
+    if document is None:
+        result.update(status="failed", error="Could not open document")
+        result["seconds"] = time.monotonic() - started
+        return result
+
+    session = None
+    try:
+        document.setBatchmode(True)
+        session = ExportSession(document, dict(preset, filename=""))
+        error = session.validate()
+        if error:
+            raise RuntimeError(error)
+        tasks = session.start()
+        runTasks(tasks, session.maxPending)
+        # Outputs kept from an interrupted run count as skipped
+        result["skipped"] = session.skippedCount + session.resumedCount
+        # Identical outputs are linked or copied, not written, and counted on their own
+        result["deduped"] = session.dedupedCount
+        result["files"] = len(tasks) - result["skipped"] - result["deduped"]
+        result["notes"] = list(session.preflightNotes)
+        if session.overBudget:
+            result["notes"].append(f"{len(session.overBudget)} files over their size limit")
+    except Exception as e:
+        result.update(status="failed", error=str(e))
+    finally:
+        if session is not None:
+            # Encodes still running after a failure read the buffers finish() releases
+            session.encoder.shutdown()
+        if session is not None and session.plan is not None:
+            session.finish(result["status"] == "ok")
+            if session.collidedCount:
+                result.setdefault("notes", []).append(
+                    f"{session.collidedCount} files left out of the archive, a later file has the same name")
+            if session.preset["profile"]:
+                result["profile"] = session.profiler.summary()
+        if session is not None:
+            # The worker exits after this document, let its optimizer passes finish first
+            session.optimizer.shutdown()
+            if session.optimizeStats.queued:
+                result["optimizedBytes"] = session.optimizeStats.bytesSaved
+        document.close()
+    result["seconds"] = time.monotonic() - started
+    return result
+
+
+def runWorker(runner, preset_path, path):
+    """Export one document in a separate Krita process and parse its result line"""
+    started = time.monotonic()
+    command = [runner, "-s", "quickexportdocker.batchexport", "--",
+               "--worker", "--preset", preset_path, path]
+    process = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                             universal_newlines=True)
+    for line in process.stdout.splitlines():
+        if line.startswith(RESULT_PREFIX):
+            return json.loads(line[len(RESULT_PREFIX):])
+    lastLines = process.stdout.strip().splitlines()[-3:]
+    return {"file": path, "status": "failed", "files": 0, "skipped": 0,
+            "seconds": time.monotonic() - started,
+            "error": f"Worker exited with code {process.returncode}: {' / '.join(lastLines)}"}
+
+
+def printResult(result):
+    line = (f"{result['status']:6} {result['seconds']:8.2f}s {result['files']:5} files "
+            f"{result['skipped']:5} skipped  {result['file']}")
+    if result.get("deduped"):
+        line += f"  ({result['deduped']} identical)"
+    if "optimizedBytes" in result:
+        line += f"  ({formatBytes(result['optimizedBytes'])} saved by optimizing)"
+    for note in result.get("notes", []):
+        line += f"  ({note})"
+    if result["error"]:
+        line += f"  ({result['error']})"
+    if result.get("profile"):
+        line += f"\n       {result['profile']}"
+    print(line, flush=True)
+
+
+def batchExport(preset_path, paths, jobs=1, runner="kritarunner", output_dir=None):
+    """Export every document with the preset, jobs documents at a time, and print a summary"""
+    preset = loadPreset(preset_path)
+    if output_dir:
+        preset["directory"] = output_dir
+    started = time.monotonic()
+    results = []
+
+    if jobs <= 1:
+        for path in paths:
+            result = exportDocument(path, preset)
+            printResult(result)
+            results.append(result)
+    else:
+        # Workers read the preset from disk, so pass overrides along in a copy
+        with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as f:
+            json.dump(preset, f)
+            workerPresetPath = f.name
+        try:
+            with ThreadPoolExecutor(max_workers=jobs) as pool:
+                futures = [pool.submit(runWorker, runner, workerPresetPath, path) for path in paths]
+                for future in futures:
+                    result = future.result()
+                    printResult(result)
+                    results.append(result)
+        finally:
+            os.remove(workerPresetPath)
+
+    elapsed = time.monotonic() - started
+    failed = sum(1 for result in results if result["status"] != "ok")
+    written = sum(result["files"] for result in results)
+    deduped = sum(result.get("deduped", 0) for result in results)
+    identical = f", {deduped} identical" if deduped else ""
+    print(f"{len(results)} documents, {written} files written{identical}, {failed} failed "
+          f"in {elapsed:.2f}s ({len(results) / elapsed if elapsed > 0 else 0:.2f} documents/s)",
+          flush=True)
+    return results
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog="quickexportdocker.batchexport",
+                                     description="Export .kra files with a Quick Export preset")
+    parser.add_argument("--preset", required=True, help="preset JSON saved from the docker")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1,
+                        help="documents exported at the same time, each in its own Krita process")
+    parser.add_argument("--output", help="export directory, overrides the preset's")
+    parser.add_argument("--kritarunner", default=shutil.which("kritarunner") or "kritarunner",
+                        help="kritarunner executable used to start the workers")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("documents", nargs="+")
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        preset = loadPreset(args.preset)
+        for path in args.documents:
+            print(RESULT_PREFIX + json.dumps(exportDocument(path, preset)), flush=True)
+        return 0
+
+    results = batchExport(args.preset, args.documents, args.jobs, args.kritarunner, args.output)
+    return 1 if any(result["status"] != "ok" for result in results) else 0
+
+
+def __main__(args):
+    """Entry point called by kritarunner"""
+    return main([arg for arg in args if arg != "--"])
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,178 @@
+# Quick Export Plugin for Krita
+# Based on Quick Export Layers Docker by fullmontis (public domain)
+
+# Archive output: every exported file goes into one .zip or .tar instead of
+# its own file and folder, which is much faster on network shares and with
+# virus scanners watching the export directory. The archive is written to a
+# .part file next to its final name and only renamed into place, after one
+# fsync, when the whole export succeeded.
+
+import io
+import os
+import tarfile
+import threading
+import time
+import zipfile
+
+
+ARCHIVE_FORMATS = ["zip", "tar"]
+
+# Formats that are compressed already; deflating them again only costs time
+STORED_FORMATS = ["png", "jpg", "jxl", "kra"]
+
+
+class ChunkReader(io.RawIOBase):
+    """Read-only file object over a list of byte chunks, for tarfile.addfile()"""
+
+    def __init__(self, chunks):
+        self._chunks = [memoryview(chunk).cast("B") for chunk in chunks]
+        self._index = 0
+        self._offset = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        target = memoryview(buffer).cast("B")
+        written = 0
+        while written < len(target) and self._index < len(self._chunks):
+            chunk = self._chunks[self._index]
+            count = min(len(target) - written, len(chunk) - self._offset)
+            target[written:written + count] = chunk[self._offset:self._offset + count]
+            written += count
+            self._offset += count
+            if self._offset == len(chunk):
+                self._index += 1
+                self._offset = 0
+        return written
+
+
+class ExportArchive(object):
+    """A .zip or .tar the export streams its files into.
+
+    Files are added whole, from encoded chunks in memory or from a file on
+    disk, and keep their folder layout inside the archive. Encoder threads
+    add files too, so writes are serialized by a lock; memory use stays at
+    the files being encoded plus one copy block.
+    """
+
+    def __init__(self, path, archive_format="zip"):
+        self.path = path
+        self.format = archive_format
+        self.partPath = f"{path}.part"
+        self._lock = threading.Lock()
+        self._sizes = {}  # entry name -> size
+        self.duplicateNames = 0  # Files not added because their name was taken
+        self._file = open(self.partPath, "wb")
+        if archive_format == "tar":
+            self._archive = tarfile.open(fileobj=self._file, mode="w", format=tarfile.PAX_FORMAT)
+        else:
+            self._archive = zipfile.ZipFile(self._file, "w", zipfile.ZIP_DEFLATED, allowZip64=True)
+
+    def entryName(self, relative_path):
+        return os.path.normpath(relative_path).replace(os.sep, "/")
+
+    def isStored(self, relative_path):
+        return os.path.splitext(relative_path)[1][1:].lower() in STORED_FORMATS
+
+    def claimName(self, name):
+        """Reserve an entry name, False if the archive has it already (call with the lock held).
+
+        Archives can't replace an entry, and many tools fail on duplicate
+        names, so the first one stays. The session leaves out jobs a later
+        one would overwrite, these are only counted.
+        """
+        if name in self._sizes:
+            self.duplicateNames += 1
+            return False
+        self._sizes[name] = 0
+        return True
+
+    def writeChunks(self, relative_path, chunks):
+        """Add a file from a list of byte chunks, returning its size (0 if skipped)"""
+        name = self.entryName(relative_path)
+        size = sum(len(memoryview(chunk).cast("B")) for chunk in chunks)
+        with self._lock:
+            if not self.claimName(name):
+                return 0
+            if self.format == "tar":
+                info = tarfile.TarInfo(name)
+                info.size = size
+                info.mtime = time.time()
+                self._archive.addfile(info, io.BufferedReader(ChunkReader(chunks)))
+            else:
+                info = zipfile.ZipInfo(name, time.localtime()[:6])
+                info.compress_type = zipfile.ZIP_STORED if self.isStored(name) else zipfile.ZIP_DEFLATED
+                info.external_attr = 0o644 << 16
+                with self._archive.open(info, "w", force_zip64=size > 0x7fffffff) as entry:
+                    for chunk in chunks:
+                        entry.write(chunk)
+            self._sizes[name] = size
+        return size
+
+    def writeFile(self, relative_path, file_path):
+        """Add a file from disk, copying it in blocks, returning its size (0 if skipped)"""
+        name = self.entryName(relative_path)
+        size = os.path.getsize(file_path)
+        with self._lock:
+            if not self.claimName(name):
+                return 0
+            if self.format == "tar":
+                info = tarfile.TarInfo(name)
+                info.size = size
+                info.mtime = time.time()
+                with open(file_path, "rb") as f:
+                    self._archive.addfile(info, f)
+            else:
+                compressType = zipfile.ZIP_STORED if self.isStored(name) else zipfile.ZIP_DEFLATED
+                self._archive.write(file_path, name, compressType)
+            self._sizes[name] = size
+        return size
+
+    def writeLink(self, relative_path, target_relative_path):
+        """Add a tar hardlink to an entry already in the archive, returning the size of that entry"""
+        if self.format != "tar":
+            raise ValueError("Only tar archives can link entries")
+        name = self.entryName(relative_path)
+        targetName = self.entryName(target_relative_path)
+        with self._lock:
+            if targetName not in self._sizes:
+                raise ValueError(f"{targetName} is not in the archive")
+            if not self.claimName(name):
+                return 0
+            info = tarfile.TarInfo(name)
+            info.type = tarfile.LNKTYPE
+            info.linkname = targetName
+            info.mtime = time.time()
+            self._archive.addfile(info)
+            size = self._sizes[targetName]
+            self._sizes[name] = size
+        return size
+
+    def close(self):
+        """Finish the archive, flush it to disk once and move it into place"""
+        with self._lock:
+            if self._file is None:
+                return
+            self._archive.close()
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+            self._file = None
+            os.replace(self.partPath, self.path)
+
+    def abort(self):
+        """Close and delete an unfinished archive"""
+        with self._lock:
+            if self._file is None:
+                return
+            try:
+                self._archive.close()
+            except Exception:
+                pass
+            self._file.close()
+            self._file = None
+            try:
+                os.remove(self.partPath)
+            except OSError:
+                pass
@@ -0,0 +1,164 @@
+# Quick Export Plugin for Krita
+# Based on Quick Export Layers Docker by fullmontis (public domain)
+
+# Texture atlas output: instead of one file per layer, the cropped layers of
+# a format row are packed into a few atlas pages plus a JSON frame map with
+# where every layer went. Like the planner, packing only uses the planned
+# jobs and has no Krita or Qt dependency.
+
+from collections import namedtuple
+import json
+import os
+
+from .exportformats import ESTIMATED_BYTES_PER_PIXEL
+from .exportplan import effectivePPI
+
+
+DEFAULT_ATLAS_SIZE = 2048
+
+
+class AtlasFrame(namedtuple("AtlasFrame", ["job", "page", "x", "y"])):
+    """A cropped layer and where it is placed on an atlas page"""
+
+    __slots__ = ()
+
+
+class Atlas(namedtuple("Atlas", ["folder", "name", "format", "properties", "exportDir",
+                                 "pages", "frames"])):
+    """The atlas pages of one format row.
+
+    pages are the (width, height) of every page, frames the AtlasFrame of
+    every layer. Pages are written to <name>_atlas_<page>.<format> and the
+    frame map to <name>_atlas.json.
+    """
+
+    __slots__ = ()
+
+    def pagePath(self, page):
+        return os.path.join(self.folder, f"{self.name}_atlas_{page}.{self.format}")
+
+    @property
+    def mapPath(self):
+        return os.path.join(self.folder, f"{self.name}_atlas.json")
+
+    def pageFrames(self, page):
+        return [frame for frame in self.frames if frame.page == page]
+
+    @property
+    def pixelCount(self):
+        return sum(width * height for width, height in self.pages)
+
+    @property
+    def estimatedBytes(self):
+        return int(self.pixelCount * ESTIMATED_BYTES_PER_PIXEL.get(self.format, 4.0))
+
+    def frameMap(self):
+        """Pages and frames for the JSON file game engines load the atlas from"""
+        pages = [{"file": os.path.basename(self.pagePath(page)), "width": width, "height": height}
+                 for page, (width, height) in enumerate(self.pages)]
+        frames = []
+        for frame in self.frames:
+            job = frame.job
+            x, y, width, height = job.crop
+            name = os.path.relpath(os.path.join(job.folder, job.filename), self.exportDir or ".")
+            frames.append({
+                "name": name.replace(os.sep, "/"),
+                "layer": job.node.name(),
+                "page": frame.page,
+                "x": frame.x, "y": frame.y, "width": width, "height": height,
+                "sourceX": x, "sourceY": y,
+                "canvasWidth": job.width, "canvasHeight": job.height,
+            })
+        return {"version": 1, "pages": pages, "frames": frames}
+
+
+def packFrames(sizes, max_size, spacing=0):
+    """Pack rectangles into as few pages of at most max_size as possible.
+
+    Shelf packing: the rectangles are placed from the tallest down, left to
+    right on rows as tall as their first rectangle. Rectangles larger than
+    a page get a page of their own. Returns the (page, x, y) of every size
+    and the (width, height) of every page, trimmed to what it holds.
+    """
+    order = sorted(range(len(sizes)), key=lambda i: (sizes[i][1], sizes[i][0]), reverse=True)
+    placements = [None] * len(sizes)
+    pages = []  # [width, height, shelves or None if the page holds one large rectangle]
+
+    for i in order:
+        width, height = sizes[i]
+        if width > max_size or height > max_size:
+            pages.append([width, height, None])
+            placements[i] = (len(pages) - 1, 0, 0)
+            continue
+
+        for pageIndex, page in enumerate(pages):
+            shelves = page[2]
+            if shelves is None:
+                continue
+            # shelf: [y, height, next x]
+            shelf = next((shelf for shelf in shelves
+                          if height <= shelf[1] and shelf[2] + width <= max_size), None)
+            if shelf is None:
+                top = shelves[-1][0] + shelves[-1][1] + spacing
+                if top + height > max_size:
+                    continue
+                shelf = [top, height, 0]
+                shelves.append(shelf)
+            break
+        else:
+            pageIndex = len(pages)
+            shelf = [0, height, 0]
+            pages.append([0, 0, [shelf]])
+
+        page = pages[pageIndex]
+        placements[i] = (pageIndex, shelf[2], shelf[0])
+        page[0] = max(page[0], shelf[2] + width)
+        page[1] = max(page[1], shelf[0] + height)
+        shelf[2] += width + spacing
+
+    return placements, [(page[0], page[1]) for page in pages]
+
+
+def planAtlases(jobs, export_name, export_dir, canvas_width, resolution,
+                max_size=DEFAULT_ATLAS_SIZE, spacing=2, can_pack=None):
+    """Pack the cropped layer jobs of every format row into atlases.
+
+    Jobs of the same size, format and export settings share an atlas, so
+    every page is written with the settings of all its frames, such as the
+    level auto compression picked or a row's file size limit. can_pack
+    tells if a format with its export settings can be written as an atlas
+    page; the other jobs, and
+    jobs without a crop, are returned to be exported as files of their own.
+    """
+    groups = {}
+    remaining = []
+    for job in jobs:
+        if job.crop is None or (can_pack is not None and not can_pack(job.format, job.properties)):
+            remaining.append(job)
+            continue
+        key = (job.width, job.height, job.format, job.transparency, job.profile,
+               json.dumps(job.properties, sort_keys=True))
+        groups.setdefault(key, []).append(job)
+
+    atlases = []
+    names = set()
+    for (width, height, fileFormat, _, _, _), groupJobs in groups.items():
+        # Name the atlas like the file of its row, numbered if that is taken.
+        # Atlases of different formats still need their own frame map name
+        name = export_name
+        if len(groups) > 1:
+            name = f"{export_name}_{effectivePPI(resolution, canvas_width, width)}ppi"
+        uniqueName = name
+        number = 2
+        while uniqueName in names:
+            uniqueName = f"{name}_{number}"
+            number += 1
+        names.add(uniqueName)
+
+        placements, pages = packFrames([(job.crop[2], job.crop[3]) for job in groupJobs],
+                                       max_size, spacing)
+        frames = [AtlasFrame(job, page, x, y)
+                  for job, (page, x, y) in zip(groupJobs, placements)]
+        atlases.append(Atlas(export_dir, uniqueName, fileFormat, groupJobs[0].properties,
+                             export_dir, pages, frames))
+    return atlases, remaining
@@ -0,0 +1,148 @@
+# Quick Export Plugin for Krita
+# Based on Quick Export Layers Docker by fullmontis (public domain)
+
+# Time-budgeted compression for the "auto" encoding profile. Encode speed is
+# measured in seconds per megapixel for every encoder, format and compression
+# level, and kept between exports. Before an export, every auto job gets a share of
+# the time budget by pixel count and the highest level that fits in it.
+
+import json
+import threading
+
+
+# The setting the budget chooses, per format, from the fastest to the smallest output
+BUDGET_SETTINGS = {
+    "png": ("compression", range(1, 10)),
+    "jxl": ("effort", range(1, 10)),
+}
+
+# Krita's own exporters, and the raw encoders writing captured pixels
+KRITA_ENCODER = "krita"
+RAW_ENCODER = "raw"
+
+# Single core seconds per megapixel to start from until a level is measured
+DEFAULT_SECONDS_PER_MEGAPIXEL = {
+    "png": {1: 0.02, 2: 0.025, 3: 0.03, 4: 0.04, 5: 0.05, 6: 0.07, 7: 0.09, 8: 0.15, 9: 0.3},
+    "jxl": {1: 0.03, 2: 0.06, 3: 0.1, 4: 0.25, 5: 0.4, 6: 0.5, 7: 0.8, 8: 2.0, 9: 6.0},
+}
+
+# Images smaller than this are mostly file and setup overhead, not encoding
+MIN_MEASURED_PIXELS = 250000
+
+
+class EncodeThroughput(object):
+    """Measured encode seconds per megapixel for each encoder, format and compression level.
+
+    Krita's exporters and the raw encoders run at different speeds, so each
+    is measured on its own. Unmeasured levels are estimated from the
+    defaults, scaled by how fast the measured levels of the same encoder and
+    format ran on this machine. Encoder threads record measurements too, so
+    they are guarded by a lock.
+    """
+
+    SMOOTHING = 0.3  # Weight of a new measurement
+
+    def __init__(self, measurements=None):
+        self._measurements = {}  # (encoder, format) -> {level: seconds per megapixel}
+        self._lock = threading.Lock()
+        for encoder, formats in (measurements or {}).items():
+            if encoder in BUDGET_SETTINGS:
+                # Saved before the encoders were told apart, most of them were Krita's
+                encoder, formats = KRITA_ENCODER, {encoder: formats}
+            for fileFormat, levels in formats.items():
+                if fileFormat in BUDGET_SETTINGS:
+                    self._measurements[encoder, fileFormat] = {int(level): float(seconds)
+                                                               for level, seconds in levels.items()}
+
+    @classmethod
+    def fromJson(cls, text):
+        try:
+            return cls(json.loads(text) if text else {})
+        except (ValueError, TypeError, AttributeError) as e:
+            print(f"Quick Export: Ignoring saved encode speeds: {e}")
+            return cls()
+
+    def toJson(self):
+        with self._lock:
+            measurements = {}
+            for (encoder, fileFormat), levels in self._measurements.items():
+                measurements.setdefault(encoder, {})[fileFormat] = {str(level): round(seconds, 6)
+                                                                    for level, seconds in levels.items()}
+            return json.dumps(measurements, sort_keys=True)
+
+    def record(self, encoder, file_format, properties, pixels, seconds):
+        """Add the time one file took to encode at the level in its properties"""
+        if file_format not in BUDGET_SETTINGS or pixels < MIN_MEASURED_PIXELS:
+            return
+        key, levels = BUDGET_SETTINGS[file_format]
+        level = properties.get(key)
+        if level not in levels:
+            return
+        measured = seconds * 1e6 / pixels
+        with self._lock:
+            formatLevels = self._measurements.setdefault((encoder, file_format), {})
+            previous = formatLevels.get(level)
+            if previous is not None:
+                measured = previous + (measured - previous) * self.SMOOTHING
+            formatLevels[level] = measured
+
+    def secondsPerMegapixel(self, encoder, file_format, level):
+        defaults = DEFAULT_SECONDS_PER_MEGAPIXEL[file_format]
+        with self._lock:
+            measured = dict(self._measurements.get((encoder, file_format), {}))
+        if level in measured:
+            return measured[level]
+        ratios = [seconds / defaults[measuredLevel]
+                  for measuredLevel, seconds in measured.items() if measuredLevel in defaults]
+        machineFactor = sum(ratios) / len(ratios) if ratios else 1.0
+        return defaults[level] * machineFactor
+
+    def estimate(self, encoder, file_format, level, pixels):
+        """Estimated seconds to encode an image at a compression level"""
+        return self.secondsPerMegapixel(encoder, file_format, level) * pixels / 1e6
+
+    def chooseLevel(self, encoder, file_format, pixels, budget_seconds):
+        """Highest level expected to encode within the budget, the fastest if none does"""
+        key, levels = BUDGET_SETTINGS[file_format]
+        chosen = levels[0]
+        for level in levels:
+            if self.estimate(encoder, file_format, level, pixels) <= budget_seconds:
+                chosen = level
+        return chosen
+
+
+def isBudgeted(file_format, profile):
+    return profile == "auto" and file_format in BUDGET_SETTINGS
+
+
+def budgetJobs(jobs, budget_seconds, throughput, workers=1, encoder_of=None):
+    """Set the compression of every auto job so the export fits in the time budget.
+
+    Each job gets a share of the budget by its pixel count; with parallel
+    encoding, several jobs encode at once so the budget is multiplied by
+    the number of workers. encoder_of tells which encoder will write a
+    format, Krita's by default.
+    """
+    budgeted = [job for job in jobs if isBudgeted(job.format, job.profile)]
+    totalPixels = sum(job.pixelCount for job in budgeted)
+    if not totalPixels:
+        return list(jobs)
+
+    result = []
+    for job in jobs:
+        if isBudgeted(job.format, job.profile):
+            share = budget_seconds * max(1, workers) * job.pixelCount / totalPixels
+            key, _ = BUDGET_SETTINGS[job.format]
+            encoder = encoder_of(job.format) if encoder_of is not None else KRITA_ENCODER
+            level = throughput.chooseLevel(encoder, job.format, job.pixelCount, share)
+            job = job._replace(properties=dict(job.properties, **{key: level}))
+        result.append(job)
+    return result
+
+
+def fingerprintProperties(file_format, profile, properties):
+    """Settings of an output for the manifest, without the level auto picked this time"""
+    if not isBudgeted(file_format, profile):
+        return properties
+    key, _ = BUDGET_SETTINGS[file_format]
+    return dict(properties, **{key: "auto"})
@@ -0,0 +1,154 @@
+# Quick Export Plugin for Krita
+# Based on Quick Export Layers Docker by fullmontis (public domain)
+
+# Pixel buffers between the capture and the encoders. Captured layer pixels
+# stay in memory up to a ceiling; beyond it they are written into memory-
+# mapped temporary files, which the system can page out instead of keeping
+# every capture of a big export in RAM. Encoders read both kinds through a
+# memoryview without copying, and every buffer is freed as soon as the job
+# that reads it is done.
+
+import mmap
+import tempfile
+import threading
+
+
+DEFAULT_PIXEL_MEMORY_LIMIT = 1024  # MB
+
+# Spilled buffers share temporary files of this size, so a big export
+# doesn't hold a file open for every layer
+SEGMENT_SIZE = 256 * 1024 * 1024
+
+
+class SpillSegment(object):
+    """A memory-mapped temporary file that spilled buffers are written into one after another"""
+
+    def __init__(self, size, directory=None):
+        self.size = size
+        self.used = 0
+        self.live = 0  # Buffers in the segment not released yet
+        self._file = tempfile.TemporaryFile(prefix=".quickexport-pixels-", dir=directory)
+        self._file.truncate(size)
+        self.map = mmap.mmap(self._file.fileno(), size)
+
+    def close(self):
+        try:
+            self.map.close()
+        except BufferError:
+            # A view is still alive somewhere, the mapping goes away with it
+            pass
+        self._file.close()
+
+
+class PixelBuffer(object):
+    """Pixels captured from Krita, in memory or in a spill segment.
+
+    view() reads them without copying. Every holder calls release() once
+    it is done; the last release frees the pixels, after which views of
+    them must not be used anymore.
+    """
+
+    def __init__(self, pool, size, data=None, segment=None, offset=0):
+        self.size = size
+        self.refs = 1
+        self._pool = pool
+        self._data = data
+        self._segment = segment
+        self._offset = offset
+
+    @property
+    def spilled(self):
+        return self._segment is not None
+
+    def view(self):
+        if self._segment is None:
+            return memoryview(self._data).cast("B")
+        return memoryview(self._segment.map)[self._offset:self._offset + self.size]
+
+    def retain(self):
+        """Add a holder that calls release() too"""
+        with self._pool._lock:
+            self.refs += 1
+        return self
+
+    def release(self):
+        self._pool.free(self)
+
+
+class PixelBuffers(object):
+    """All pixel buffers of an export, with a ceiling on the memory they take.
+
+    Buffers are stored on the GUI thread and released on the encoder
+    threads, so the bookkeeping is guarded by a lock. Spilled buffers go
+    into the current segment until it is full; a segment is deleted once
+    its last buffer is released, or reused if it is still the current one.
+    """
+
+    def __init__(self, memory_limit, directory=None, segment_size=SEGMENT_SIZE):
+        self.memoryLimit = memory_limit
+        self.segmentSize = segment_size
+        self.memoryBytes = 0
+        self.peakMemoryBytes = 0
+        self.spilledBytes = 0  # Total written to spill files over the export
+        self._directory = directory
+        self._segment = None  # Segment new spilled buffers go into
+        self._segments = set()  # Every segment still open
+        self._lock = threading.Lock()
+
+    def store(self, data):
+        """Keep a captured buffer (bytes, QByteArray or anything with the buffer protocol)"""
+        size = len(data)
+        with self._lock:
+            if size == 0 or self.memoryBytes + size <= self.memoryLimit:
+                # Keep the capture itself, the pixels are never copied
+                self.memoryBytes += size
+                self.peakMemoryBytes = max(self.peakMemoryBytes, self.memoryBytes)
+                return PixelBuffer(self, size, data=data)
+            segment = self._segment
+            if segment is None or segment.used + size > segment.size:
+                if segment is not None and segment.live == 0:
+                    self._closeSegment(segment)
+                segment = SpillSegment(max(size, self.segmentSize), self._directory)
+                self._segment = segment
+                self._segments.add(segment)
+            offset = segment.used
+            segment.used += size
+            segment.live += 1
+            self.spilledBytes += size
+        # The region belongs to this buffer alone, copy into it without the lock
+        segment.map[offset:offset + size] = data
+        return PixelBuffer(self, size, segment=segment, offset=offset)
+
+    def free(self, buffer):
+        """Release one holder of a buffer, freeing it after the last one"""
+        with self._lock:
+            buffer.refs -= 1
+            if buffer.refs > 0:
+                return
+            segment = buffer._segment
+            buffer._data = None
+            buffer._segment = None
+            if segment is None:
+                self.memoryBytes -= buffer.size
+                return
+            segment.live -= 1
+            if segment.live > 0:
+                return
+            if segment is self._segment:
+                # Nothing left in it, start over from the beginning
+                segment.used = 0
+            else:
+                self._closeSegment(segment)
+
+    def _closeSegment(self, segment):
+        segment.close()
+        self._segments.discard(segment)
+        if segment is self._segment:
+            self._segment = None
+
+    def close(self):
+        """Free every buffer still held and delete the spill files"""
+        with self._lock:
+            for segment in list(self._segments):
+                self._closeSegment(segment)
+            self.memoryBytes = 0
@@ -0,0 +1,277 @@
+# Quick Export Plugin for Krita
+# Based on Quick Export Layers Docker by fullmontis (public domain)
+
+# Encoders that write image files from raw pixel buffers, off the GUI thread.
+# Krita's node.save() must run on the GUI thread and encodes one file at a
+# time; these encoders only need the pixels, so many files can be encoded at
+# once on a thread pool. QImage and QImageWriter release the GIL while they
+# work, so the threads really run in parallel.
+#
+# Qt's JPEG writer always uses 2x2 chroma subsampling, no smoothing and no
+# metadata, which is what the export profiles ask Krita's exporter for.
+# JPEG settings asking for anything else go through Krita's exporter.
+#
+# The pixel formats for pipeline tools skip image encoding altogether:
+#   RAW  16 byte header: b"QEXR", version and channel count as little endian
+#        uint16, width and height as little endian uint32. Then the 8-bit
+#        RGBA or RGB rows, top to bottom
+#   NPY  NumPy array of shape (height, width, 4 or 3) and dtype uint8
+# RAW and NPY keep the pixel data aligned after the header, so consumers
+# can memory-map them.
+
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+import os
+import struct
+
+from PyQt5.QtCore import QBuffer, QIODevice, Qt
+from PyQt5.QtGui import QColor, QImage, QImageWriter, QPainter
+
+from .exportformats import PIXEL_FORMATS
+
+try:
+    from PyQt5.QtGui import QColorSpace
+except ImportError:  # Qt < 5.14
+    QColorSpace = None
+
+
+# Formats the raw encoders can write
+RAW_ENCODER_FORMATS = ["png", "jpg"]
+
+# JPEG settings of Krita's exporter that Qt's writer can't change, with the value it always writes
+QT_JPEG_SETTINGS = {
+    "subsampling": 1,  # 2x2,1x1,1x1
+    "smoothing": 0,
+    "storeMetaData": False,
+    "storeAuthor": False,
+    "exif": False,
+}
+
+
+RAW_HEADER_MAGIC = b"QEXR"
+RAW_HEADER_VERSION = 1
+
+
+def partialPath(path):
+    """Hidden file next to an output that it is written to before being renamed into place"""
+    folder, name = os.path.split(path)
+    base, extension = os.path.splitext(name)
+    # Keep the extension, Krita picks its exporter by it
+    return os.path.join(folder, f".{base}.quickexport-part{extension}")
+
+
+@contextmanager
+def atomicOutput(path):
+    """Write an output to a partial file and rename it over the old one only when complete.
+
+    An interrupted export never leaves a truncated file, and a hardlinked
+    output gets a new file instead of changing the files linked to it.
+    Raises IOError if nothing was written, so the output isn't recorded.
+    """
+    partPath = partialPath(path)
+    try:
+        yield partPath
+        if not os.path.exists(partPath):
+            raise IOError(f"{path} was not written")
+        os.replace(partPath, path)
+    except BaseException:
+        if os.path.exists(partPath):
+            os.remove(partPath)
+        raise
+
+
+def canEncodeRaw(document, file_format, properties=None):
+    """True if the raw encoders can write this document in this format.
+
+    The pixel buffers are read as-is, so only 8-bit RGBA documents qualify.
+    PNG and JPEG files are tagged as sRGB, so those also need an sRGB
+    document; everything else keeps going through Krita's own exporter,
+    which converts color depth and profile. The pixel formats store the
+    document's own color values. With properties, the export settings
+    must also be ones the raw encoders write like Krita's exporter.
+    """
+    fileFormat = file_format.lower()
+    if fileFormat not in RAW_ENCODER_FORMATS + PIXEL_FORMATS:
+        return False
+    if fileFormat == "jpg" and properties is not None and any(
+            properties.get(key, value) != value for key, value in QT_JPEG_SETTINGS.items()):
+        return False
+    if document.colorModel() != "RGBA" or document.colorDepth() != "U8":
+        return False
+    return fileFormat in PIXEL_FORMATS or "srgb" in document.colorProfile().lower()
+
+
+def imageFromPixels(data, width, height, copy=True):
+    """Wrap an 8-bit RGBA pixel buffer from Krita in a QImage.
+
+    Without copy the image shares the buffer, which must then outlive it.
+    """
+    # Krita stores 8-bit RGBA as B, G, R, A bytes, which is QImage's ARGB32 on little endian
+    image = QImage(data, width, height, width * 4, QImage.Format_ARGB32)
+    return image.copy() if copy else image
+
+
+def composePixels(width, height, pieces):
+    """Draw 8-bit RGBA buffers onto a transparent canvas, returning its pixel buffer.
+
+    pieces are (x, y, data, width, height) tuples; the result has Krita's
+    byte order like the pieces, so it can be encoded like a captured layer.
+    """
+    canvas = QImage(width, height, QImage.Format_ARGB32)
+    canvas.fill(Qt.transparent)
+    painter = QPainter(canvas)
+    painter.setCompositionMode(QPainter.CompositionMode_Source)
+    for x, y, data, pieceWidth, pieceHeight in pieces:
+        painter.drawImage(x, y, imageFromPixels(data, pieceWidth, pieceHeight, copy=False))
+    painter.end()
+    return canvas.constBits().asstring(canvas.bytesPerLine() * height)
+
+
+def scalePixels(data, width, height, target_width, target_height):
+    """A smoothly scaled copy of an 8-bit RGBA buffer, in the same byte order"""
+    image = imageFromPixels(data, width, height, copy=False).scaled(
+        target_width, target_height, Qt.IgnoreAspectRatio, Qt.SmoothTransformation)
+    return image.constBits().asstring(image.bytesPerLine() * target_height)
+
+
+def flattenImage(image, fill_color):
+    """Composite an image over a solid color and drop its alpha channel"""
+    flat = QImage(image.size(), QImage.Format_RGB32)
+    flat.fill(QColor(*fill_color))
+    painter = QPainter(flat)
+    painter.drawImage(0, 0, image)
+    painter.end()
+    return flat
+
+
+def packedRows(image, alpha):
+    """Row bytes of an image as RGBA, or RGB without alpha, with no line padding"""
+    image = image.convertToFormat(QImage.Format_RGBA8888 if alpha else QImage.Format_RGB888)
+    rowBytes = image.width() * (4 if alpha else 3)
+    stride = image.bytesPerLine()
+    data = image.constBits().asstring(stride * image.height())
+    if stride == rowBytes:
+        return data
+    return b"".join(data[y * stride:y * stride + rowBytes] for y in range(image.height()))
+
+
+def pixelBytes(data, width, height, alpha=True, fill_color=(255, 255, 255)):
+    """Krita's BGRA buffer as packed RGBA bytes, or RGB composited over the fill color"""
+    if not alpha:
+        image = flattenImage(imageFromPixels(data, width, height, copy=False), fill_color)
+        return packedRows(image, False)
+    data = memoryview(data).cast("B")
+    # Swapping the B and R bytes with strided slices runs at memory speed
+    rgba = bytearray(data)
+    rgba[0::4] = data[2::4]
+    rgba[2::4] = data[0::4]
+    return rgba
+
+
+def rawHeader(width, height, channels):
+    return struct.pack("<4sHHII", RAW_HEADER_MAGIC, RAW_HEADER_VERSION, channels, width, height)
+
+
+def npyHeader(width, height, channels):
+    """Header of a .npy file (format version 1.0), written without needing NumPy"""
+    header = ("{'descr': '|u1', 'fortran_order': False, "
+              f"'shape': ({height}, {width}, {channels}), }}")
+    # Magic, version and header length take 10 bytes; pad so the data starts on 64 bytes
+    padding = 64 - (10 + len(header) + 1) % 64
+    header = (header + " " * padding + "\n").encode("latin1")
+    return b"\x93NUMPY\x01\x00" + struct.pack("<H", len(header)) + header
+
+
+def pixelFileChunks(data, width, height, file_format, properties):
+    """The bytes of a RAW or NPY file, as a list of chunks to write in order"""
+    fileFormat = file_format.lower()
+    alpha = properties.get("alpha", True)
+    fillColor = properties.get("transparencyFillcolor", [255, 255, 255])
+    channels = 4 if alpha else 3
+    pixels = pixelBytes(data, width, height, alpha, fillColor)
+    if fileFormat == "raw":
+        return [rawHeader(width, height, channels), pixels]
+    return [npyHeader(width, height, channels), pixels]
+
+
+def prepareImageWriter(writer, data, width, height, file_format, properties):
+    """Set a QImageWriter up for PNG or JPEG and get the image it should write.
+
+    The image shares data, which must stay referenced until it is written.
+    """
+    image = imageFromPixels(data, width, height, copy=False)
+    fillColor = properties.get("transparencyFillcolor", [255, 255, 255])
+
+    if file_format.lower() == "png":
+        writer.setFormat(b"png")
+        if not properties.get("alpha", True):
+            image = flattenImage(image, fillColor)
+        # Qt maps quality 0 to the strongest zlib compression
+        compression = properties.get("compression", 9)
+        writer.setQuality(int(round((9 - compression) * 100 / 9)))
+    else:
+        writer.setFormat(b"jpg")
+        image = flattenImage(image, fillColor)
+        writer.setQuality(properties.get("quality", 100))
+        writer.setOptimizedWrite(properties.get("optimize", True))
+        writer.setProgressiveScanWrite(properties.get("progressive", False))
+
+    if QColorSpace is not None and (properties.get("saveSRGBProfile") or properties.get("saveProfile")):
+        image.setColorSpace(QColorSpace(QColorSpace.SRgb))
+    return image
+
+
+def encodeImageChunks(data, width, height, file_format, properties):
+    """Encode a raw 8-bit RGBA buffer in memory, as a list of chunks of the file"""
+    if file_format.lower() in PIXEL_FORMATS:
+        return pixelFileChunks(data, width, height, file_format, properties)
+    buffer = QBuffer()
+    buffer.open(QIODevice.WriteOnly)
+    writer = QImageWriter(buffer, b"")
+    image = prepareImageWriter(writer, data, width, height, file_format, properties)
+    if not writer.write(image):
+        raise IOError(f"Could not encode {file_format}: {writer.errorString()}")
+    buffer.close()
+    return [bytes(buffer.data())]
+
+
+def writeChunks(path, chunks):
+    """Write a file encoded in memory, returning its size"""
+    with atomicOutput(path) as partPath:
+        with open(partPath, "wb") as f:
+            for chunk in chunks:
+                f.write(chunk)
+    return os.path.getsize(path)
+
+
+def encodeImage(data, width, height, path, file_format, properties):
+    """Encode a raw 8-bit RGBA buffer to a file using the export properties"""
+    if file_format.lower() in PIXEL_FORMATS:
+        return writeChunks(path, pixelFileChunks(data, width, height, file_format, properties))
+    with atomicOutput(path) as partPath:
+        writer = QImageWriter(partPath)
+        image = prepareImageWriter(writer, data, width, height, file_format, properties)
+        if not writer.write(image):
+            raise IOError(f"Could not write {path}: {writer.errorString()}")
+        del writer
+    return os.path.getsize(path)
+
+
+class ParallelEncoder(object):
+    """Thread pool that encodes raw pixel buffers to files"""
+
+    def __init__(self, max_workers=None):
+        self.maxWorkers = max_workers or os.cpu_count() or 4
+        self._executor = None
+
+    def submit(self, fn, *args):
+        """Run fn(*args) on the pool and return its Future"""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.maxWorkers,
+                                                thread_name_prefix="QuickExportEncoder")
+        return self._executor.submit(fn, *args)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
@@ -0,0 +1,208 @@
+# Quick Export Plugin for Krita
+# Based on Quick Export Layers Docker by fullmontis (public domain)
+
+from collections import deque
+from concurrent.futures import Future
+import time
+
+from PyQt5.QtCore import QObject, QTimer, pyqtSignal
+
+
+class ExportTask(object):
+    """A single unit of export work (one node of one format row)"""
+
+    def __init__(self, label, callback, *args):
+        self.label = label
+        self.callback = callback
+        self.args = args
+
+    def run(self):
+        return self.callback(*self.args)
+
+
+class ExportEngine(QObject):
+    """Runs queued export tasks in short event loop slices so Krita stays responsive.
+
+    A task may hand its slow part to a background thread by returning a
+    concurrent.futures.Future. The task then counts as done once the future
+    completes, and the engine only finishes when no futures are pending.
+
+    A task may also return an iterator for long work that must stay on the
+    GUI thread. The engine advances it one step at a time between event
+    loop slices, and closes it early on cancel.
+    """
+
+    # done, total, estimated seconds left (-1 while unknown)
+    progressChanged = pyqtSignal(int, int, float)
+    # cancelled, error message ("" on success)
+    finished = pyqtSignal(bool, str)
+
+    # Time budget for one slice before control goes back to the event loop
+    SLICE_SECONDS = 0.05
+    # How often pending background work is checked while the queue waits on it
+    POLL_MS = 20
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._queue = deque()
+        self._total = 0
+        self._done = 0
+        self._startTime = 0.0
+        self._endTime = 0.0
+        self._running = False
+        self._cancelRequested = False
+        self._pending = []  # Futures returned by tasks that are still running
+        self._activeIterator = None  # Iterator task being stepped through
+        self._error = ""
+        self.currentLabel = ""
+        # Tasks are not started while this many futures are pending, which
+        # bounds the pixel buffers waiting for the encoders
+        self.maxPending = 8
+
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.timeout.connect(self._runSlice)
+
+    def isRunning(self):
+        return self._running
+
+    def doneCount(self):
+        return self._done
+
+    def totalCount(self):
+        return self._total
+
+    def start(self, tasks):
+        """Queue the tasks and start running them from the event loop"""
+        if self._running:
+            raise RuntimeError("An export is already running")
+        self._queue = deque(tasks)
+        self._total = len(self._queue)
+        self._done = 0
+        self._startTime = time.monotonic()
+        self._cancelRequested = False
+        self._pending = []
+        self._activeIterator = None
+        self._error = ""
+        self._running = True
+        self.progressChanged.emit(0, self._total, -1.0)
+        self._timer.start(0)
+
+    def cancel(self):
+        """Stop before the next task; the task currently running is finished first"""
+        if self._running:
+            self._cancelRequested = True
+
+    def elapsed(self):
+        """Seconds since the export started, up to when it finished"""
+        return (time.monotonic() if self._running else self._endTime) - self._startTime
+
+    def estimateRemaining(self):
+        """Seconds left based on the average task time so far, -1 if unknown"""
+        if self._done == 0:
+            return -1.0
+        elapsed = time.monotonic() - self._startTime
+        return elapsed / self._done * (self._total - self._done)
+
+    def _collectPending(self):
+        """Count finished background work, remembering the first failure"""
+        stillPending = []
+        for future in self._pending:
+            if not future.done():
+                stillPending.append(future)
+            elif future.cancelled():
+                continue
+            elif future.exception() is not None:
+                if not self._error:
+                    self._error = str(future.exception())
+            else:
+                self._done += 1
+        self._pending = stillPending
+
+    def _runSlice(self):
+        self._collectPending()
+        if self._error:
+            self._stopQueue()
+
+        sliceStart = time.monotonic()
+        while not self._cancelRequested and not self._error:
+            try:
+                if self._activeIterator is not None:
+                    self._stepActiveIterator()
+                elif self._queue and len(self._pending) < self.maxPending:
+                    self._startTask(self._queue.popleft())
+                else:
+                    break
+            except Exception as e:
+                self._error = str(e)
+                self._stopQueue()
+                break
+            if time.monotonic() - sliceStart >= self.SLICE_SECONDS:
+                break
+
+        self.progressChanged.emit(self._done, self._total, self.estimateRemaining())
+
+        if self._cancelRequested:
+            self._stopQueue()
+
+        if self._activeIterator is not None or (self._queue and len(self._pending) < self.maxPending):
+            self._timer.start(0)
+        elif self._pending:
+            # Wait for background work, even when cancelling, so no file is left half written
+            self._timer.start(self.POLL_MS)
+        else:
+            self._finish(self._cancelRequested and not self._error, self._error)
+
+    def _startTask(self, task):
+        self.currentLabel = task.label
+        result = task.run()
+        if isinstance(result, Future):
+            self._pending.append(result)
+        elif result is not None and hasattr(result, "__next__"):
+            self._activeIterator = result
+        else:
+            self._done += 1
+
+    def _stepActiveIterator(self):
+        try:
+            next(self._activeIterator)
+        except StopIteration:
+            self._activeIterator = None
+            self._done += 1
+        except Exception:
+            self._activeIterator = None
+            raise
+
+    def _stopQueue(self):
+        """Drop queued tasks and background work that has not started yet"""
+        self._queue.clear()
+        if self._activeIterator is not None:
+            # Lets the task clean up its partial output
+            self._activeIterator.close()
+            self._activeIterator = None
+        for future in self._pending:
+            future.cancel()
+
+    def _finish(self, cancelled, error):
+        self._queue.clear()
+        self._pending = []
+        self._endTime = time.monotonic()
+        self._running = False
+        self._cancelRequested = False
+        self.finished.emit(cancelled, error)
+
+
+def runTasks(tasks, max_pending=8):
+    """Run export tasks to completion without an event loop, for headless exports"""
+    pending = deque()
+    for task in tasks:
+        result = task.run()
+        if isinstance(result, Future):
+            pending.append(result)
+            if len(pending) >= max_pending:
+                pending.popleft().result()
+        elif result is not None and hasattr(result, "__next__"):
+            for _ in result:
+                pass
+    while pending:
+        pending.popleft().result()
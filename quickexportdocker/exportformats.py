@@ -0,0 +1,170 @@
+# Quick Export Plugin for Krita
+# Based on Quick Export Layers Docker by fullmontis (public domain)
+
+# Format tables and export settings. Plain Python so the export planner
+# and headless tools can use them without Krita or Qt.
+
+FILE_EXTENSIONS = {
+    "PNG": "png",
+    "JPEG": "jpg",
+    "JPEG-XL": "jxl",
+    "KRA": "kra",
+    "PSD": "psd",
+    "RAW": "raw",
+    "NPY": "npy"
+}
+
+# Formats written straight from the pixel buffer for pipeline tools, see exportencoders.py
+PIXEL_FORMATS = ["raw", "npy"]
+
+# Layer name tags that override the format row, e.g. "Background [jpg]"
+FORMAT_TAGS = [
+    (("[jpeg]", "[jpg]"), "jpg"),
+    (("[png]",), "png"),
+    (("[jxl]",), "jxl"),
+    (("[raw]",), "raw"),
+    (("[npy]",), "npy"),
+]
+
+# Encoding profiles trade file size for encoding time. "max" is the
+# smallest output and the slowest encode; KRA and PSD ignore the profile.
+# "auto" starts from "max" and lets the export's time budget lower the
+# PNG compression or JPEG-XL effort (see exportbudget.py).
+ENCODING_PROFILES = ["fast", "balanced", "max", "auto"]
+DEFAULT_PROFILE = "max"
+
+PROFILE_SETTINGS = {
+    "fast": {
+        "png": {"compression": 1},
+        "jpg": {"quality": 80, "optimize": False},
+        "jxl": {"effort": 3},
+    },
+    "balanced": {
+        "png": {"compression": 6},
+        "jpg": {"quality": 92, "optimize": True},
+        "jxl": {"effort": 7},
+    },
+    "max": {
+        "png": {"compression": 9},
+        "jpg": {"quality": 100, "optimize": True},
+        "jxl": {"effort": 9},
+    },
+}
+
+# Rough bytes per pixel of typical output, used for size estimates only
+ESTIMATED_BYTES_PER_PIXEL = {
+    "png": 1.5,
+    "jpg": 0.5,
+    "jxl": 1.0,
+    "kra": 2.0,
+    "psd": 4.0,
+    "raw": 4.0,
+    "npy": 4.0
+}
+
+
+def fileExtension(format_text):
+    """Get the file extension for a format name or extension"""
+    formatUpper = format_text.upper()
+    if formatUpper in FILE_EXTENSIONS:
+        return FILE_EXTENSIONS[formatUpper]
+    if format_text.lower() in FILE_EXTENSIONS.values():
+        return format_text.lower()
+    return "png"
+
+
+def formatFromLayerName(node_name, default_format):
+    """Get the format forced by a [png]/[jpg]/[jxl] tag in a layer name"""
+    lowerName = node_name.lower()
+    for tags, tagFormat in FORMAT_TAGS:
+        if any(tag in lowerName for tag in tags):
+            return tagFormat
+    return default_format
+
+
+def isPixelFormat(file_format):
+    """RAW and NPY have no Krita exporter, they are written from the pixel buffer"""
+    return fileExtension(file_format) in PIXEL_FORMATS
+
+
+def isNativeFormat(file_format):
+    """KRA and PSD outputs are written from the whole document, not a node"""
+    return file_format.upper() in ["KRA", "PSD"]
+
+
+# Formats a row can give a file size limit, their quality is searched to fit it (see exporttarget.py)
+TARGET_SIZE_FORMATS = ["jpg", "jxl"]
+
+
+def exportProperties(file_format, transparency=True, profile=DEFAULT_PROFILE, max_bytes=0):
+    """Get the format-specific export settings of an encoding profile as a plain dict.
+
+    max_bytes limits the size of JPEG and JPEG-XL files, which makes JPEG-XL lossy.
+    """
+    properties = {}
+    formatUpper = file_format.upper()
+
+    if formatUpper == "PNG":
+        # PNG Settings:
+        # - Max compression (9)
+        # - Force convert to sRGB enabled
+        # - All other options disabled
+        # - Transparency based on toggle button
+        properties["compression"] = 9
+        properties["indexed"] = False
+        properties["interlaced"] = False
+        properties["saveSRGBProfile"] = True  # Force convert to sRGB
+        properties["forceSRGB"] = True
+        properties["alpha"] = transparency
+        properties["transparencyFillcolor"] = [255, 255, 255]  # White fill if no transparency
+
+    elif formatUpper in ["JPEG", "JPG"]:
+        # JPEG Settings:
+        # - Quality: 100%
+        # - Subsampling: 2x2, 1x1, 1x1 (smallest file) = 1
+        # - Metadata Anonymizer enabled
+        properties["quality"] = 100
+        properties["smoothing"] = 0
+        properties["subsampling"] = 1  # 2x2,1x1,1x1 (smallest)
+        properties["progressive"] = False
+        properties["optimize"] = True
+        properties["saveProfile"] = True
+        properties["transparencyFillcolor"] = [255, 255, 255]
+        properties["storeMetaData"] = False  # Anonymizer - don't store metadata
+        properties["storeAuthor"] = False  # Don't store author
+        properties["exif"] = False  # No EXIF
+
+    elif formatUpper in ["JPEG-XL", "JXL"]:
+        # JPEG-XL Settings:
+        # - Don't save as animated
+        # - Flatten the image
+        # - No lossy encoding (lossless)
+        # - Effort/Tradeoff: 9 (max)
+        # - Decoding speed: 0 (slowest/best quality)
+        properties["lossless"] = True  # No lossy encoding
+        properties["effort"] = 9  # Max effort/tradeoff
+        properties["decodingSpeed"] = 0  # Slowest/best quality
+        properties["flattenImage"] = True  # Flatten the image
+        properties["animated"] = False  # Don't save as animated
+
+    elif formatUpper == "KRA":
+        # KRA native format - Krita's native format
+        properties["flattenImage"] = False
+
+    elif formatUpper == "PSD":
+        # PSD format - Photoshop compatibility
+        properties["psdCompression"] = 1  # RLE compression
+
+    elif formatUpper in ["RAW", "NPY"]:
+        # Pixel formats: 8-bit RGBA, or RGB composited over white without transparency
+        properties["alpha"] = transparency
+        properties["transparencyFillcolor"] = [255, 255, 255]
+
+    # The profile overrides the speed/size settings, "max" keeps the ones above
+    profileSettings = PROFILE_SETTINGS.get(profile, PROFILE_SETTINGS[DEFAULT_PROFILE])
+    properties.update(profileSettings.get(fileExtension(file_format), {}))
+    if max_bytes > 0 and fileExtension(file_format) in TARGET_SIZE_FORMATS:
+        properties["maxBytes"] = max_bytes
+        if fileExtension(file_format) == "jxl":
+            properties["lossless"] = False
+    return properties
@@ -0,0 +1,76 @@
+# Quick Export Plugin for Krita
+# Based on Quick Export Layers Docker by fullmontis (public domain)
+
+import json
+import os
+import threading
+
+
+class ExportJournal(object):
+    """Append-only log of the outputs a running export has finished.
+
+    Every finished output is written to the journal right away, while the
+    manifest is only saved when the export ends. A journal left in the
+    export directory means the last export was cancelled or Krita crashed,
+    and lists the outputs that don't need to be encoded again when it is
+    resumed. A finished export deletes its journal.
+
+    Every export name has a journal of its own, so exports of several
+    documents into one directory, from the docker or from batch workers,
+    don't overwrite or delete each other's.
+    """
+
+    FILENAME = ".quickexport-journal-{name}.jsonl"
+
+    def __init__(self, directory, name):
+        self.directory = directory
+        # Layer names can contain path separators, keep the journal in the directory itself
+        safeName = name.replace("/", "_").replace(os.sep, "_")
+        self.path = os.path.join(directory, self.FILENAME.format(name=safeName))
+        self._file = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        """Outputs finished by an interrupted export, as {relative path: fingerprint}"""
+        finished = {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                        finished[self.normalizePath(entry["path"])] = entry["fingerprint"]
+                    except (ValueError, KeyError, TypeError):
+                        # The last line is cut short if Krita crashed while writing it
+                        continue
+        except OSError:
+            pass
+        return finished
+
+    def open(self):
+        """Start a new journal for this export"""
+        self._file = open(self.path, "w", encoding="utf-8")
+
+    def record(self, relative_path, fingerprint):
+        """Log a finished output, flushed at once so it survives a crash"""
+        line = json.dumps({"path": self.normalizePath(relative_path),
+                           "fingerprint": fingerprint}) + "\n"
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.write(line)
+            self._file.flush()
+
+    def close(self, finished):
+        """Stop logging; the journal is only kept when the export didn't finish"""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+        if finished:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+
+    def normalizePath(self, relative_path):
+        return os.path.normpath(relative_path).replace(os.sep, "/")
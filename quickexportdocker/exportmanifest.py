@@ -0,0 +1,111 @@
+# Quick Export Plugin for Krita
+# Based on Quick Export Layers Docker by fullmontis (public domain)
+
+import hashlib
+import json
+import os
+import threading
+
+
+class ExportManifest(object):
+    """Sidecar JSON in the export directory recording the inputs of every exported file.
+
+    Each entry maps an output path (relative to the export directory) to a
+    fingerprint of the node pixels, bounds, target size and export settings
+    it was written from. An output whose fingerprint is unchanged and whose
+    file still exists can be skipped on the next export. Outputs encoded on
+    background threads record themselves, so entries are guarded by a lock.
+    Saving merges into the file on disk, so batch exports running in other
+    processes don't drop each other's entries.
+    """
+
+    FILENAME = ".quickexport-manifest.json"
+    VERSION = 1
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.path = os.path.join(directory, self.FILENAME)
+        self._entries = {}
+        self._recorded = {}  # Entries recorded since the last load or save
+        self._lock = threading.Lock()
+
+    def load(self):
+        """Read the manifest from disk, starting empty if it is missing or unreadable"""
+        self._entries = self._readEntries()
+        self._recorded = {}
+        return self
+
+    def _readEntries(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") == self.VERSION:
+                return dict(data.get("outputs", {}))
+        except (OSError, ValueError) as e:
+            if os.path.exists(self.path):
+                print(f"Quick Export: Ignoring unreadable manifest {self.path}: {e}")
+        return {}
+
+    def save(self):
+        """Write the manifest back if anything was recorded, replacing the old file atomically"""
+        with self._lock:
+            if not self._recorded:
+                return
+            self._entries = self._readEntries()
+            self._entries.update(self._recorded)
+            self._entries = {key: entry for key, entry in self._entries.items() if entry is not None}
+            tempPath = f"{self.path}.{os.getpid()}.tmp"
+            with open(tempPath, "w", encoding="utf-8") as f:
+                json.dump({"version": self.VERSION, "outputs": self._entries},
+                          f, indent=1, sort_keys=True)
+            os.replace(tempPath, self.path)
+            self._recorded = {}
+
+    def isUpToDate(self, relative_path, fingerprint):
+        """True if the output exists and was written from identical inputs"""
+        with self._lock:
+            entry = self._entries.get(self.normalizePath(relative_path))
+        if not entry or entry.get("fingerprint") != fingerprint:
+            return False
+        return os.path.isfile(os.path.join(self.directory, relative_path))
+
+    def record(self, relative_path, fingerprint, **extra):
+        """Remember the inputs an output was just written from"""
+        entry = {"fingerprint": fingerprint}
+        entry.update(extra)
+        key = self.normalizePath(relative_path)
+        with self._lock:
+            self._entries[key] = entry
+            self._recorded[key] = entry
+
+    def forget(self, relative_path):
+        """Drop an output rewritten without a fingerprint, so it is never skipped by its old one"""
+        key = self.normalizePath(relative_path)
+        with self._lock:
+            if self._entries.get(key) is not None:
+                self._entries[key] = None
+                self._recorded[key] = None
+
+    def normalizePath(self, relative_path):
+        return os.path.normpath(relative_path).replace(os.sep, "/")
+
+    @staticmethod
+    def fingerprint(pixel_hash, bounds, target_size, file_format, properties, resolution,
+                    crop=None):
+        """Combine everything that affects an output file into one digest"""
+        settings = json.dumps({
+            "bounds": list(bounds),
+            "size": list(target_size),
+            "crop": list(crop) if crop else None,
+            "format": file_format.lower(),
+            "properties": properties,
+            "resolution": resolution,
+        }, sort_keys=True)
+        digest = hashlib.sha1(pixel_hash.encode("ascii"))
+        digest.update(settings.encode("utf-8"))
+        return digest.hexdigest()
+
+    @staticmethod
+    def hashPixels(data):
+        """Digest of a raw pixel buffer (QByteArray, bytes or memoryview)"""
+        return hashlib.sha1(data).hexdigest()
@@ -0,0 +1,155 @@
+# Quick Export Plugin for Krita
+# Based on Quick Export Layers Docker by fullmontis (public domain)
+
+# Post-export optimizer: every file the export writes can be handed to an
+# external command line optimizer like oxipng or jpegoptim. The commands run
+# on a small pool of background threads, each waiting on its own process,
+# so the export is reported done as soon as the files are written and the
+# optimization passes finish on their own.
+#
+# A command is a template with {file}: the file to optimize in place, which
+# is a copy of the output. Commands that write a new file instead, like
+# cjxl, use {output} for it and read the output itself from {file}. The
+# result replaces the output only if the command succeeded, the result is
+# smaller and the output wasn't written again in the meantime.
+
+from concurrent.futures import ThreadPoolExecutor
+import os
+import shlex
+import shutil
+import subprocess
+import threading
+import time
+
+
+DEFAULT_OPTIMIZE_COMMANDS = {
+    "png": "oxipng -o 2 --strip safe {file}",
+    "jpg": "jpegoptim --strip-all --quiet {file}",
+    "jxl": "",
+}
+
+# Optimizers are single threaded or close to it; half the cores leaves room for the encoders
+DEFAULT_OPTIMIZE_WORKERS = max(1, (os.cpu_count() or 2) // 2)
+
+
+def optimizerPath(path, suffix):
+    """Hidden work file next to an output, keeping its extension for the optimizer"""
+    folder, name = os.path.split(path)
+    base, extension = os.path.splitext(name)
+    return os.path.join(folder, f".{base}.quickexport-{suffix}{extension}")
+
+
+def commandArguments(template, file_path, output_path):
+    """Split a command template and fill in the paths, which may contain spaces"""
+    arguments = shlex.split(template, posix=os.name != "nt")
+    return [argument.replace("{file}", file_path).replace("{output}", output_path)
+            for argument in arguments]
+
+
+def fileState(path):
+    stat = os.stat(path)
+    return (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+
+class OptimizeStats(object):
+    """Results of the optimization passes of one export, updated by the optimizer threads"""
+
+    def __init__(self):
+        self.queued = 0
+        self.done = 0
+        self.optimized = 0  # Files that got smaller
+        self.failed = 0
+        self.bytesBefore = 0
+        self.bytesSaved = 0
+        self.lastError = ""
+        self.started = None  # When the first file was queued
+        self.finished = None  # When the last one was done
+        self._lock = threading.Lock()
+
+    @property
+    def pending(self):
+        return self.queued - self.done
+
+    @property
+    def elapsed(self):
+        """Seconds from the first file queued to the last one done"""
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.perf_counter()) - self.started
+
+    def addQueued(self):
+        with self._lock:
+            if self.started is None:
+                self.started = time.perf_counter()
+            self.queued += 1
+
+    def record(self, size_before, size_saved, error=""):
+        with self._lock:
+            self.done += 1
+            self.finished = time.perf_counter()
+            if error:
+                self.failed += 1
+                self.lastError = error
+                return
+            self.bytesBefore += size_before
+            if size_saved > 0:
+                self.optimized += 1
+                self.bytesSaved += size_saved
+
+
+class PostOptimizer(object):
+    """Bounded pool of optimizer processes, shared by every export of the docker"""
+
+    def __init__(self, max_workers=None):
+        self.maxWorkers = max_workers or DEFAULT_OPTIMIZE_WORKERS
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def submit(self, path, command, stats):
+        """Queue a written file for an optimizer command template (from any thread)"""
+        state = fileState(path)
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.maxWorkers,
+                                                    thread_name_prefix="QuickExportOptimizer")
+            stats.addQueued()
+            return self._executor.submit(self.optimize, path, command, stats, state)
+
+    def optimize(self, path, command, stats, state):
+        """Run the command on a copy of the file and keep the result if it is smaller"""
+        workPath = optimizerPath(path, "optimize")
+        outputPath = optimizerPath(path, "optimized")
+        sizeBefore = state[1]
+        try:
+            usesOutput = "{output}" in command
+            if not usesOutput:
+                shutil.copyfile(path, workPath)
+            arguments = commandArguments(command, path if usesOutput else workPath, outputPath)
+            resultPath = outputPath if usesOutput else workPath
+            process = subprocess.run(arguments, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                                     universal_newlines=True)
+            if process.returncode != 0:
+                lines = process.stderr.strip().splitlines()
+                raise RuntimeError(f"{arguments[0]} exited with code {process.returncode}"
+                                   + (f": {lines[-1]}" if lines else ""))
+            sizeAfter = os.path.getsize(resultPath)
+            saved = 0
+            # Keep the output if the optimizer made it bigger, or a new export replaced it meanwhile
+            if 0 < sizeAfter < sizeBefore and fileState(path) == state:
+                os.replace(resultPath, path)
+                saved = sizeBefore - sizeAfter
+            stats.record(sizeBefore, saved)
+        except (OSError, RuntimeError, ValueError) as e:
+            print(f"Quick Export: Could not optimize {path}: {e}")
+            stats.record(sizeBefore, 0, str(e))
+        finally:
+            for workFile in (workPath, outputPath):
+                if os.path.exists(workFile):
+                    os.remove(workFile)
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            executor = self._executor
+            self._executor = None
+        if executor is not None:
+            executor.shutdown(wait=wait)
@@ -0,0 +1,255 @@
+# Quick Export Plugin for Krita
+# Based on Quick Export Layers Docker by fullmontis (public domain)
+
+# Export planner: decides every file an export will write before anything is
+# encoded. Nodes are only used through name(), type(), visible(),
+# childNodes() and bounds(), so the planner has no Krita or Qt dependency.
+
+from collections import namedtuple
+import math
+import os
+
+from .exportformats import (DEFAULT_PROFILE, ESTIMATED_BYTES_PER_PIXEL, exportProperties,
+                            fileExtension, formatFromLayerName)
+
+
+DEFAULT_OPTIONS = {
+    "layersSeparately": False,
+    "groupAsLayer": True,
+    "ignoreFilterLayers": True,
+    "ignoreInvisibleLayers": True,
+    "cropToContent": False,
+    "cropPadding": 0,
+}
+
+
+class ExportJob(namedtuple("ExportJob", ["node", "folder", "filename", "format",
+                                         "width", "height", "transparency",
+                                         "scaled", "properties", "crop", "profile"])):
+    """One output file: which node to write, where, in which format and size.
+
+    width and height are the size the canvas is scaled to. crop is an
+    (x, y, width, height) rectangle in that scaled canvas, or None to write
+    the whole canvas. profile is the encoding profile properties came from.
+    """
+
+    __slots__ = ()
+
+    @property
+    def relativePath(self):
+        """Output path relative to the export directory"""
+        return os.path.join(self.folder, f"{self.filename}.{self.format}")
+
+    @property
+    def outputSize(self):
+        """Width and height of the written image"""
+        if self.crop:
+            return self.crop[2], self.crop[3]
+        return self.width, self.height
+
+    @property
+    def pixelCount(self):
+        width, height = self.outputSize
+        return width * height
+
+    @property
+    def estimatedBytes(self):
+        estimate = int(self.pixelCount * ESTIMATED_BYTES_PER_PIXEL.get(self.format, 4.0))
+        if self.properties.get("maxBytes"):
+            return min(estimate, self.properties["maxBytes"])
+        return estimate
+
+
+class ExportPlan(object):
+    """Immutable list of export jobs plus the folders they need.
+
+    atlases are the texture atlases layers are packed into instead of
+    being written as jobs of their own.
+    """
+
+    def __init__(self, jobs, directories, summaryNames, exportName="", exportDir="", atlases=()):
+        self.exportName = exportName
+        self.exportDir = exportDir
+        self.jobs = tuple(jobs)
+        self.directories = tuple(directories)
+        self.summaryNames = tuple(summaryNames)
+        self.atlases = tuple(atlases)
+
+    def __len__(self):
+        return len(self.jobs) + sum(len(atlas.pages) for atlas in self.atlases)
+
+    def totalPixels(self):
+        return (sum(job.pixelCount for job in self.jobs)
+                + sum(atlas.pixelCount for atlas in self.atlases))
+
+    def estimatedBytes(self):
+        return (sum(job.estimatedBytes for job in self.jobs)
+                + sum(atlas.estimatedBytes for atlas in self.atlases))
+
+    def collisions(self):
+        """Output paths written by more than one job, compared case-insensitively"""
+        byPath = {}
+        for job in self.jobs:
+            key = os.path.normcase(os.path.normpath(job.relativePath)).lower()
+            byPath.setdefault(key, []).append(job)
+        return [jobs for jobs in byPath.values() if len(jobs) > 1]
+
+    def dryRunReport(self, max_files=50):
+        """Human readable summary of what the export would write"""
+        lines = []
+        for job in self.jobs[:max_files]:
+            width, height = job.outputSize
+            lines.append(f"{job.relativePath}  {width}x{height}  ~{formatBytes(job.estimatedBytes)}")
+        if len(self.jobs) > max_files:
+            lines.append(f"... and {len(self.jobs) - max_files} more")
+        for atlas in self.atlases:
+            for page, (width, height) in enumerate(atlas.pages):
+                lines.append(f"{atlas.pagePath(page)}  {width}x{height}  "
+                             f"{len(atlas.pageFrames(page))} layers")
+        lines.append("")
+        lines.append(f"{len(self)} files, {self.totalPixels() / 1e6:.1f} megapixels, "
+                     f"about {formatBytes(self.estimatedBytes())}")
+        collisions = self.collisions()
+        if collisions:
+            lines.append(f"{len(collisions)} output paths are written more than once:")
+            for jobs in collisions[:max_files]:
+                lines.append(f"  {jobs[0].relativePath} ({len(jobs)}x)")
+        return "\n".join(lines)
+
+    def layout(self):
+        """Position of every cropped output in its canvas, for reassembling the image"""
+        outputs = []
+        for job in self.jobs:
+            x, y, width, height = job.crop or (0, 0, job.width, job.height)
+            outputs.append({
+                "file": job.relativePath.replace(os.sep, "/"),
+                "layer": job.node.name(),
+                "x": x, "y": y, "width": width, "height": height,
+                "canvasWidth": job.width, "canvasHeight": job.height,
+            })
+        return {"version": 1, "outputs": outputs}
+
+
+def formatBytes(size):
+    """Format a byte count as a short human readable string"""
+    for unit in ["B", "KB", "MB", "GB"]:
+        if size < 1024 or unit == "GB":
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024.0
+
+
+def effectivePPI(resolution, canvas_width, target_width):
+    """PPI of an export scaled from the canvas width to the target width"""
+    scaleX = target_width / canvas_width if canvas_width > 0 else 1.0
+    return int(round(int(resolution) * scaleX))
+
+
+def cropRect(bounds, canvas_width, canvas_height, target_width, target_height, padding=0):
+    """Crop rectangle of node bounds in the scaled canvas, None if nothing is visible.
+
+    The bounds are scaled outwards to whole pixels, padded and clipped to
+    the canvas, the same area a full canvas export would contain.
+    """
+    if bounds.isEmpty():
+        return None
+    scaleX = target_width / canvas_width if canvas_width > 0 else 1.0
+    scaleY = target_height / canvas_height if canvas_height > 0 else 1.0
+    left = max(int(math.floor(bounds.x() * scaleX)) - padding, 0)
+    top = max(int(math.floor(bounds.y() * scaleY)) - padding, 0)
+    right = min(int(math.ceil((bounds.x() + bounds.width()) * scaleX)) + padding, target_width)
+    bottom = min(int(math.ceil((bounds.y() + bounds.height()) * scaleY)) + padding, target_height)
+    if right <= left or bottom <= top:
+        return None
+    return (left, top, right - left, bottom - top)
+
+
+def buildExportPlan(base_node, export_name, export_dir, canvas_width, canvas_height,
+                    resolution, rows, options=None):
+    """Walk the node tree once and list every file the format rows will write.
+
+    rows are FormatRow.getExportSettings() dicts, options uses the keys of
+    DEFAULT_OPTIONS. export_dir is the folder relative to the export
+    directory that everything is written into ("" for none).
+
+    Jobs are ordered from the largest target size to the smallest, so every
+    scaled size can be derived from the next larger one already scaled.
+    """
+    opts = dict(DEFAULT_OPTIONS)
+    opts.update(options or {})
+
+    jobs = []
+    directories = [export_dir] if export_dir else []
+    summaryNames = []
+
+    # Count format occurrences to detect duplicates
+    formatCounts = {}
+    for row in rows:
+        ext = fileExtension(row['format'])
+        formatCounts[ext] = formatCounts.get(ext, 0) + 1
+
+    for row in rows:
+        fileFormat = fileExtension(row['format'])
+        targetWidth = row['width']
+        targetHeight = row['height']
+        transparency = row['transparency']
+        profile = row.get('profile', DEFAULT_PROFILE)
+        maxBytes = int(row.get('maxSize', 0)) * 1024
+        scaled = targetWidth != canvas_width or targetHeight != canvas_height
+
+        # PPI suffix if there are duplicate formats or a different resolution
+        if formatCounts[fileFormat] > 1 or scaled:
+            sizedExportName = f"{export_name}_{effectivePPI(resolution, canvas_width, targetWidth)}ppi"
+        else:
+            sizedExportName = export_name
+
+        def makeJob(node, folder, filename, file_format, crop=None):
+            return ExportJob(node, folder, filename, file_format, targetWidth, targetHeight,
+                             transparency, scaled,
+                             exportProperties(file_format, transparency, profile, maxBytes), crop,
+                             profile)
+
+        def layerCrop(node):
+            return cropRect(node.bounds(), canvas_width, canvas_height,
+                            targetWidth, targetHeight, opts["cropPadding"])
+
+        if opts["layersSeparately"]:
+            _planLayers(base_node, export_dir, fileFormat, opts, makeJob,
+                        layerCrop if opts["cropToContent"] else None, jobs, directories)
+        else:
+            jobs.append(makeJob(base_node, export_dir, sizedExportName, fileFormat))
+
+        summaryNames.append(f"{sizedExportName}.{fileFormat}")
+
+    # Stable sort, rows of the same size keep their order
+    jobs.sort(key=lambda job: job.width * job.height, reverse=True)
+
+    # Keep the first occurrence of each folder, parents before children
+    uniqueDirectories = list(dict.fromkeys(directories))
+    return ExportPlan(jobs, uniqueDirectories, summaryNames, export_name, export_dir)
+
+
+def _planLayers(parent_node, parent_dir, file_format, opts, make_job, layer_crop,
+                jobs, directories):
+    """Add one job per exportable layer, recursing into groups"""
+    for node in parent_node.childNodes():
+        if node.name() == "Selection Mask":
+            continue
+        elif opts["ignoreFilterLayers"] and 'filter' in node.type():
+            continue
+        elif opts["ignoreInvisibleLayers"] and not node.visible():
+            continue
+        elif node.type() == 'grouplayer' and node.childNodes() and not opts["groupAsLayer"]:
+            newDir = os.path.join(parent_dir, node.name())
+            directories.append(newDir)
+            _planLayers(node, newDir, file_format, opts, make_job, layer_crop,
+                        jobs, directories)
+        else:
+            crop = None
+            if layer_crop is not None:
+                crop = layer_crop(node)
+                if crop is None:
+                    # Empty or entirely off-canvas layer, nothing to write
+                    continue
+            nodeName = node.name()
+            jobs.append(make_job(node, parent_dir, nodeName,
+                                 formatFromLayerName(nodeName, file_format), crop))
@@ -0,0 +1,153 @@
+# Quick Export Plugin for Krita
+# Based on Quick Export Layers Docker by fullmontis (public domain)
+
+# Preflight: before anything is cloned or written, estimate from the plan how
+# much memory the export peaks at and how much disk space its files take,
+# and compare that with what the machine has free. Like the planner, the
+# estimates only use the planned jobs and plain numbers, not Krita.
+
+from collections import namedtuple
+import ctypes
+import os
+import shutil
+import sys
+
+from .exportplan import formatBytes
+from .tiledexport import DEFAULT_TILE_SIZE
+
+
+# Channels of every Krita color model and bytes of every channel depth
+MODEL_CHANNELS = {"RGBA": 4, "CMYKA": 5, "GRAYA": 2, "LABA": 4, "XYZA": 4, "YCbCrA": 4, "A": 1}
+DEPTH_BYTES = {"U8": 1, "U16": 2, "F16": 2, "F32": 4, "F64": 8}
+
+# Share of the free memory an export may plan to use, the rest is left to Krita and the system
+MEMORY_HEADROOM = 0.8
+
+
+def pixelSize(color_model, color_depth):
+    """Bytes per pixel of a document's color model and depth"""
+    return MODEL_CHANNELS.get(color_model, 4) * DEPTH_BYTES.get(color_depth, 1)
+
+
+def availableMemory():
+    """Bytes of memory free for new allocations without swapping, None if unknown"""
+    try:
+        with open("/proc/meminfo", "r") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    if sys.platform == "win32":
+        class MemoryStatus(ctypes.Structure):
+            _fields_ = [("dwLength", ctypes.c_ulong), ("dwMemoryLoad", ctypes.c_ulong),
+                        ("ullTotalPhys", ctypes.c_ulonglong), ("ullAvailPhys", ctypes.c_ulonglong),
+                        ("ullTotalPageFile", ctypes.c_ulonglong), ("ullAvailPageFile", ctypes.c_ulonglong),
+                        ("ullTotalVirtual", ctypes.c_ulonglong), ("ullAvailVirtual", ctypes.c_ulonglong),
+                        ("ullAvailExtendedVirtual", ctypes.c_ulonglong)]
+        status = MemoryStatus()
+        status.dwLength = ctypes.sizeof(MemoryStatus)
+        if ctypes.windll.kernel32.GlobalMemoryStatusEx(ctypes.byref(status)):
+            return status.ullAvailPhys
+        return None
+    try:
+        return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
+def freeDiskSpace(directory):
+    """Bytes free on the disk of a directory, None if unknown"""
+    try:
+        return shutil.disk_usage(directory).free
+    except OSError:
+        return None
+
+
+class PreflightEstimate(namedtuple("PreflightEstimate", ["cloneBytes", "bufferBytes", "outputBytes"])):
+    """What an export is expected to need at most.
+
+    cloneBytes is the memory of the scaled clones, bufferBytes of the
+    pixels captured and encoded at the same time, outputBytes the disk
+    space of the written files.
+    """
+
+    __slots__ = ()
+
+    @property
+    def memoryBytes(self):
+        return self.cloneBytes + self.bufferBytes
+
+    def report(self, free_memory=None, free_disk=None):
+        """Human readable lines for the dry run"""
+        memory = f"Peak memory: about {formatBytes(self.memoryBytes)}"
+        if free_memory is not None:
+            memory += f" of {formatBytes(free_memory)} free"
+        disk = f"Disk space: about {formatBytes(self.outputBytes)}"
+        if free_disk is not None:
+            disk += f" of {formatBytes(free_disk)} free"
+        return [memory, disk]
+
+
+def planJobs(plan):
+    """Every job of a plan, including the layers packed into atlases"""
+    jobs = list(plan.jobs)
+    for atlas in plan.atlases:
+        jobs.extend(frame.job for frame in atlas.frames)
+    return jobs
+
+
+def estimateCloneBytes(plan, canvas_width, canvas_height, layer_bytes):
+    """Memory of the scaled clones, which stay open until the export ends.
+
+    layer_bytes is the pixel data of the document's layers; a clone holds
+    the same layers, scaled. The first clone is copied at full size before
+    it is scaled down, so one full copy is added on top.
+    """
+    sizes = {(job.width, job.height) for job in planJobs(plan)}
+    sizes.discard((canvas_width, canvas_height))
+    if not sizes:
+        return 0
+    canvasPixels = max(1, canvas_width * canvas_height)
+    held = sum(layer_bytes * width * height / canvasPixels for width, height in sizes)
+    return int(held + layer_bytes)
+
+
+def estimateBufferBytes(plan, pixel_size, parallel=False, max_pending=1, tiled=False,
+                        can_encode_raw=None):
+    """Peak memory of the image data being captured and encoded at the same time.
+
+    Krita's exporter copies the image once in the document's depth and
+    once as 8-bit; raw encodes hold the captured buffer and one converted
+    copy. With parallel encoding up to max_pending raw encodes wait on the
+    pool while Krita exports the next file; tiled PNGs only hold one band
+    of tiles. can_encode_raw tells which formats skip Krita's exporter.
+    """
+    onThread = []
+    onPool = []
+    for job in plan.jobs:
+        width, height = job.outputSize
+        raw = can_encode_raw is None or can_encode_raw(job.format)
+        if tiled and raw and job.format == "png" and not job.scaled:
+            onThread.append(width * DEFAULT_TILE_SIZE * 4 * 3)
+        elif parallel and raw:
+            onPool.append(width * height * 4 * 2)
+        else:
+            onThread.append(width * height * (pixel_size + 4))
+    for atlas in plan.atlases:
+        # The captured layers and the composed page, then encoded like a layer
+        pages = [width * height * 4 * 3 for width, height in atlas.pages]
+        (onPool if parallel else onThread).extend(pages)
+
+    largestThread = max(onThread, default=0)
+    if not parallel:
+        return largestThread
+    inFlight = sorted(onPool, reverse=True)[:max(1, max_pending)]
+    return largestThread + sum(inFlight)
+
+
+def estimateOutputBytes(plan):
+    """Disk space of the written files, plus the partial file of the largest one being written"""
+    sizes = [job.estimatedBytes for job in plan.jobs]
+    sizes.extend(atlas.estimatedBytes // max(1, len(atlas.pages)) for atlas in plan.atlases)
+    return plan.estimatedBytes() + max(sizes, default=0)
@@ -0,0 +1,115 @@
+# Quick Export Plugin for Krita
+# Based on Quick Export Layers Docker by fullmontis (public domain)
+
+from contextlib import contextmanager
+import json
+import os
+import threading
+import time
+
+
+class ExportProfiler(object):
+    """Collects wall time per export stage and per output file.
+
+    Stages are things like "clone", "scale", "refresh", "hash", "capture" or
+    "encode". Time spent for a file is also added to that file's record,
+    which gets its pixel count and output bytes once it is written.
+    Encoder threads report here too, so everything is guarded by a lock.
+    """
+
+    LOG_FILENAME = "quickexport-profile.jsonl"
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stageTotals = {}
+        self._fileStages = {}  # path -> {stage: seconds}
+        self._files = []
+        self._startTime = time.monotonic()
+        self._endTime = None
+
+    def addTime(self, stage, seconds, path=""):
+        with self._lock:
+            self._stageTotals[stage] = self._stageTotals.get(stage, 0.0) + seconds
+            if path:
+                stages = self._fileStages.setdefault(path, {})
+                stages[stage] = stages.get(stage, 0.0) + seconds
+
+    @contextmanager
+    def stage(self, stage, path=""):
+        """Time the body of a with block as one stage, optionally for one file"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.addTime(stage, time.perf_counter() - started, path)
+
+    def timedSteps(self, stage, iterator, path=""):
+        """Pass an iterator through, timing only the work inside each step.
+
+        Closing this generator also closes the wrapped one, so its cleanup
+        still runs when an export is cancelled.
+        """
+        try:
+            while True:
+                started = time.perf_counter()
+                try:
+                    next(iterator)
+                except StopIteration:
+                    return
+                finally:
+                    self.addTime(stage, time.perf_counter() - started, path)
+                yield
+        finally:
+            close = getattr(iterator, "close", None)
+            if close is not None:
+                close()
+
+    def recordFile(self, path, file_format, pixels, size=0):
+        """Record a written file with its pixel count and size in bytes"""
+        with self._lock:
+            stages = dict(self._fileStages.get(path, {}))
+            self._files.append({
+                "type": "file",
+                "path": path.replace(os.sep, "/"),
+                "format": file_format,
+                "pixels": pixels,
+                "bytes": size,
+                "seconds": round(sum(stages.values()), 6),
+                "stages": {name: round(seconds, 6) for name, seconds in stages.items()},
+            })
+
+    def stop(self):
+        self._endTime = time.monotonic()
+
+    def elapsed(self):
+        return (self._endTime or time.monotonic()) - self._startTime
+
+    def summary(self, max_stages=4):
+        """One line with the total time and the slowest stages"""
+        with self._lock:
+            stages = sorted(self._stageTotals.items(), key=lambda item: item[1], reverse=True)
+            totalBytes = sum(record["bytes"] for record in self._files)
+            fileCount = len(self._files)
+        parts = [f"{name} {seconds:.2f}s" for name, seconds in stages[:max_stages]]
+        line = f"{fileCount} files, {totalBytes / 1048576.0:.1f} MB in {self.elapsed():.2f}s"
+        if parts:
+            line += " (" + ", ".join(parts) + ")"
+        return line
+
+    def writeLog(self, directory, document_name=""):
+        """Append this run and every file record to the JSONL log in the export directory"""
+        with self._lock:
+            run = {
+                "type": "run",
+                "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "document": document_name,
+                "seconds": round(self.elapsed(), 6),
+                "files": len(self._files),
+                "bytes": sum(record["bytes"] for record in self._files),
+                "pixels": sum(record["pixels"] for record in self._files),
+                "stages": {name: round(seconds, 6) for name, seconds in self._stageTotals.items()},
+            }
+            lines = [run] + list(self._files)
+        with open(os.path.join(directory, self.LOG_FILENAME), "a", encoding="utf-8") as f:
+            for record in lines:
+                f.write(json.dumps(record, sort_keys=True) + "\n")
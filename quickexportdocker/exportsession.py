@@ -0,0 +1,1131 @@
+# Quick Export Plugin for Krita
+# Based on Quick Export Layers Docker by fullmontis (public domain)
+
+from PyQt5.QtCore import QRect
+import krita
+from concurrent.futures import Future
+import itertools
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from .exportarchive import ARCHIVE_FORMATS, ExportArchive
+from .exportatlas import DEFAULT_ATLAS_SIZE, planAtlases
+from .exportbuffers import DEFAULT_PIXEL_MEMORY_LIMIT, PixelBuffers
+from .exportbudget import (KRITA_ENCODER, RAW_ENCODER, EncodeThroughput, budgetJobs,
+                           fingerprintProperties)
+from .exportencoders import (ParallelEncoder, atomicOutput, canEncodeRaw, composePixels,
+                             encodeImage, encodeImageChunks, scalePixels, writeChunks)
+from .exportengine import ExportTask
+from .exportformats import exportProperties, isNativeFormat, isPixelFormat
+from .exportjournal import ExportJournal
+from .exportmanifest import ExportManifest
+from .exportoptimizer import DEFAULT_OPTIMIZE_COMMANDS, OptimizeStats, PostOptimizer, fileState
+from .exportplan import DEFAULT_OPTIONS, ExportPlan, buildExportPlan, formatBytes
+from .exportpreflight import (MEMORY_HEADROOM, PreflightEstimate, availableMemory,
+                              estimateBufferBytes, estimateCloneBytes, estimateOutputBytes,
+                              freeDiskSpace, pixelSize)
+from .exportprofiler import ExportProfiler
+from .exportsnapshot import SnapshotStore, snapshotKey
+from .exporttarget import (CONFIRM_RANGE, MAX_QUALITY, MIN_QUALITY, QualityCache, hasTargetSize,
+                           proxySize, qualityProperties, searchQuality)
+from .tiledexport import exportTiled
+
+
+# Every setting an export depends on. The docker builds one of these from its
+# widgets; headless exports load one from a preset JSON file.
+DEFAULT_PRESET = dict(DEFAULT_OPTIONS, **{
+    "directory": "",
+    "filename": "",  # Empty to use the document name
+    "rows": [],  # {"width", "height", "format", "transparency", "profile", "maxSize" (KB)}, or "scale" instead of a size
+    "batchmode": True,
+    "exportOnlySelected": False,
+    "createFileDirectory": False,
+    "skipUnchanged": False,
+    "parallelEncoding": False,
+    "tiledExport": False,
+    "tilePyramid": False,
+    "profile": False,  # Append stage timings to quickexport-profile.jsonl
+    "compressionBudget": 30,  # Seconds of encoding for rows with the "auto" profile
+    "archive": "",  # "zip" or "tar" to write every file into one archive
+    "atlas": False,  # Pack the cropped layers of every row into texture atlas pages
+    "atlasSize": DEFAULT_ATLAS_SIZE,  # Largest atlas page width and height
+    "atlasSpacing": 2,  # Transparent pixels between atlas frames
+    "dedupe": "",  # "hardlink" or "copy" to write identical outputs from the first one
+    "resume": False,  # Keep the outputs an interrupted export finished, per its journal
+    "preflight": True,  # Check memory and disk space first, encode fewer files at once if memory is short
+    "snapshot": False,  # Capture the document first and encode from the capture in the background
+    "pixelMemoryLimit": DEFAULT_PIXEL_MEMORY_LIMIT,  # MB of captured pixels kept in memory, the rest in temporary files
+    "optimize": False,  # Run the optimizer commands on the written files in the background
+    "optimizeCommands": DEFAULT_OPTIMIZE_COMMANDS,  # format -> command template with {file} (and {output})
+})
+
+THROUGHPUT_SETTING = "quick_export_throughput"
+QUALITY_SETTING = "quick_export_target_quality"
+
+
+def loadPreset(path):
+    """Read a preset JSON file, filling in defaults for missing settings"""
+    with open(path, "r", encoding="utf-8") as f:
+        preset = dict(DEFAULT_PRESET)
+        preset.update(json.load(f))
+    return preset
+
+
+def savePreset(path, preset):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(preset, f, indent=1, sort_keys=True)
+
+
+def createExportInfoObject(file_format, transparency=True, properties=None):
+    """Create InfoObject with format-specific export settings"""
+    if properties is None:
+        properties = exportProperties(file_format, transparency)
+    info = krita.InfoObject()
+    for key, value in properties.items():
+        info.setProperty(key, value)
+    return info
+
+
+def linkOrCopyFile(source, target, hardlink=True):
+    """Make target a hardlink of source, or a copy where links aren't supported, returning its size"""
+    if os.path.lexists(target):
+        os.remove(target)
+    if hardlink:
+        try:
+            os.link(source, target)
+            return os.path.getsize(target)
+        except OSError:
+            pass
+    shutil.copyfile(source, target)
+    return os.path.getsize(target)
+
+
+def documentName(document):
+    """Document file name without folder and extension, "Untitled" if never saved"""
+    if document and document.fileName():
+        return os.path.splitext(os.path.basename(document.fileName()))[0]
+    return "Untitled"
+
+
+class ExportSession(object):
+    """Exports one document with one preset.
+
+    start() plans the export and returns one ExportTask per output file.
+    The tasks can be run by the docker's ExportEngine or by runTasks() in
+    headless exports; finish() releases the scaled clones and saves the
+    manifest afterwards. Every run is timed per stage in self.profiler.
+
+    Before anything is written, start() checks the plan against free disk
+    space and memory; see preflight(). With a snapshot preset it then
+    captures everything the tasks read from the document; see takeSnapshot().
+
+    With an archive preset, the files go into one .zip or .tar in the export
+    directory instead. Files Krita writes itself are staged in a temporary
+    folder and moved into the archive right after they are saved.
+    """
+
+    def __init__(self, document, preset, encoder=None, optimizer=None):
+        self.document = document
+        self.preset = dict(DEFAULT_PRESET)
+        self.preset.update(preset)
+        self.directory = self.preset["directory"]
+        self.encoder = encoder or ParallelEncoder()
+        self.optimizer = optimizer or PostOptimizer()
+        self.optimizeStats = OptimizeStats()
+        self.plan = None
+        self.manifest = None
+        self.journal = None
+        self.archive = None
+        self.skippedCount = 0
+        self.dedupedCount = 0
+        self.dedupedBytes = 0
+        self.resumedCount = 0
+        self.collidedCount = 0  # Archive outputs left out for a later one of the same name
+        self.estimate = None
+        self.preflightNotes = []
+        # Background encodes allowed to wait at once, lowered by the preflight when memory is short
+        self.maxPending = self.encoder.maxWorkers * 2
+        self.profiler = ExportProfiler()
+        self.throughput = EncodeThroughput.fromJson(
+            Application.readSetting("", THROUGHPUT_SETTING, ""))
+        self.qualityCache = QualityCache.fromJson(
+            Application.readSetting("", QUALITY_SETTING, ""))
+        self.overBudget = []  # Outputs larger than their size limit even at the lowest quality
+        self._scaledDocuments = {}  # (width, height, filter) -> scaled clone
+        self._nodeStates = {}  # node uniqueId -> (pixel digest, bounds)
+        self.buffers = None
+        self.snapshot = None
+        self._snapshotDocument = None
+        self._stagingDir = None
+        self._stagingIds = itertools.count(1)
+        self._dedupe = ""
+        self._fingerprinting = False  # Hash the inputs of every output, only when an option needs it
+        self._outputs = {}  # fingerprint -> relative path of the first output written from it
+        self._pendingOutputs = {}  # relative path -> Future of an output still encoding
+        self._optimizing = {}  # relative path -> Future of an output's optimizer pass, for its duplicates
+        self._dedupeLock = threading.Lock()
+        self._resumable = {}  # relative path -> fingerprint of outputs an interrupted export finished
+
+    def validate(self):
+        """Get an error message if the export can't start, or an empty string"""
+        if not self.directory:
+            return i18n("Select an export directory.")
+        elif not os.path.exists(self.directory) or not os.path.isdir(self.directory):
+            return i18n("Export directory doesn't exist.")
+        elif not self.preset["rows"]:
+            return i18n("No formats to export.")
+        elif self.preset["archive"] and self.preset["archive"] not in ARCHIVE_FORMATS:
+            return i18n(f"Unknown archive format: {self.preset['archive']}")
+        elif self.preset["dedupe"] not in ("", "hardlink", "copy"):
+            return i18n(f"Unknown way to write identical files: {self.preset['dedupe']}")
+        return ""
+
+    def resolveRows(self):
+        """Format rows with every size in pixels of this document"""
+        rows = []
+        for row in self.preset["rows"]:
+            row = dict(row)
+            if "scale" in row:
+                row['width'] = max(1, int(round(self.document.width() * row['scale'])))
+                row['height'] = max(1, int(round(self.document.height() * row['scale'])))
+            else:
+                row.setdefault('width', self.document.width())
+                row.setdefault('height', self.document.height())
+            row.setdefault('transparency', True)
+            rows.append(row)
+        return rows
+
+    def encoderOf(self, file_format, atlas=False):
+        """The encoder that will most likely write a format, to estimate its speed"""
+        if not canEncodeRaw(self.document, file_format):
+            return KRITA_ENCODER
+        if (atlas or self.preset["parallelEncoding"] or self.preset["snapshot"]
+                or (self.preset["tiledExport"] and file_format.lower() == "png")):
+            return RAW_ENCODER
+        return KRITA_ENCODER
+
+    def buildPlan(self):
+        """Plan every file the preset would export from the document"""
+        exportName = self.preset["filename"] or documentName(self.document)
+
+        exportDir = ""
+
+        baseNode = self.document.rootNode()
+
+        if self.preset["exportOnlySelected"]:
+            baseNode = self.document.activeNode()
+            if baseNode:
+                exportName = baseNode.name()
+
+        if self.preset["createFileDirectory"]:
+            exportDir = exportName
+
+        options = {key: self.preset[key] for key in DEFAULT_OPTIONS}
+        packAtlases = self.preset["atlas"] and self.preset["layersSeparately"]
+        if packAtlases:
+            # Atlas frames are the layers cropped to their content
+            options["cropToContent"] = True
+        plan = buildExportPlan(baseNode, exportName, exportDir,
+                               self.document.width(), self.document.height(),
+                               self.document.resolution(), self.resolveRows(), options)
+
+        # Pick the compression of "auto" rows from the measured encode speeds
+        workers = self.encoder.maxWorkers if self.preset["parallelEncoding"] else 1
+        jobs = budgetJobs(plan.jobs, self.preset["compressionBudget"], self.throughput, workers,
+                          lambda file_format: self.encoderOf(file_format, packAtlases))
+        if not packAtlases:
+            return ExportPlan(jobs, plan.directories, plan.summaryNames,
+                              plan.exportName, plan.exportDir)
+
+        # Formats and settings that can't be written from the pixel buffer stay separate files
+        atlases, jobs = planAtlases(jobs, plan.exportName, plan.exportDir,
+                                    self.document.width(), self.document.resolution(),
+                                    self.preset["atlasSize"], self.preset["atlasSpacing"],
+                                    lambda file_format, properties:
+                                        canEncodeRaw(self.document, file_format, properties))
+        # Group folders are only needed by the layers still written as files
+        folders = {job.folder for job in jobs}
+        directories = [directory for directory in plan.directories
+                       if directory == plan.exportDir
+                       or any(folder == directory or folder.startswith(directory + os.sep)
+                              for folder in folders)]
+        return ExportPlan(jobs, directories, plan.summaryNames,
+                          plan.exportName, plan.exportDir, atlases)
+
+    def preflight(self):
+        """Check the plan against free disk space and memory, returning an error message or "".
+
+        An export whose files won't fit on the disk fails before writing
+        anything. One that would need more memory than is free encodes
+        fewer files at once and streams canvas sized PNGs tile by tile,
+        unless it exports from a snapshot, which is never tiled;
+        preflightNotes says what was changed, or that memory may still run
+        out. self.estimate keeps what the export is expected to need.
+        """
+        document = self.document
+        self.preflightNotes = []
+        size = pixelSize(document.colorModel(), document.colorDepth())
+        cloneBytes = estimateCloneBytes(self.plan, document.width(), document.height(),
+                                        self.getLayerBytes(size))
+
+        def estimate():
+            # Snapshot exports encode every file from captured pixels, never tile by tile
+            tiled = self.preset["tiledExport"] and not self.preset["snapshot"]
+            bufferBytes = estimateBufferBytes(self.plan, size, self.preset["parallelEncoding"],
+                                              self.maxPending, tiled,
+                                              lambda file_format: canEncodeRaw(document, file_format))
+            return PreflightEstimate(cloneBytes, bufferBytes, estimateOutputBytes(self.plan))
+
+        self.estimate = estimate()
+        freeDisk = freeDiskSpace(self.directory)
+        if freeDisk is not None:
+            # Files that are replaced free their space again
+            if self.estimate.outputBytes > freeDisk + self.getExistingOutputBytes():
+                return i18n(f"Not enough disk space: the export needs about "
+                            f"{formatBytes(self.estimate.outputBytes)}, "
+                            f"{formatBytes(freeDisk)} is free.")
+
+        freeMemory = availableMemory()
+        if freeMemory is None:
+            return ""
+        limit = freeMemory * MEMORY_HEADROOM
+        if self.preset["parallelEncoding"] and self.estimate.memoryBytes > limit:
+            pending = self.maxPending
+            while self.maxPending > 1 and self.estimate.memoryBytes > limit:
+                self.maxPending = max(1, self.maxPending // 2)
+                self.estimate = estimate()
+            if self.maxPending == 1:
+                self.preflightNotes.append(i18n("Memory is short, encoding one file at a time."))
+            elif self.maxPending < pending:
+                self.preflightNotes.append(
+                    i18n(f"Memory is short, encoding at most {self.maxPending} files at once."))
+        if (not self.preset["tiledExport"] and not self.preset["snapshot"]
+                and self.estimate.memoryBytes > limit):
+            # Only the tiled export itself, not the pyramid that comes with the option
+            self.preset.update(tiledExport=True, tilePyramid=False)
+            tiledEstimate = estimate()
+            if tiledEstimate.memoryBytes < self.estimate.memoryBytes:
+                self.estimate = tiledEstimate
+                self.preflightNotes.append(i18n("Memory is short, PNG files are exported tile by tile."))
+            else:
+                self.preset["tiledExport"] = False
+        if self.estimate.memoryBytes > limit:
+            self.preflightNotes.append(
+                i18n(f"The export may need about {formatBytes(self.estimate.memoryBytes)} of memory, "
+                     f"{formatBytes(freeMemory)} is free."))
+        for note in self.preflightNotes:
+            print(f"Quick Export: {note}")
+        return ""
+
+    def getLayerBytes(self, pixel_size):
+        """Pixel data of the document's layers and projection, what a clone of it holds"""
+        canvas = QRect(0, 0, self.document.width(), self.document.height())
+        pixels = canvas.width() * canvas.height()
+        nodes = list(self.document.rootNode().childNodes())
+        while nodes:
+            node = nodes.pop()
+            nodes.extend(node.childNodes())
+            bounds = node.bounds().intersected(canvas)
+            pixels += bounds.width() * bounds.height()
+        return pixels * pixel_size
+
+    def getExistingOutputBytes(self):
+        """Size of the files from an earlier export that this one replaces"""
+        if self.preset["archive"]:
+            paths = [self.archivePath()]
+        else:
+            paths = [os.path.join(self.directory, job.relativePath) for job in self.plan.jobs]
+            for atlas in self.plan.atlases:
+                paths.extend(os.path.join(self.directory, atlas.pagePath(page))
+                             for page in range(len(atlas.pages)))
+        total = 0
+        for path in paths:
+            try:
+                total += os.path.getsize(path)
+            except OSError:
+                pass
+        return total
+
+    def dropCollidingJobs(self, plan):
+        """Plan without the jobs a later job of the same path would overwrite.
+
+        Archive entries can't be replaced, so only the last job writing a
+        path is kept, the one whose file would be left on disk.
+        """
+        colliding = {id(job) for jobs in plan.collisions() for job in jobs[:-1]}
+        if not colliding:
+            return plan
+        self.collidedCount = len(colliding)
+        return ExportPlan([job for job in plan.jobs if id(job) not in colliding],
+                          plan.directories, plan.summaryNames, plan.exportName,
+                          plan.exportDir, plan.atlases)
+
+    def createTasks(self):
+        """One task per planned file and per atlas page"""
+        tasks = [ExportTask(job.relativePath, self.exportJob, job) for job in self.plan.jobs]
+        for atlas in self.plan.atlases:
+            for page in range(len(atlas.pages)):
+                tasks.append(ExportTask(atlas.pagePath(page), self.exportAtlasPage, atlas, page))
+        return tasks
+
+    def start(self, defer_snapshot=False):
+        """Plan the export, create its folders and get the tasks to run.
+
+        With defer_snapshot, the caller takes the snapshot with
+        captureSnapshot() right before the first task runs.
+        """
+        self.profiler = ExportProfiler()
+        with self.profiler.stage("plan"):
+            self.plan = self.buildPlan()
+        self.collidedCount = 0
+        if self.preset["archive"]:
+            self.plan = self.dropCollidingJobs(self.plan)
+        if self.preset["preflight"]:
+            with self.profiler.stage("preflight"):
+                error = self.preflight()
+            if error:
+                raise RuntimeError(error)
+        self._nodeStates = {}
+        self._outputs = {}
+        self._pendingOutputs = {}
+        self._optimizing = {}
+        self.dedupedCount = 0
+        self.dedupedBytes = 0
+        self.optimizeStats = OptimizeStats()
+        self.overBudget = []
+        # Zip entries can't link to each other, tar entries can
+        self._dedupe = self.preset["dedupe"]
+        if self.preset["archive"] == "zip":
+            self._dedupe = ""
+        # Fingerprints read every node's pixels, they are only worth it to skip, resume or deduplicate
+        self._fingerprinting = bool(self._dedupe or (not self.preset["archive"] and (
+            self.preset["skipUnchanged"] or self.preset["resume"])))
+        if self.preset["archive"]:
+            # The archive is rewritten whole, so there is nothing to skip and no folders to create
+            self.manifest = None
+            self.archive = ExportArchive(self.archivePath(), self.preset["archive"])
+            self._stagingDir = tempfile.mkdtemp(prefix=".quickexport-", dir=self.directory)
+            self.skippedCount = 0
+        else:
+            with self.profiler.stage("mkdir"):
+                for exportDir in self.plan.directories:
+                    self.createDirectory(exportDir)
+            # Without fingerprints, a manifest left by earlier exports only forgets the outputs rewritten now
+            manifestPath = os.path.join(self.directory, ExportManifest.FILENAME)
+            self.manifest = None
+            if self._fingerprinting or os.path.isfile(manifestPath):
+                with self.profiler.stage("manifest"):
+                    self.manifest = ExportManifest(self.directory).load()
+            if self._fingerprinting:
+                self.journal = ExportJournal(self.directory, self.plan.exportName)
+                self._resumable = self.journal.load() if self.preset["resume"] else {}
+                self.journal.open()
+            self.skippedCount = 0
+            self.resumedCount = 0
+        self.buffers = PixelBuffers(self.preset["pixelMemoryLimit"] * 1024 * 1024,
+                                    self._stagingDir or self.directory)
+        if not defer_snapshot:
+            self.captureSnapshot()
+        return self.createTasks()
+
+    def captureSnapshot(self):
+        """Take the snapshot if the preset asks for one and it isn't taken yet"""
+        if self.preset["snapshot"] and self.snapshot is None:
+            with self.profiler.stage("snapshot"):
+                self.takeSnapshot()
+
+    def takeSnapshot(self):
+        """Capture everything the export reads from the document, so it can be edited while the files are written.
+
+        The pixels of every output the encoders can write are captured into
+        the snapshot store, and their digests and bounds for the manifest.
+        The scaled clones are made now, and outputs written by Krita's own
+        exporter are saved from one more clone of the document, which Krita
+        makes cheaply by sharing its tiles until either copy is edited.
+        """
+        self.snapshot = SnapshotStore(self.buffers)
+        # Atlas pages are always written whole, their layers are never skipped
+        jobs = [(job, True) for job in self.plan.jobs]
+        for atlas in self.plan.atlases:
+            jobs.extend((frame.job, False) for frame in atlas.frames)
+
+        needsDocument = False
+        for job, skippable in jobs:
+            fingerprint = None
+            if skippable and self._fingerprinting:
+                fingerprint = self.getExportFingerprint(
+                    job.node, job.format, job.width, job.height,
+                    fingerprintProperties(job.format, job.profile, job.properties), job.crop)
+            # The export makes the same decision from the same fingerprint, nothing to capture
+            if (fingerprint and self.manifest is not None and self.preset["skipUnchanged"]
+                    and self.manifest.isUpToDate(job.relativePath, fingerprint)):
+                continue
+            if isNativeFormat(job.format) or not canEncodeRaw(self.document, job.format, job.properties):
+                if job.scaled:
+                    self.getScaledDocument(job.width, job.height)
+                else:
+                    needsDocument = True
+                continue
+            _, sourceNode = self.getSourceNode(job.node, job.width, job.height)
+            rect = job.crop or (0, 0, job.width, job.height)
+            key = snapshotKey(job.node, job.width, job.height, rect)
+            if key in self.snapshot:
+                self.snapshot.add(key)
+            else:
+                self.snapshot.add(key, sourceNode.projectionPixelData(*rect))
+
+        if needsDocument:
+            self._snapshotDocument = self.document.clone()
+            self._snapshotDocument.refreshProjection()
+            self._snapshotDocument.waitForDone()
+
+    def capturePixels(self, node, target_width, target_height, rect, relative_path, source_node=None):
+        """PixelBuffer of a node's area at an export size, from the snapshot if one was taken.
+
+        The job that encodes it releases it when it is done.
+        """
+        if self.snapshot is not None:
+            key = snapshotKey(node, target_width, target_height, rect)
+            if key in self.snapshot:
+                return self.snapshot.take(key)
+        if source_node is None:
+            _, source_node = self.getSourceNode(node, target_width, target_height)
+        with self.profiler.stage("capture", relative_path):
+            return self.buffers.store(source_node.projectionPixelData(*rect))
+
+    def releasePixels(self, node, target_width, target_height, rect):
+        """Free the snapshot of an output that doesn't need to be encoded after all"""
+        if self.snapshot is not None:
+            key = snapshotKey(node, target_width, target_height, rect)
+            if key in self.snapshot:
+                self.snapshot.take(key).release()
+
+    def finish(self, success=True):
+        """Release the scaled clones and save what was exported, even after a cancel"""
+        with self.profiler.stage("close"):
+            self.closeScaledDocuments()
+        self._nodeStates = {}
+        self._outputs = {}
+        self._pendingOutputs = {}
+        if self.snapshot is not None:
+            self.snapshot.close()
+            self.snapshot = None
+        if self.buffers is not None:
+            # Buffers of encodes cancelled before they started
+            self.buffers.close()
+            self.buffers = None
+        if self.manifest is not None:
+            try:
+                # Outputs written before a cancel or failure are still valid
+                with self.profiler.stage("manifest"):
+                    self.manifest.save()
+            except OSError as e:
+                print(f"Quick Export: Error saving export manifest: {e}")
+        if self.journal is not None:
+            # Kept after a cancel or failure so the export can be resumed
+            self.journal.close(success)
+            self.journal = None
+        self._resumable = {}
+        if success and self.preset["layersSeparately"] and self.preset["cropToContent"] and self.plan.jobs:
+            self.writeLayoutFile()
+        if success:
+            for atlas in self.plan.atlases:
+                self.writeJsonFile(atlas.mapPath, atlas.frameMap(), "atlas frame map")
+        if self.archive is not None:
+            self.finishArchive(success)
+        Application.writeSetting("", THROUGHPUT_SETTING, self.throughput.toJson())
+        Application.writeSetting("", QUALITY_SETTING, self.qualityCache.toJson())
+        self.profiler.stop()
+        if self.preset["profile"]:
+            try:
+                self.profiler.writeLog(self.directory, documentName(self.document))
+            except OSError as e:
+                print(f"Quick Export: Error writing export profile: {e}")
+
+    def writeLayoutFile(self):
+        """Save the canvas position of every cropped layer next to the exported files"""
+        relativePath = os.path.join(self.plan.exportDir, f"{self.plan.exportName}_layout.json")
+        self.writeJsonFile(relativePath, self.plan.layout(), "layout file")
+
+    def writeJsonFile(self, relative_path, data, description):
+        """Write a JSON file into the export directory or the archive"""
+        try:
+            if self.archive is not None:
+                self.archive.writeChunks(relative_path, [json.dumps(data, indent=1).encode("utf-8")])
+                return
+            with atomicOutput(os.path.join(self.directory, relative_path)) as partPath:
+                with open(partPath, "w", encoding="utf-8") as f:
+                    json.dump(data, f, indent=1)
+        except OSError as e:
+            print(f"Quick Export: Error writing {description}: {e}")
+
+    def archivePath(self):
+        """Path of the archive an archive export writes, named after the export"""
+        return os.path.join(self.directory, f"{self.plan.exportName}.{self.preset['archive']}")
+
+    def finishArchive(self, success):
+        """Move a complete archive into place, or delete an unfinished one"""
+        try:
+            with self.profiler.stage("archive"):
+                if success:
+                    self.archive.close()
+                else:
+                    self.archive.abort()
+        except OSError as e:
+            print(f"Quick Export: Error writing archive: {e}")
+            self.archive.abort()
+        self.collidedCount += self.archive.duplicateNames
+        self.archive = None
+        if self._stagingDir:
+            shutil.rmtree(self._stagingDir, ignore_errors=True)
+            self._stagingDir = None
+
+    def outputPath(self, relative_path):
+        """Where Krita should save an output: in the export directory, or staged for the archive"""
+        if self.archive is None:
+            return os.path.join(self.directory, relative_path)
+        # Keep the file name, Krita picks its exporter by the extension
+        return os.path.join(self._stagingDir,
+                            f"{next(self._stagingIds)}_{os.path.basename(relative_path)}")
+
+    def storeOutput(self, relative_path, path):
+        """Move a staged output into the archive, returning the size of the output"""
+        if self.archive is None:
+            return os.path.getsize(path) if os.path.isfile(path) else 0
+        try:
+            with self.profiler.stage("archive", relative_path):
+                return self.archive.writeFile(relative_path, path)
+        finally:
+            os.remove(path)
+
+    def getScaledDocument(self, target_width, target_height, filter_name="Bilinear"):
+        """Get a scaled clone of the document, cloning and scaling only once per size"""
+        key = (target_width, target_height, filter_name)
+        clonedDoc = self._scaledDocuments.get(key)
+        if clonedDoc is None:
+            with self.profiler.stage("clone"):
+                clonedDoc = self.getDownscaleSource(target_width, target_height,
+                                                    filter_name).clone()
+            with self.profiler.stage("scale"):
+                clonedDoc.scaleImage(target_width, target_height,
+                                    int(clonedDoc.xRes()), int(clonedDoc.yRes()), filter_name)
+            with self.profiler.stage("refresh"):
+                clonedDoc.refreshProjection()
+                clonedDoc.waitForDone()
+            self._scaledDocuments[key] = clonedDoc
+        return clonedDoc
+
+    def getDownscaleSource(self, target_width, target_height, filter_name):
+        """Get the smallest already scaled clone a size can be downscaled from, or the document.
+
+        Chaining downscales (4096 -> 2048 -> 1024 ...) resamples far fewer
+        pixels than scaling every size from the full canvas. Upscaled clones
+        are never used as a source.
+        """
+        document = self.document
+        source = document
+        sourcePixels = document.width() * document.height()
+        for (width, height, cachedFilter), clonedDoc in self._scaledDocuments.items():
+            if cachedFilter != filter_name:
+                continue
+            if not (target_width <= width <= document.width()
+                    and target_height <= height <= document.height()):
+                continue
+            if width * height < sourcePixels:
+                source = clonedDoc
+                sourcePixels = width * height
+        return source
+
+    def closeScaledDocuments(self):
+        """Close every scaled clone and the snapshot clone created during this export"""
+        clones = list(self._scaledDocuments.values())
+        if self._snapshotDocument is not None:
+            clones.append(self._snapshotDocument)
+        for clonedDoc in clones:
+            try:
+                clonedDoc.close()
+            except Exception as e:
+                print(f"Quick Export: Error closing scaled document: {e}")
+        self._scaledDocuments = {}
+        self._snapshotDocument = None
+
+    def findMatchingNode(self, node, clonedDoc):
+        """Find the node in a cloned document that corresponds to a node of the original"""
+        # Record the child index of every ancestor, from the node up to the root
+        path = []
+        current = node
+        parent = current.parentNode()
+        while parent is not None:
+            siblings = parent.childNodes()
+            index = next((i for i, sibling in enumerate(siblings)
+                          if sibling.uniqueId() == current.uniqueId()), None)
+            if index is None:
+                return None
+            path.append(index)
+            current = parent
+            parent = current.parentNode()
+
+        # Walk the same indices down the clone's tree
+        clonedNode = clonedDoc.rootNode()
+        for index in reversed(path):
+            children = clonedNode.childNodes()
+            if index >= len(children):
+                return None
+            clonedNode = children[index]
+        return clonedNode
+
+    def getNodeState(self, node):
+        """Digest of a node's pixels and its bounds, read once per node per export"""
+        key = node.uniqueId()
+        state = self._nodeStates.get(key)
+        if state is None:
+            bounds = node.bounds()
+            with self.profiler.stage("hash"):
+                if bounds.isEmpty():
+                    pixelHash = ExportManifest.hashPixels(b"")
+                else:
+                    pixelHash = ExportManifest.hashPixels(node.projectionPixelData(
+                        bounds.x(), bounds.y(), bounds.width(), bounds.height()))
+            state = (pixelHash, (bounds.x(), bounds.y(), bounds.width(), bounds.height()))
+            self._nodeStates[key] = state
+        return state
+
+    def getExportFingerprint(self, node, file_format,
+                             target_width, target_height, properties, crop=None):
+        """Fingerprint of everything an exported file depends on, None if it can't be tracked"""
+        # Native formats carry the whole layer stack, not just the node's projection
+        if isNativeFormat(file_format):
+            return None
+        pixelHash, bounds = self.getNodeState(node)
+        return ExportManifest.fingerprint(
+            pixelHash,
+            bounds,
+            (target_width, target_height),
+            file_format,
+            properties,
+            self.document.resolution(),
+            crop)
+
+    def exportJob(self, job):
+        """Export one planned job, returning a Future if it is encoded in the background"""
+        result = self.exportNodeWithScale(job.node, job.folder, job.filename, job.format,
+                                          job.width, job.height, job.transparency,
+                                          job.properties, job.crop,
+                                          fingerprintProperties(job.format, job.profile,
+                                                                job.properties))
+        if self._dedupe and isinstance(result, Future):
+            # Duplicates of this output are written once it is done
+            self._pendingOutputs[job.relativePath] = result
+        return result
+
+    def writeDuplicate(self, original_path, relative_path, fingerprint, file_format, pixels):
+        """Write an output identical to one already exported, after it is done if it is still encoding"""
+        if os.path.normcase(original_path) == os.path.normcase(relative_path):
+            # The same file planned twice, it is written already
+            return
+        future = self._pendingOutputs.get(original_path)
+        if future is None:
+            self.storeDuplicate(original_path, relative_path, fingerprint, file_format, pixels)
+            return
+
+        result = Future()
+
+        def onOriginalDone(original):
+            if original.cancelled():
+                result.cancel()
+                return
+            if not result.set_running_or_notify_cancel():
+                return
+            try:
+                original.result()
+                self.storeDuplicate(original_path, relative_path, fingerprint, file_format, pixels)
+            except Exception as e:
+                result.set_exception(e)
+            else:
+                result.set_result(None)
+
+        future.add_done_callback(onOriginalDone)
+        return result
+
+    def storeDuplicate(self, original_path, relative_path, fingerprint, file_format, pixels):
+        """Hardlink or copy an output from the identical one exported before it"""
+        with self.profiler.stage("dedupe", relative_path):
+            if self.archive is not None:
+                size = self.archive.writeLink(relative_path, original_path)
+            else:
+                originalPath = os.path.join(self.directory, original_path)
+                originalState = fileState(originalPath)
+                size = linkOrCopyFile(originalPath, os.path.join(self.directory, relative_path),
+                                      self._dedupe == "hardlink")
+                with self._dedupeLock:
+                    optimizing = self._optimizing.get(original_path)
+                if optimizing is not None:
+                    self.followOptimizedOutput(optimizing, original_path, relative_path, originalState)
+        self.profiler.recordFile(relative_path, file_format, pixels, size)
+        with self._dedupeLock:
+            self.dedupedCount += 1
+            self.dedupedBytes += size
+        self.recordOutput(relative_path, fingerprint)
+
+    def optimizeOutput(self, relative_path, file_format):
+        """Queue a written file for the optimizer command of its format, if there is one"""
+        if not self.preset["optimize"] or self.archive is not None:
+            return
+        command = self.preset["optimizeCommands"].get(file_format.lower(), "").strip()
+        if not command:
+            return
+        path = os.path.join(self.directory, relative_path)
+        if os.path.isfile(path):
+            future = self.optimizer.submit(path, command, self.optimizeStats)
+            if self._dedupe:
+                with self._dedupeLock:
+                    self._optimizing[relative_path] = future
+
+    def followOptimizedOutput(self, future, original_path, relative_path, original_state):
+        """Link or copy a duplicate again once the optimizer replaced its original.
+
+        Replacing the original breaks a hardlink and leaves a copy behind,
+        so either would keep the unoptimized bytes. original_state is the
+        original as the duplicate was made from it; a duplicate written
+        again meanwhile is left alone.
+        """
+        originalPath = os.path.join(self.directory, original_path)
+        duplicatePath = os.path.join(self.directory, relative_path)
+        duplicateState = fileState(duplicatePath)
+        hardlink = self._dedupe == "hardlink"
+
+        def refresh(_):
+            try:
+                if fileState(duplicatePath) != duplicateState or fileState(originalPath) == original_state:
+                    return
+                linkOrCopyFile(originalPath, duplicatePath, hardlink)
+            except OSError as e:
+                print(f"Quick Export: Could not update {relative_path} from the optimized {original_path}: {e}")
+
+        # Runs on the optimizer thread, or right away if the pass is done already
+        future.add_done_callback(refresh)
+
+    def recordOutput(self, relative_path, fingerprint):
+        """Remember a finished output in the manifest and the journal"""
+        if self.manifest is None:
+            return
+        if not fingerprint:
+            self.manifest.forget(relative_path)
+            return
+        self.manifest.record(relative_path, fingerprint)
+        if self.journal is not None:
+            self.journal.record(relative_path, fingerprint)
+
+    def exportNodeWithScale(self, node, export_folder, filename, file_format,
+                            target_width, target_height, transparency=True, properties=None,
+                            crop=None, fingerprint_properties=None):
+        """Export a single node with scaling and format-specific settings.
+
+        fingerprint_properties replaces properties in the manifest, for
+        settings that may differ between otherwise identical exports.
+        """
+        if properties is None:
+            properties = exportProperties(file_format, transparency)
+
+        relative_path = os.path.join(export_folder, f"{filename}.{file_format}")
+
+        document = self.document
+        originalWidth = document.width()
+        originalHeight = document.height()
+
+        # Skip outputs whose pixels and settings match the last export
+        fingerprint = None
+        if self._fingerprinting:
+            fingerprint = self.getExportFingerprint(node, file_format, target_width, target_height,
+                                                    fingerprint_properties or properties, crop)
+        if (fingerprint and self.manifest is not None and self.preset["skipUnchanged"]
+                and self.manifest.isUpToDate(relative_path, fingerprint)):
+            self.skippedCount += 1
+            self._outputs.setdefault(fingerprint, relative_path)
+            return
+
+        # Outputs an interrupted export already finished don't need to be encoded again
+        if (fingerprint and self._resumable
+                and self._resumable.get(self.journal.normalizePath(relative_path)) == fingerprint
+                and os.path.isfile(os.path.join(self.directory, relative_path))):
+            self.resumedCount += 1
+            self._outputs.setdefault(fingerprint, relative_path)
+            self.recordOutput(relative_path, fingerprint)
+            self.releasePixels(node, target_width, target_height,
+                               crop or (0, 0, target_width, target_height))
+            return
+
+        # Outputs with the same inputs as one exported before are identical, link or copy it
+        if fingerprint and self._dedupe:
+            originalPath = self._outputs.setdefault(fingerprint, relative_path)
+            if originalPath != relative_path:
+                pixels = crop[2] * crop[3] if crop else target_width * target_height
+                self.releasePixels(node, target_width, target_height,
+                                   crop or (0, 0, target_width, target_height))
+                return self.writeDuplicate(originalPath, relative_path, fingerprint,
+                                           file_format, pixels)
+
+        export_file_path = self.outputPath(relative_path)
+
+        # Handle native format exports differently
+        formatUpper = file_format.upper()
+
+        # Check if we need to scale
+        needsScaling = (target_width != originalWidth or target_height != originalHeight)
+
+        if needsScaling:
+            # Reuse the scaled clone shared by every node of this size
+            sourceDoc = self.getScaledDocument(target_width, target_height)
+        else:
+            # Snapshot exports read the clone taken before the artist went on painting
+            sourceDoc = self._snapshotDocument or document
+
+        # Snapshot exports always encode in the background, the document isn't read anymore
+        background = self.preset["parallelEncoding"] or self.snapshot is not None
+        profiler = self.profiler
+        pixelCount = target_width * target_height
+
+        if formatUpper == "KRA":
+            # Exported, not saved as: saveAs would bind the document to the part file renamed away next
+            info = createExportInfoObject(file_format, transparency, properties)
+            with profiler.stage("encode", relative_path), atomicOutput(export_file_path) as partPath:
+                sourceDoc.exportImage(partPath, info)
+        elif formatUpper == "PSD":
+            info = createExportInfoObject(file_format, transparency, properties)
+            with profiler.stage("encode", relative_path), atomicOutput(export_file_path) as partPath:
+                sourceDoc.exportImage(partPath, info)
+        else:
+            sourceNode = node
+            if sourceDoc is not document:
+                sourceNode = self.findMatchingNode(node, sourceDoc)
+                if sourceNode is None:
+                    raise RuntimeError(f"Could not find layer '{node.name()}' in the scaled document")
+            x, y, width, height = crop or (0, 0, sourceDoc.width(), sourceDoc.height())
+            pixelCount = width * height
+
+            if isPixelFormat(file_format):
+                # Krita has no exporter for these, they are written from the pixel buffer
+                if not canEncodeRaw(sourceDoc, file_format):
+                    raise RuntimeError(f"{formatUpper} export needs an 8-bit RGBA document")
+                buffer = self.capturePixels(node, target_width, target_height, (x, y, width, height),
+                                            relative_path, sourceNode)
+                if background:
+                    return self.encoder.submit(self.encodeRawJob, buffer, width, height, export_file_path,
+                                               file_format, properties, relative_path, fingerprint)
+                self.encodeRawJob(buffer, width, height, export_file_path,
+                                  file_format, properties, relative_path, fingerprint)
+                return
+
+            if (self.preset["tiledExport"] and not needsScaling and self.snapshot is None
+                    and formatUpper == "PNG" and canEncodeRaw(sourceDoc, file_format)):
+                # Stream the projection tile by tile instead of saving the whole image at once
+                return self.exportTiledJob(sourceNode, (x, y, width, height), export_file_path,
+                                           properties, sourceDoc.resolution(),
+                                           relative_path, fingerprint)
+
+            targetSize = hasTargetSize(file_format, properties)
+            targetKey = self.targetKey(node, file_format, width, height) if targetSize else None
+            if (background or targetSize) and canEncodeRaw(sourceDoc, file_format, properties):
+                # Grab the pixels here, encode and write them on the thread pool.
+                # Size limited outputs are searched on the pixels too, they are encoded many times
+                buffer = self.capturePixels(node, target_width, target_height, (x, y, width, height),
+                                            relative_path, sourceNode)
+                if background:
+                    return self.encoder.submit(self.encodeRawJob, buffer, width, height, export_file_path,
+                                               file_format, properties, relative_path, fingerprint,
+                                               targetKey)
+                self.encodeRawJob(buffer, width, height, export_file_path, file_format,
+                                  properties, relative_path, fingerprint, targetKey)
+                return
+
+            bounds = QRect(x, y, width, height)
+            started = time.perf_counter()
+            with profiler.stage("encode", relative_path), atomicOutput(export_file_path) as partPath:
+                if targetSize:
+                    self.saveToTargetSize(sourceNode, sourceDoc, partPath, file_format, transparency,
+                                          properties, bounds, relative_path, targetKey)
+                else:
+                    info = createExportInfoObject(file_format, transparency, properties)
+                    sourceNode.save(partPath,
+                                    sourceDoc.resolution() / 72.,
+                                    sourceDoc.resolution() / 72.,
+                                    info, bounds)
+            if not targetSize:
+                # A size search saves several times, it says nothing about one encode's speed
+                self.throughput.record(KRITA_ENCODER, file_format, properties, pixelCount,
+                                       time.perf_counter() - started)
+
+        size = self.storeOutput(relative_path, export_file_path)
+        profiler.recordFile(relative_path, file_format, pixelCount, size)
+        self.optimizeOutput(relative_path, file_format)
+        self.recordOutput(relative_path, fingerprint)
+
+    def encodeRawJob(self, buffer, width, height, export_file_path, file_format,
+                     properties, relative_path, fingerprint, target_key=None):
+        """Encode a captured PixelBuffer to a file or the archive and release it (runs on the encoder threads)"""
+        started = time.perf_counter()
+        try:
+            with self.profiler.stage("encode", relative_path):
+                if hasTargetSize(file_format, properties):
+                    chunks = self.encodeToTargetSize(buffer.view(), width, height, file_format, properties,
+                                                     relative_path, target_key or relative_path)
+                    if self.archive is None:
+                        size = writeChunks(export_file_path, chunks)
+                elif self.archive is None:
+                    size = encodeImage(buffer.view(), width, height, export_file_path,
+                                       file_format, properties)
+                else:
+                    chunks = encodeImageChunks(buffer.view(), width, height, file_format, properties)
+        finally:
+            buffer.release()
+        self.throughput.record(RAW_ENCODER, file_format, properties, width * height,
+                               time.perf_counter() - started)
+        if self.archive is not None:
+            with self.profiler.stage("archive", relative_path):
+                size = self.archive.writeChunks(relative_path, chunks)
+        self.profiler.recordFile(relative_path, file_format, width * height, size)
+        self.optimizeOutput(relative_path, file_format)
+        self.recordOutput(relative_path, fingerprint)
+
+    def targetKey(self, node, file_format, width, height):
+        """Key of a node's output in the quality cache of size limited formats"""
+        return f"{node.uniqueId()}:{file_format}:{width}x{height}"
+
+    def encodeToTargetSize(self, data, width, height, file_format, properties, relative_path, target_key):
+        """Encode pixels at the highest quality that fits the size limit, as the chunks of the file.
+
+        Without a cached quality, the search starts on a proxy of the image
+        and only confirms its answer at full size. May run on the encoder threads.
+        """
+        maxBytes = properties["maxBytes"]
+        encoded = {}
+
+        def encode(quality):
+            if quality not in encoded:
+                chunks = encodeImageChunks(data, width, height, file_format,
+                                           qualityProperties(file_format, properties, quality))
+                encoded[quality] = (sum(len(chunk) for chunk in chunks), chunks)
+            return encoded[quality]
+
+        low, high = MIN_QUALITY, MAX_QUALITY
+        guess = self.qualityCache.get(target_key)
+        proxy = proxySize(width, height)
+        if guess is None and proxy is not None:
+            proxyWidth, proxyHeight = proxy
+            proxyData = scalePixels(data, width, height, proxyWidth, proxyHeight)
+            proxyBudget = maxBytes * proxyWidth * proxyHeight / (width * height)
+            guess, _, _ = searchQuality(
+                lambda quality: (sum(len(chunk) for chunk in encodeImageChunks(
+                    proxyData, proxyWidth, proxyHeight, file_format,
+                    qualityProperties(file_format, properties, quality))), None),
+                proxyBudget)
+            low, high = max(MIN_QUALITY, guess - CONFIRM_RANGE), min(MAX_QUALITY, guess + CONFIRM_RANGE)
+
+        quality, chunks, fits = searchQuality(encode, maxBytes, low, high, guess)
+        if not fits and low > MIN_QUALITY:
+            # The proxy was too optimistic, search the qualities below
+            quality, chunks, fits = searchQuality(encode, maxBytes, MIN_QUALITY, low - 1)
+        elif fits and quality == high < MAX_QUALITY:
+            # Or too pessimistic, see if a higher one fits too
+            higher, higherChunks, higherFits = searchQuality(encode, maxBytes, high + 1, MAX_QUALITY)
+            if higherFits:
+                quality, chunks = higher, higherChunks
+        self.recordTargetQuality(relative_path, target_key, quality, fits)
+        return chunks
+
+    def saveToTargetSize(self, node, document, path, file_format, transparency, properties,
+                         bounds, relative_path, target_key):
+        """Save a node with Krita's exporter at the highest quality that fits the size limit.
+
+        Formats the raw encoders can't write are searched at full size,
+        starting from the quality cached for the node.
+        """
+        folder, name = os.path.split(path)
+        base, extension = os.path.splitext(name)
+        trialPaths = []
+
+        def encode(quality):
+            trialPath = os.path.join(folder, f"{base}-q{quality}{extension}")
+            trialPaths.append(trialPath)
+            info = createExportInfoObject(file_format, transparency,
+                                          qualityProperties(file_format, properties, quality))
+            node.save(trialPath, document.resolution() / 72., document.resolution() / 72., info, bounds)
+            return os.path.getsize(trialPath), trialPath
+
+        try:
+            quality, trialPath, fits = searchQuality(encode, properties["maxBytes"],
+                                                     guess=self.qualityCache.get(target_key))
+            os.replace(trialPath, path)
+        finally:
+            for trialPath in trialPaths:
+                if os.path.exists(trialPath):
+                    os.remove(trialPath)
+        self.recordTargetQuality(relative_path, target_key, quality, fits)
+
+    def recordTargetQuality(self, relative_path, target_key, quality, fits):
+        self.qualityCache.set(target_key, quality)
+        if not fits:
+            self.overBudget.append(relative_path)
+            print(f"Quick Export: {relative_path} is over its size limit even at quality {quality}")
+
+    def exportTiledJob(self, node, rect, export_file_path, properties, resolution,
+                       relative_path, fingerprint):
+        """Tiled PNG export, stepped through one band at a time"""
+        # Tile pyramids are folders of thousands of files, they are not written into archives
+        pyramid = self.preset["tilePyramid"] and self.archive is None
+        yield from self.profiler.timedSteps(
+            "tiled", exportTiled(node, rect, export_file_path, properties, resolution,
+                                 pyramid=pyramid), relative_path)
+        size = self.storeOutput(relative_path, export_file_path)
+        self.profiler.recordFile(relative_path, "png", rect[2] * rect[3], size)
+        self.optimizeOutput(relative_path, "png")
+        self.recordOutput(relative_path, fingerprint)
+
+    def exportAtlasPage(self, atlas, page):
+        """Capture the layers of an atlas page, then compose and encode it like a layer"""
+        relative_path = atlas.pagePath(page)
+        pieces = []
+        for frame in atlas.pageFrames(page):
+            job = frame.job
+            x, y, width, height = job.crop
+            buffer = self.capturePixels(job.node, job.width, job.height, job.crop, relative_path)
+            pieces.append((frame.x, frame.y, buffer, width, height))
+        export_file_path = self.outputPath(relative_path)
+        if self.preset["parallelEncoding"] or self.snapshot is not None:
+            return self.encoder.submit(self.encodeAtlasPage, atlas, page, pieces,
+                                       export_file_path, relative_path)
+        self.encodeAtlasPage(atlas, page, pieces, export_file_path, relative_path)
+
+    def encodeAtlasPage(self, atlas, page, pieces, export_file_path, relative_path):
+        """Draw the captured layers onto the page and encode it (may run on the encoder threads)"""
+        width, height = atlas.pages[page]
+        try:
+            with self.profiler.stage("atlas", relative_path):
+                data = composePixels(width, height, [(x, y, buffer.view(), pieceWidth, pieceHeight)
+                                                     for x, y, buffer, pieceWidth, pieceHeight in pieces])
+        finally:
+            for piece in pieces:
+                piece[2].release()
+        self.encodeRawJob(self.buffers.store(data), width, height, export_file_path, atlas.format,
+                          atlas.properties, relative_path, None)
+
+    def getSourceNode(self, node, target_width, target_height):
+        """The document and node to read a size from: the originals, or a scaled clone and its copy of the node"""
+        if target_width == self.document.width() and target_height == self.document.height():
+            return self.document, node
+        sourceDoc = self.getScaledDocument(target_width, target_height)
+        sourceNode = self.findMatchingNode(node, sourceDoc)
+        if sourceNode is None:
+            raise RuntimeError(f"Could not find layer '{node.name()}' in the scaled document")
+        return sourceDoc, sourceNode
+
+    def createDirectory(self, directory):
+        """Create export directory if it doesn't exist"""
+        target_directory = os.path.join(self.directory, directory)
+        if os.path.exists(target_directory) and os.path.isdir(target_directory):
+            return
+        os.makedirs(target_directory)
@@ -0,0 +1,57 @@
+# Quick Export Plugin for Krita
+# Based on Quick Export Layers Docker by fullmontis (public domain)
+
+# Snapshot exports: every pixel buffer the export encodes is captured from
+# the document before the first file is written, so the artist can keep
+# painting while the files are encoded from the snapshot in the background.
+# The captures are kept in the export's PixelBuffers, which spills them to
+# memory-mapped temporary files beyond its memory ceiling.
+
+
+def snapshotKey(node, target_width, target_height, rect):
+    """Key of the pixels of a node's area at one export size"""
+    return (node.uniqueId(), target_width, target_height, tuple(rect))
+
+
+class SnapshotStore(object):
+    """Captured pixel buffers by node, area and size.
+
+    Every buffer is added once per job that reads it and handed out once
+    per job by take(); the job releases it when it is done. Buffers are
+    added on the GUI thread while the snapshot is taken and taken by the
+    tasks afterwards, all on the GUI thread too.
+    """
+
+    def __init__(self, buffers):
+        self._buffers = buffers
+        self._entries = {}  # key -> [PixelBuffer, jobs that haven't taken it yet]
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def add(self, key, data=None):
+        """Keep a captured buffer, or count one more job reading a buffer kept already"""
+        entry = self._entries.get(key)
+        if entry is not None:
+            entry[0].retain()
+            entry[1] += 1
+            return
+        self._entries[key] = [self._buffers.store(data), 1]
+
+    def take(self, key):
+        """The PixelBuffer of a key, for one job to read and release"""
+        entry = self._entries[key]
+        entry[1] -= 1
+        if entry[1] == 0:
+            del self._entries[key]
+        return entry[0]
+
+    def close(self):
+        """Release the buffers no job took"""
+        for buffer, readers in self._entries.values():
+            for _ in range(readers):
+                buffer.release()
+        self._entries = {}
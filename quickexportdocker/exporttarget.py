@@ -0,0 +1,135 @@
+# Quick Export Plugin for Krita
+# Based on Quick Export Layers Docker by fullmontis (public domain)
+
+# Target file size for JPEG and JPEG-XL: a format row can set the largest
+# file it may write, and every output gets the highest quality that fits.
+# The quality is found by bisection. When the pixels are at hand, the
+# search runs on a small proxy of the image first, with the budget scaled
+# down by the pixel count, and only confirms around the proxy's answer at
+# full size. The quality chosen for every node is kept between exports, so
+# a repeat export usually needs a single full size encode.
+
+import json
+import math
+import threading
+
+
+# The encoder setting the search picks, per format
+TARGET_SIZE_SETTINGS = {
+    "jpg": "quality",
+    "jxl": "lossyQuality",
+}
+
+MIN_QUALITY = 10
+MAX_QUALITY = 100
+
+# Pixel count of the proxy the search starts on; smaller images are searched at full size
+PROXY_PIXELS = 512 * 512
+
+# Full size encodes around the proxy's quality before falling back to the whole range
+CONFIRM_RANGE = 8
+
+
+def hasTargetSize(file_format, properties):
+    return file_format in TARGET_SIZE_SETTINGS and properties.get("maxBytes", 0) > 0
+
+
+def qualityProperties(file_format, properties, quality):
+    """Export settings of a target size output at one quality"""
+    return dict(properties, **{TARGET_SIZE_SETTINGS[file_format]: quality})
+
+
+def proxySize(width, height):
+    """Size of the proxy image, or None if the image is small enough to search as it is"""
+    pixels = width * height
+    if pixels <= PROXY_PIXELS * 2:
+        return None
+    factor = math.sqrt(PROXY_PIXELS / pixels)
+    return max(1, int(round(width * factor))), max(1, int(round(height * factor)))
+
+
+def searchQuality(encode, max_bytes, low=MIN_QUALITY, high=MAX_QUALITY, guess=None):
+    """Highest quality in [low, high] whose encode fits in max_bytes, by bisection.
+
+    encode(quality) returns (size, result). A guess is tried first, with
+    its neighbour, so a good one settles the search in two encodes.
+    Returns (quality, result, fits); if nothing fits, the lowest quality.
+    """
+    results = {}
+
+    def fits(quality):
+        if quality not in results:
+            results[quality] = encode(quality)
+        return results[quality][0] <= max_bytes
+
+    best = None
+    if guess is not None:
+        guess = min(max(guess, low), high)
+        if fits(guess):
+            best, low = guess, guess + 1
+            if low <= high:
+                if fits(low):
+                    best, low = low, low + 1
+                else:
+                    high = low - 1
+        else:
+            high = guess - 1
+            if high >= low:
+                if fits(high):
+                    best, low = high, high + 1
+                else:
+                    high -= 1
+
+    while low <= high:
+        middle = (low + high) // 2
+        if fits(middle):
+            best, low = middle, middle + 1
+        else:
+            high = middle - 1
+
+    if best is None:
+        lowest = min(results) if results else low
+        fits(lowest)
+        return lowest, results[lowest][1], False
+    return best, results[best][1], True
+
+
+class QualityCache(object):
+    """The quality every target size output was last written at, kept between exports.
+
+    Keys name a node, format and output size; the quality is only the first
+    guess of the next search, so an outdated entry costs an encode or two.
+    Encoder threads update it too, so it is guarded by a lock.
+    """
+
+    MAX_ENTRIES = 2000
+
+    def __init__(self, entries=None):
+        self._entries = {}
+        self._lock = threading.Lock()
+        for key, quality in (entries or {}).items():
+            self._entries[str(key)] = int(quality)
+
+    @classmethod
+    def fromJson(cls, text):
+        try:
+            return cls(json.loads(text) if text else {})
+        except (ValueError, TypeError, AttributeError) as e:
+            print(f"Quick Export: Ignoring saved target size qualities: {e}")
+            return cls()
+
+    def toJson(self):
+        with self._lock:
+            return json.dumps(self._entries)
+
+    def get(self, key):
+        with self._lock:
+            return self._entries.get(key)
+
+    def set(self, key, quality):
+        with self._lock:
+            # Most recent last, the oldest entries are dropped first
+            self._entries.pop(key, None)
+            self._entries[key] = quality
+            while len(self._entries) > self.MAX_ENTRIES:
+                del self._entries[next(iter(self._entries))]
@@ -1,15 +1,32 @@
 # Quick Export Plugin for Krita
 # Based on Quick Export Layers Docker by fullmontis (public domain)
 
-from PyQt5.QtCore import Qt, QRect, QUrl, QTimer
+from PyQt5.QtCore import Qt, QUrl, QTimer
 from PyQt5.QtWidgets import (QWidget, QLineEdit, QHBoxLayout, 
                              QVBoxLayout, QPushButton, QCheckBox, 
                              QComboBox, QFileDialog, QLabel, QFrame,
-                             QSizePolicy, QGridLayout, QSpinBox, QMessageBox)
+                             QSizePolicy, QGridLayout, QSpinBox, QMessageBox,
+                             QProgressBar)
 from PyQt5.QtGui import QPalette, QColor, QDesktopServices
+import json
 import krita
 import os
 
+from .exportatlas import DEFAULT_ATLAS_SIZE
+from .exportbuffers import DEFAULT_PIXEL_MEMORY_LIMIT
+from .exportencoders import ParallelEncoder, partialPath
+from .exportengine import ExportEngine, ExportTask
+from .exportformats import DEFAULT_PROFILE, ENCODING_PROFILES, exportProperties, fileExtension
+from .exportoptimizer import DEFAULT_OPTIMIZE_COMMANDS, PostOptimizer
+from .exportplan import formatBytes
+from .exportpreflight import availableMemory, freeDiskSpace
+from .exportsession import ExportSession, createExportInfoObject, savePreset
+
+# The docker's defaults, in the shape of a preset file
+DEFAULTS_SETTING = "quick_export_defaults"
+# Defaults saved before, as a comma separated list of the settings
+LEGACY_DEFAULTS_SETTING = "quick_export_docker"
+
 
 class FormatRow(QWidget):
     """A single format row with width, height, format dropdown, and transparency button"""
@@ -52,16 +69,38 @@ class FormatRow(QWidget):
         self.formatComboBox.addItem(i18n("JPEG-XL"))
         self.formatComboBox.addItem(i18n("KRA"))
         self.formatComboBox.addItem(i18n("PSD"))
+        self.formatComboBox.addItem(i18n("RAW"))
+        self.formatComboBox.addItem(i18n("NPY"))
         self.formatComboBox.currentIndexChanged.connect(self.onFormatChanged)
         self.formatComboBox.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Fixed)
         layout.addWidget(self.formatComboBox)
         
+        # Encoding profile combo box (speed vs. file size)
+        self.profileComboBox = QComboBox()
+        self.profileComboBox.addItem(i18n("Fast"), "fast")
+        self.profileComboBox.addItem(i18n("Balanced"), "balanced")
+        self.profileComboBox.addItem(i18n("Max"), "max")
+        self.profileComboBox.addItem(i18n("Auto"), "auto")
+        self.profileComboBox.setToolTip(i18n("Encoding profile: Fast for quick previews, "
+                                             "Max for the smallest files (slowest), "
+                                             "Auto for the smallest files the compression budget allows"))
+        self.setProfile(DEFAULT_PROFILE)
+        layout.addWidget(self.profileComboBox)
+        
+        # File size limit (JPEG and JPEG-XL)
+        self.maxSizeInput = QLineEdit()
+        self.maxSizeInput.setFixedWidth(60)
+        self.maxSizeInput.setPlaceholderText("Max KB")
+        self.maxSizeInput.setToolTip(i18n("Largest file size in KB. Every file is written at the highest "
+                                          "quality that fits, JPEG-XL becomes lossy. Leave empty for no limit"))
+        layout.addWidget(self.maxSizeInput)
+        
         # Transparency button (icon only, overlayed on the format dropdown)
         self.transparencyButton = QPushButton()
         self.transparencyButton.setObjectName("transparencyBtn")
         self.transparencyButton.setCheckable(True)
         self.transparencyButton.setChecked(True)
-        self.transparencyButton.setToolTip(i18n("Toggle alpha channel (transparency) for PNG export"))
+        self.transparencyButton.setToolTip(i18n("Toggle alpha channel (transparency) for PNG, RAW and NPY export"))
         self.transparencyButton.setFixedSize(24, 24)
         # Use Krita's icon library for selection-mode_invisible icon
         self.transparencyButton.setIcon(Application.icon("selection-mode_invisible"))
@@ -111,7 +150,10 @@ class FormatRow(QWidget):
     def onFormatChanged(self, index):
         """Show/hide transparency button based on format"""
         formatText = self.formatComboBox.currentText().upper()
-        self.transparencyButton.setVisible(formatText == "PNG")
+        self.transparencyButton.setVisible(formatText in ["PNG", "RAW", "NPY"])
+        # KRA and PSD have no speed/size settings
+        self.profileComboBox.setVisible(formatText in ["PNG", "JPEG", "JPEG-XL"])
+        self.maxSizeInput.setVisible(formatText in ["JPEG", "JPEG-XL"])
         
     def onRemoveClicked(self):
         """Remove this format row"""
@@ -138,7 +180,9 @@ class FormatRow(QWidget):
             'width': width,
             'height': height,
             'format': self.formatComboBox.currentText(),
-            'transparency': self.transparencyButton.isChecked()
+            'transparency': self.transparencyButton.isChecked(),
+            'profile': self.getProfile(),
+            'maxSize': self.getMaxSize()
         }
         
     def getFormatIndex(self):
@@ -148,6 +192,23 @@ class FormatRow(QWidget):
         if index < self.formatComboBox.count():
             self.formatComboBox.setCurrentIndex(index)
             
+    def getProfile(self):
+        return self.profileComboBox.currentData()
+        
+    def setProfile(self, profile):
+        if profile in ENCODING_PROFILES:
+            self.profileComboBox.setCurrentIndex(self.profileComboBox.findData(profile))
+            
+    def getMaxSize(self):
+        """File size limit in KB, 0 for none"""
+        try:
+            return max(0, int(self.maxSizeInput.text()))
+        except ValueError:
+            return 0
+            
+    def setMaxSize(self, max_size):
+        self.maxSizeInput.setText(str(max_size) if max_size > 0 else "")
+        
     def isTransparencyChecked(self):
         return self.transparencyButton.isChecked()
         
@@ -158,6 +219,8 @@ class FormatRow(QWidget):
 class QuickExportDocker(krita.DockWidget):
     """Quick Export Docker - A streamlined export panel for Krita"""
     
+    WATCH_DEBOUNCE_MS = 1500  # Wait for saves to settle before exporting
+    
     # Photoshop-style desaturated color palette
     STYLE_SHEET = """
         QWidget {
@@ -276,6 +339,17 @@ class QuickExportDocker(krita.DockWidget):
             text-transform: uppercase;
             padding-top: 4px;
         }
+        QProgressBar {
+            background-color: #424242;
+            border: 1px solid #5a5a5a;
+            border-radius: 2px;
+            color: #e0e0e0;
+            text-align: center;
+            max-height: 14px;
+        }
+        QProgressBar::chunk {
+            background-color: #707070;
+        }
         QFrame#separator {
             background-color: #424242;
             max-height: 1px;
@@ -290,6 +364,28 @@ class QuickExportDocker(krita.DockWidget):
         self._userEditedFilename = False
         self._lastDocumentName = ""
         self._formatRows = []  # List of FormatRow widgets
+        self._sessions = []  # ExportSession of every document in the running export
+        
+        self._encoder = ParallelEncoder()
+        self._exportEngine = ExportEngine(self)
+        self._exportEngine.maxPending = self._encoder.maxWorkers * 2
+        self._exportEngine.progressChanged.connect(self.onExportProgress)
+        self._exportEngine.finished.connect(self.onExportFinished)
+        
+        # Export on save: bursts of saves are collapsed into one export
+        self._watchTimer = QTimer(self)
+        self._watchTimer.setSingleShot(True)
+        self._watchTimer.setInterval(self.WATCH_DEBOUNCE_MS)
+        self._watchTimer.timeout.connect(self.watchExport)
+        Application.notifier().imageSaved.connect(self.onImageSaved)
+        
+        # Optimizer passes keep running after the export, their progress is polled
+        self._optimizer = PostOptimizer()
+        self._optimizeStats = []
+        self._optimizeMessage = ""
+        self._optimizeTimer = QTimer(self)
+        self._optimizeTimer.setInterval(250)
+        self._optimizeTimer.timeout.connect(self.updateOptimizeProgress)
         
         self.setupUI()
         self.loadDefaults()
@@ -407,6 +503,140 @@ class QuickExportDocker(krita.DockWidget):
         self.createFileDirectoryCheckBox.setToolTip(i18n("Create a subfolder named after the export file"))
         layout.addWidget(self.createFileDirectoryCheckBox)
         
+        archiveLayout = QHBoxLayout()
+        archiveLayout.setSpacing(4)
+        archiveLabel = QLabel(i18n("Write to"))
+        archiveLayout.addWidget(archiveLabel)
+        archiveLayout.addStretch()
+        self.archiveComboBox = QComboBox()
+        self.archiveComboBox.addItem(i18n("Files"), "")
+        self.archiveComboBox.addItem(i18n("ZIP archive"), "zip")
+        self.archiveComboBox.addItem(i18n("TAR archive"), "tar")
+        self.archiveComboBox.setToolTip(i18n("Write every exported file into one archive named after the export, "
+                                             "with the same folders inside. Much faster on network drives"))
+        archiveLabel.setToolTip(self.archiveComboBox.toolTip())
+        archiveLayout.addWidget(self.archiveComboBox)
+        layout.addLayout(archiveLayout)
+        
+        self.watchCheckBox = QCheckBox(i18n("Export on save"))
+        self.watchCheckBox.setToolTip(i18n("Export the active document with these settings shortly after it is saved. "
+                                           "Only outputs whose layers or settings changed are written"))
+        layout.addWidget(self.watchCheckBox)
+        
+        self.skipUnchangedCheckBox = QCheckBox(i18n("Skip unchanged files"))
+        self.skipUnchangedCheckBox.setToolTip(i18n("Only re-export files whose layers or settings changed since the last export. "
+                                                   "Uncheck to force a full export"))
+        layout.addWidget(self.skipUnchangedCheckBox)
+        
+        self.resumeCheckBox = QCheckBox(i18n("Resume interrupted exports"))
+        self.resumeCheckBox.setToolTip(i18n("After a cancelled or crashed export, keep the files it already finished "
+                                            "instead of encoding them again, unless their layers or settings changed"))
+        layout.addWidget(self.resumeCheckBox)
+        
+        dedupeLayout = QHBoxLayout()
+        dedupeLayout.setSpacing(4)
+        dedupeLabel = QLabel(i18n("Identical files"))
+        dedupeLayout.addWidget(dedupeLabel)
+        dedupeLayout.addStretch()
+        self.dedupeComboBox = QComboBox()
+        self.dedupeComboBox.addItem(i18n("Export each"), "")
+        self.dedupeComboBox.addItem(i18n("Hardlink"), "hardlink")
+        self.dedupeComboBox.addItem(i18n("Copy"), "copy")
+        self.dedupeComboBox.setToolTip(i18n("Outputs with the same layer pixels and settings, like duplicated layers, "
+                                            "are encoded once and the others hardlinked or copied from it"))
+        dedupeLabel.setToolTip(self.dedupeComboBox.toolTip())
+        dedupeLayout.addWidget(self.dedupeComboBox)
+        layout.addLayout(dedupeLayout)
+        
+        self.parallelEncodingCheckBox = QCheckBox(i18n("Encode on all CPU cores"))
+        self.parallelEncodingCheckBox.setToolTip(i18n("Encode PNG and JPEG files in parallel background threads. "
+                                                      "Used for 8-bit RGBA sRGB documents, other exports use Krita's exporter"))
+        layout.addWidget(self.parallelEncodingCheckBox)
+        
+        self.snapshotCheckBox = QCheckBox(i18n("Keep painting while exporting"))
+        self.snapshotCheckBox.setToolTip(i18n("Capture the layers before the first file is written and encode them in the "
+                                              "background, so edits made during the export don't end up in it. "
+                                              "Captures beyond the pixel memory limit are kept in temporary files"))
+        layout.addWidget(self.snapshotCheckBox)
+        
+        pixelMemoryLayout = QHBoxLayout()
+        pixelMemoryLayout.setSpacing(4)
+        pixelMemoryLabel = QLabel(i18n("Pixel memory limit"))
+        pixelMemoryLayout.addWidget(pixelMemoryLabel)
+        pixelMemoryLayout.addStretch()
+        self.pixelMemorySpinBox = QSpinBox()
+        self.pixelMemorySpinBox.setRange(0, 1048576)
+        self.pixelMemorySpinBox.setSingleStep(256)
+        self.pixelMemorySpinBox.setValue(DEFAULT_PIXEL_MEMORY_LIMIT)
+        self.pixelMemorySpinBox.setSuffix(i18n(" MB"))
+        self.pixelMemorySpinBox.setToolTip(i18n("Captured layer pixels waiting to be encoded are kept in memory up to "
+                                                "this size, the rest in memory-mapped temporary files in the export "
+                                                "directory"))
+        pixelMemoryLabel.setToolTip(self.pixelMemorySpinBox.toolTip())
+        pixelMemoryLayout.addWidget(self.pixelMemorySpinBox)
+        layout.addLayout(pixelMemoryLayout)
+        
+        budgetLayout = QHBoxLayout()
+        budgetLayout.setSpacing(4)
+        budgetLabel = QLabel(i18n("Auto compression budget"))
+        budgetLayout.addWidget(budgetLabel)
+        budgetLayout.addStretch()
+        self.compressionBudgetSpinBox = QSpinBox()
+        self.compressionBudgetSpinBox.setRange(1, 3600)
+        self.compressionBudgetSpinBox.setValue(30)
+        self.compressionBudgetSpinBox.setSuffix(i18n(" s"))
+        self.compressionBudgetSpinBox.setToolTip(i18n("Encoding time for formats with the Auto profile. PNG compression and "
+                                                      "JPEG-XL effort are lowered for files that wouldn't fit, "
+                                                      "based on the encode speeds measured in earlier exports"))
+        budgetLabel.setToolTip(self.compressionBudgetSpinBox.toolTip())
+        budgetLayout.addWidget(self.compressionBudgetSpinBox)
+        layout.addLayout(budgetLayout)
+        
+        self.tiledExportCheckBox = QCheckBox(i18n("Low-memory tiled PNG export"))
+        self.tiledExportCheckBox.setToolTip(i18n("Read full size PNG exports in tiles and write them band by band, "
+                                                 "so huge canvases don't need a second copy in memory"))
+        self.tiledExportCheckBox.stateChanged.connect(self.toggleTiledExport)
+        layout.addWidget(self.tiledExportCheckBox)
+        
+        tiledOptionsLayout = QVBoxLayout()
+        tiledOptionsLayout.setContentsMargins(16, 0, 0, 0)
+        self.tilePyramidCheckBox = QCheckBox(i18n("Also write DeepZoom tiles"))
+        self.tilePyramidCheckBox.setToolTip(i18n("Write a DeepZoom tile pyramid (.dzi and _files folder) "
+                                                 "next to each tiled export, for web viewers"))
+        self.tilePyramidCheckBox.setVisible(False)
+        tiledOptionsLayout.addWidget(self.tilePyramidCheckBox)
+        layout.addLayout(tiledOptionsLayout)
+        
+        self.optimizeCheckBox = QCheckBox(i18n("Optimize files afterwards"))
+        self.optimizeCheckBox.setToolTip(i18n("Run an optimizer command on every written file in the background. "
+                                              "The result replaces the file only if it is smaller"))
+        self.optimizeCheckBox.stateChanged.connect(self.toggleOptimize)
+        layout.addWidget(self.optimizeCheckBox)
+        
+        self.optimizeOptionsWidget = QWidget()
+        optimizeOptionsLayout = QGridLayout()
+        optimizeOptionsLayout.setContentsMargins(16, 0, 0, 0)
+        optimizeOptionsLayout.setSpacing(4)
+        self.optimizeCommandInputs = {}
+        for row, (label, file_format) in enumerate([("PNG", "png"), ("JPEG", "jpg"), ("JPEG-XL", "jxl")]):
+            commandInput = QLineEdit()
+            commandInput.setText(DEFAULT_OPTIMIZE_COMMANDS[file_format])
+            commandInput.setPlaceholderText(i18n("No optimizer"))
+            commandInput.setToolTip(i18n("Command run on a copy of every file of this format, {file} is the copy. "
+                                         "Commands that write a new file, like cjxl, use {file} as the input "
+                                         "and {output} as the result"))
+            optimizeOptionsLayout.addWidget(QLabel(i18n(label)), row, 0)
+            optimizeOptionsLayout.addWidget(commandInput, row, 1)
+            self.optimizeCommandInputs[file_format] = commandInput
+        self.optimizeOptionsWidget.setLayout(optimizeOptionsLayout)
+        self.optimizeOptionsWidget.setVisible(False)
+        layout.addWidget(self.optimizeOptionsWidget)
+        
+        self.profileCheckBox = QCheckBox(i18n("Profile export timings"))
+        self.profileCheckBox.setToolTip(i18n("Show where the export spent its time and append a per-stage, "
+                                             "per-file report to quickexport-profile.jsonl in the export directory"))
+        layout.addWidget(self.profileCheckBox)
+        
         # Multi-layer export options
         self.exportLayersSeparatelyCheckBox = QCheckBox(i18n("Export layers separately"))
         self.exportLayersSeparatelyCheckBox.setToolTip(i18n("Export each layer as a separate file"))
@@ -433,6 +663,44 @@ class QuickExportDocker(krita.DockWidget):
         self.ignoreInvisibleLayersCheckBox.setVisible(False)
         layerOptionsLayout.addWidget(self.ignoreInvisibleLayersCheckBox)
         
+        cropLayout = QHBoxLayout()
+        cropLayout.setSpacing(4)
+        self.cropToContentCheckBox = QCheckBox(i18n("Crop layers to content"))
+        self.cropToContentCheckBox.setToolTip(i18n("Export each layer cropped to its content instead of the full canvas. "
+                                                   "Empty layers are skipped and the layer positions are saved to a layout file"))
+        self.cropToContentCheckBox.setVisible(False)
+        self.cropToContentCheckBox.stateChanged.connect(self.toggleCropToContent)
+        cropLayout.addWidget(self.cropToContentCheckBox)
+        cropLayout.addStretch()
+        self.cropPaddingSpinBox = QSpinBox()
+        self.cropPaddingSpinBox.setRange(0, 1024)
+        self.cropPaddingSpinBox.setSuffix(i18n(" px"))
+        self.cropPaddingSpinBox.setToolTip(i18n("Transparent padding kept around the cropped layer content"))
+        self.cropPaddingSpinBox.setVisible(False)
+        cropLayout.addWidget(self.cropPaddingSpinBox)
+        layerOptionsLayout.addLayout(cropLayout)
+        
+        atlasLayout = QHBoxLayout()
+        atlasLayout.setSpacing(4)
+        self.atlasCheckBox = QCheckBox(i18n("Pack layers into atlas"))
+        self.atlasCheckBox.setToolTip(i18n("Pack the layers, cropped to their content, into texture atlas pages "
+                                           "with a JSON frame map instead of writing a file per layer. "
+                                           "For PNG, JPEG and the pixel formats of 8-bit RGBA documents"))
+        self.atlasCheckBox.setVisible(False)
+        self.atlasCheckBox.stateChanged.connect(self.toggleAtlas)
+        atlasLayout.addWidget(self.atlasCheckBox)
+        atlasLayout.addStretch()
+        self.atlasSizeSpinBox = QSpinBox()
+        self.atlasSizeSpinBox.setRange(64, 16384)
+        self.atlasSizeSpinBox.setSingleStep(256)
+        self.atlasSizeSpinBox.setValue(DEFAULT_ATLAS_SIZE)
+        self.atlasSizeSpinBox.setSuffix(i18n(" px"))
+        self.atlasSizeSpinBox.setToolTip(i18n("Largest width and height of an atlas page. "
+                                              "Layers that don't fit on one page go on the next"))
+        self.atlasSizeSpinBox.setVisible(False)
+        atlasLayout.addWidget(self.atlasSizeSpinBox)
+        layerOptionsLayout.addLayout(atlasLayout)
+        
         layout.addLayout(layerOptionsLayout)
         
         # Separator
@@ -446,8 +714,25 @@ class QuickExportDocker(krita.DockWidget):
         self.saveDefaultsButton.clicked.connect(self.saveDefaults)
         exportLayout.addWidget(self.saveDefaultsButton)
         
+        self.savePresetButton = QPushButton(i18n("Save Preset..."))
+        self.savePresetButton.setToolTip(i18n("Save current settings to a preset file for headless batch exports"))
+        self.savePresetButton.clicked.connect(self.savePresetAction)
+        exportLayout.addWidget(self.savePresetButton)
+        
         exportLayout.addStretch()
         
+        self.dryRunButton = QPushButton(i18n("Dry Run"))
+        self.dryRunButton.setToolTip(i18n("List the files an export would write, with size estimates "
+                                          "and name collisions, without writing anything"))
+        self.dryRunButton.clicked.connect(self.dryRunAction)
+        exportLayout.addWidget(self.dryRunButton)
+        
+        self.exportAllButton = QPushButton(i18n("Export All"))
+        self.exportAllButton.setToolTip(i18n("Export every open document with these settings in one go. "
+                                             "Sizes are scaled to each document and files keep their document names"))
+        self.exportAllButton.clicked.connect(self.exportAllAction)
+        exportLayout.addWidget(self.exportAllButton)
+        
         self.exportButton = QPushButton(i18n("Export"))
         self.exportButton.setObjectName("exportBtn")
         self.exportButton.clicked.connect(self.exportAction)
@@ -455,6 +740,19 @@ class QuickExportDocker(krita.DockWidget):
         
         layout.addLayout(exportLayout)
         
+        # Progress bar with cancel button, only visible while exporting
+        progressLayout = QHBoxLayout()
+        progressLayout.setSpacing(4)
+        self.exportProgressBar = QProgressBar()
+        self.exportProgressBar.setVisible(False)
+        progressLayout.addWidget(self.exportProgressBar, 1, Qt.AlignVCenter)
+        self.cancelButton = QPushButton(i18n("Cancel"))
+        self.cancelButton.setToolTip(i18n("Stop the export after the current file"))
+        self.cancelButton.setVisible(False)
+        self.cancelButton.clicked.connect(self.cancelExport)
+        progressLayout.addWidget(self.cancelButton, 0, Qt.AlignVCenter)
+        layout.addLayout(progressLayout)
+        
         # Status message
         self.exportMessage = QLabel("")
         self.exportMessage.setObjectName("statusLabel")
@@ -563,79 +861,157 @@ class QuickExportDocker(krita.DockWidget):
         if not self._userEditedFilename and not self._isExporting:
             self.updateFilenameFromDocument()
 
-    # Path escaping utilities for saving/loading settings
-    def escapePath(self, path):
-        path_escaped = path.encode("unicode_escape").decode("ascii")
-        comma_encoded = "\\x" + hex(ord(","))[2:]
-        return path_escaped.replace(",", comma_encoded)
-
     def decodePath(self, path):
         return path.encode("ascii").decode("unicode_escape")
 
     def saveDefaults(self):
-        """Save current settings as defaults"""
-        directory = self.escapePath(self.directoryTextField.text())
-        batchmode = str(int(self.batchmodeCheckBox.isChecked()))
-        exportOnlySelected = str(int(self.exportOnlySelectedCheckBox.isChecked()))
-        exportLayersSeparately = str(int(self.exportLayersSeparatelyCheckBox.isChecked()))
-        createFileDirectory = str(int(self.createFileDirectoryCheckBox.isChecked()))
-        ignoreFilterLayers = str(int(self.ignoreFilterLayersCheckBox.isChecked()))
-        groupAsLayer = str(int(self.groupAsLayerCheckBox.isChecked()))
-        ignoreInvisibleLayers = str(int(self.ignoreInvisibleLayersCheckBox.isChecked()))
-        
-        # Save first format row settings for backwards compatibility
-        formatDefault = "0"
-        transparency = "1"
-        if self._formatRows:
-            formatDefault = str(self._formatRows[0].getFormatIndex())
-            transparency = str(int(self._formatRows[0].isTransparencyChecked()))
-
-        defaults = ",".join([directory, batchmode, exportOnlySelected, exportLayersSeparately, 
-                             createFileDirectory, ignoreFilterLayers, 
-                             groupAsLayer, ignoreInvisibleLayers, 
-                             formatDefault, transparency])
-        
-        Application.writeSetting("", "quick_export_docker", defaults)
+        """Save current settings as defaults, in the same shape as a preset file"""
+        preset = self.getPreset()
+        # The file name follows the active document
+        del preset["filename"]
+        preset["watch"] = self.watchCheckBox.isChecked()
+        Application.writeSetting("", DEFAULTS_SETTING, json.dumps(preset, sort_keys=True))
         self.exportMessage.setText(i18n("Settings saved."))
 
     def loadDefaults(self):
         """Load saved default settings"""
-        defaults = Application.readSetting("", "quick_export_docker", "")
-        if defaults == "":
-            self.updateFilenameFromDocument()
-            return
-        
         try:
-            defaults = defaults.split(",")
-            if len(defaults) >= 9:
-                [directory, batchmode, exportOnlySelected, exportLayersSeparately, 
-                 createFileDirectory, groupAsLayer, ignoreFilterLayers, 
-                 ignoreInvisibleLayers, formatDefault] = defaults[:9]
-
-                self.directoryTextField.setText(self.decodePath(directory))
-                self.batchmodeCheckBox.setChecked(bool(int(batchmode)))
-                self.exportOnlySelectedCheckBox.setChecked(bool(int(exportOnlySelected)))
-                self.exportLayersSeparatelyCheckBox.setChecked(bool(int(exportLayersSeparately)))
-                self.createFileDirectoryCheckBox.setChecked(bool(int(createFileDirectory)))
-                self.groupAsLayerCheckBox.setChecked(bool(int(groupAsLayer)))
-                self.ignoreFilterLayersCheckBox.setChecked(bool(int(ignoreFilterLayers)))
-                self.ignoreInvisibleLayersCheckBox.setChecked(bool(int(ignoreInvisibleLayers)))
-                
-                # Apply to first format row
-                if self._formatRows:
-                    formatIndex = int(formatDefault)
-                    self._formatRows[0].setFormatIndex(formatIndex)
-                
-                    if len(defaults) >= 10:
-                        transparency = defaults[9]
-                        self._formatRows[0].setTransparencyChecked(bool(int(transparency)))
-
-                self.toggleExportLayersSeparately()
+            defaults = Application.readSetting("", DEFAULTS_SETTING, "")
+            if defaults:
+                self.applyPreset(json.loads(defaults))
+            else:
+                legacyDefaults = Application.readSetting("", LEGACY_DEFAULTS_SETTING, "")
+                if legacyDefaults:
+                    self.loadLegacyDefaults(legacyDefaults)
         except Exception as e:
             print(f"Quick Export: Error loading defaults: {e}")
             
         self.updateFilenameFromDocument()
 
+    def applyPreset(self, preset):
+        """Set the docker's widgets from a preset, leaving the settings it doesn't have as they are"""
+        if "directory" in preset:
+            self.directoryTextField.setText(preset["directory"])
+        checkBoxes = {
+            "batchmode": self.batchmodeCheckBox,
+            "exportOnlySelected": self.exportOnlySelectedCheckBox,
+            "createFileDirectory": self.createFileDirectoryCheckBox,
+            "layersSeparately": self.exportLayersSeparatelyCheckBox,
+            "groupAsLayer": self.groupAsLayerCheckBox,
+            "ignoreFilterLayers": self.ignoreFilterLayersCheckBox,
+            "ignoreInvisibleLayers": self.ignoreInvisibleLayersCheckBox,
+            "cropToContent": self.cropToContentCheckBox,
+            "skipUnchanged": self.skipUnchangedCheckBox,
+            "parallelEncoding": self.parallelEncodingCheckBox,
+            "tiledExport": self.tiledExportCheckBox,
+            "tilePyramid": self.tilePyramidCheckBox,
+            "profile": self.profileCheckBox,
+            "watch": self.watchCheckBox,
+            "atlas": self.atlasCheckBox,
+            "resume": self.resumeCheckBox,
+            "snapshot": self.snapshotCheckBox,
+            "optimize": self.optimizeCheckBox,
+        }
+        for key, checkBox in checkBoxes.items():
+            if key in preset:
+                checkBox.setChecked(bool(preset[key]))
+        spinBoxes = {
+            "cropPadding": self.cropPaddingSpinBox,
+            "compressionBudget": self.compressionBudgetSpinBox,
+            "atlasSize": self.atlasSizeSpinBox,
+            "pixelMemoryLimit": self.pixelMemorySpinBox,
+        }
+        for key, spinBox in spinBoxes.items():
+            if key in preset:
+                spinBox.setValue(int(preset[key]))
+        for key, comboBox in (("archive", self.archiveComboBox), ("dedupe", self.dedupeComboBox)):
+            if key in preset:
+                comboBox.setCurrentIndex(max(0, comboBox.findData(preset[key])))
+        for file_format, command in preset.get("optimizeCommands", {}).items():
+            if file_format in self.optimizeCommandInputs:
+                self.optimizeCommandInputs[file_format].setText(command)
+
+        # Row sizes follow the document, only the first row's encoding is kept
+        rows = preset.get("rows")
+        if rows and self._formatRows:
+            row, settings = self._formatRows[0], rows[0]
+            if "format" in settings:
+                row.setFormatIndex(max(0, row.formatComboBox.findText(settings["format"])))
+            if "transparency" in settings:
+                row.setTransparencyChecked(bool(settings["transparency"]))
+            if "profile" in settings:
+                row.setProfile(settings["profile"])
+            if "maxSize" in settings:
+                row.setMaxSize(int(settings["maxSize"]))
+
+        self.toggleExportLayersSeparately()
+
+    def loadLegacyDefaults(self, defaults):
+        """Load defaults saved as a comma separated list, before they were saved as a preset"""
+        defaults = defaults.split(",")
+        if len(defaults) >= 9:
+            [directory, batchmode, exportOnlySelected, exportLayersSeparately, 
+             createFileDirectory, groupAsLayer, ignoreFilterLayers, 
+             ignoreInvisibleLayers, formatDefault] = defaults[:9]
+
+            self.directoryTextField.setText(self.decodePath(directory))
+            self.batchmodeCheckBox.setChecked(bool(int(batchmode)))
+            self.exportOnlySelectedCheckBox.setChecked(bool(int(exportOnlySelected)))
+            self.exportLayersSeparatelyCheckBox.setChecked(bool(int(exportLayersSeparately)))
+            self.createFileDirectoryCheckBox.setChecked(bool(int(createFileDirectory)))
+            self.groupAsLayerCheckBox.setChecked(bool(int(groupAsLayer)))
+            self.ignoreFilterLayersCheckBox.setChecked(bool(int(ignoreFilterLayers)))
+            self.ignoreInvisibleLayersCheckBox.setChecked(bool(int(ignoreInvisibleLayers)))
+            
+            # Apply to first format row
+            if self._formatRows:
+                formatIndex = int(formatDefault)
+                self._formatRows[0].setFormatIndex(formatIndex)
+            
+                if len(defaults) >= 10:
+                    transparency = defaults[9]
+                    self._formatRows[0].setTransparencyChecked(bool(int(transparency)))
+
+            if len(defaults) >= 11:
+                self.skipUnchangedCheckBox.setChecked(bool(int(defaults[10])))
+            if len(defaults) >= 12:
+                self.parallelEncodingCheckBox.setChecked(bool(int(defaults[11])))
+            if len(defaults) >= 14:
+                self.cropToContentCheckBox.setChecked(bool(int(defaults[12])))
+                self.cropPaddingSpinBox.setValue(int(defaults[13]))
+            if len(defaults) >= 16:
+                self.tiledExportCheckBox.setChecked(bool(int(defaults[14])))
+                self.tilePyramidCheckBox.setChecked(bool(int(defaults[15])))
+            if len(defaults) >= 17:
+                self.profileCheckBox.setChecked(bool(int(defaults[16])))
+            if len(defaults) >= 18 and self._formatRows:
+                self._formatRows[0].setProfile(defaults[17])
+            if len(defaults) >= 19:
+                self.compressionBudgetSpinBox.setValue(int(defaults[18]))
+            if len(defaults) >= 20:
+                self.watchCheckBox.setChecked(bool(int(defaults[19])))
+            if len(defaults) >= 21:
+                self.archiveComboBox.setCurrentIndex(max(0, self.archiveComboBox.findData(defaults[20])))
+            if len(defaults) >= 23:
+                self.atlasCheckBox.setChecked(bool(int(defaults[21])))
+                self.atlasSizeSpinBox.setValue(int(defaults[22]))
+            if len(defaults) >= 24:
+                self.dedupeComboBox.setCurrentIndex(max(0, self.dedupeComboBox.findData(defaults[23])))
+            if len(defaults) >= 25:
+                self.resumeCheckBox.setChecked(bool(int(defaults[24])))
+            if len(defaults) >= 26:
+                self.snapshotCheckBox.setChecked(bool(int(defaults[25])))
+            if len(defaults) >= 27:
+                self.pixelMemorySpinBox.setValue(int(defaults[26]))
+            if len(defaults) >= 31:
+                self.optimizeCheckBox.setChecked(bool(int(defaults[27])))
+                for commandInput, command in zip(self.optimizeCommandInputs.values(), defaults[28:31]):
+                    commandInput.setText(self.decodePath(command))
+            if len(defaults) >= 32 and self._formatRows:
+                self._formatRows[0].setMaxSize(int(defaults[31]))
+
+            self.toggleExportLayersSeparately()
+
     def selectDir(self):
         """Open directory selection dialog"""
         directory = self.directoryTextField.text()
@@ -666,6 +1042,34 @@ class QuickExportDocker(krita.DockWidget):
         self.groupAsLayerCheckBox.setVisible(state)
         self.ignoreFilterLayersCheckBox.setVisible(state)
         self.ignoreInvisibleLayersCheckBox.setVisible(state)
+        self.cropToContentCheckBox.setVisible(state)
+        self.atlasCheckBox.setVisible(state)
+        self.toggleCropToContent()
+        self.toggleAtlas()
+        if not state:
+            self.adjustDockToContents()
+
+    def toggleCropToContent(self):
+        """Show the padding field only while cropping layers"""
+        self.cropPaddingSpinBox.setVisible(self.cropToContentCheckBox.isVisible()
+                                           and self.cropToContentCheckBox.isChecked())
+
+    def toggleAtlas(self):
+        """Show the page size field only while packing atlases"""
+        self.atlasSizeSpinBox.setVisible(self.atlasCheckBox.isVisible()
+                                         and self.atlasCheckBox.isChecked())
+
+    def toggleTiledExport(self):
+        """Show the tile pyramid option only with tiled export"""
+        state = self.tiledExportCheckBox.isChecked()
+        self.tilePyramidCheckBox.setVisible(state)
+        if not state:
+            self.adjustDockToContents()
+
+    def toggleOptimize(self):
+        """Show the optimizer commands only while optimizing"""
+        state = self.optimizeCheckBox.isChecked()
+        self.optimizeOptionsWidget.setVisible(state)
         if not state:
             self.adjustDockToContents()
 
@@ -702,295 +1106,388 @@ class QuickExportDocker(krita.DockWidget):
 
     def getFileExtension(self, format_text):
         """Get the file extension for a format"""
-        extensions = {
-            "PNG": "png",
-            "JPEG": "jpg",
-            "JPEG-XL": "jxl",
-            "KRA": "kra",
-            "PSD": "psd"
-        }
-        return extensions.get(format_text.upper(), "png")
+        return fileExtension(format_text)
 
-    def createExportInfoObject(self, file_format, transparency=True):
+    def createExportInfoObject(self, file_format, transparency=True, properties=None):
         """Create InfoObject with format-specific export settings"""
-        info = krita.InfoObject()
-        formatUpper = file_format.upper()
-        
-        if formatUpper == "PNG":
-            # PNG Settings:
-            # - Max compression (9)
-            # - Force convert to sRGB enabled
-            # - All other options disabled
-            # - Transparency based on toggle button
-            info.setProperty("compression", 9)
-            info.setProperty("indexed", False)
-            info.setProperty("interlaced", False)
-            info.setProperty("saveSRGBProfile", True)  # Force convert to sRGB
-            info.setProperty("forceSRGB", True)
-            info.setProperty("alpha", transparency)
-            info.setProperty("transparencyFillcolor", [255, 255, 255])  # White fill if no transparency
-            
-        elif formatUpper in ["JPEG", "JPG"]:
-            # JPEG Settings:
-            # - Quality: 100%
-            # - Subsampling: 2x2, 1x1, 1x1 (smallest file) = 1
-            # - Metadata Anonymizer enabled
-            info.setProperty("quality", 100)
-            info.setProperty("smoothing", 0)
-            info.setProperty("subsampling", 1)  # 2x2,1x1,1x1 (smallest)
-            info.setProperty("progressive", False)
-            info.setProperty("optimize", True)
-            info.setProperty("saveProfile", True)
-            info.setProperty("transparencyFillcolor", [255, 255, 255])
-            info.setProperty("storeMetaData", False)  # Anonymizer - don't store metadata
-            info.setProperty("storeAuthor", False)  # Don't store author
-            info.setProperty("exif", False)  # No EXIF
-            
-        elif formatUpper in ["JPEG-XL", "JXL"]:
-            # JPEG-XL Settings:
-            # - Don't save as animated
-            # - Flatten the image
-            # - No lossy encoding (lossless)
-            # - Effort/Tradeoff: 9 (max)
-            # - Decoding speed: 0 (slowest/best quality)
-            info.setProperty("lossless", True)  # No lossy encoding
-            info.setProperty("effort", 9)  # Max effort/tradeoff
-            info.setProperty("decodingSpeed", 0)  # Slowest/best quality
-            info.setProperty("flattenImage", True)  # Flatten the image
-            info.setProperty("animated", False)  # Don't save as animated
-            
-        elif formatUpper == "KRA":
-            # KRA native format - Krita's native format
-            info.setProperty("flattenImage", False)
-            
-        elif formatUpper == "PSD":
-            # PSD format - Photoshop compatibility
-            info.setProperty("psdCompression", 1)  # RLE compression
-            
-        return info
+        return createExportInfoObject(file_format, transparency, properties)
 
-    def exportAction(self):
-        """Main export action - exports all format rows"""
-        self._isExporting = True
-        
-        directory = self.directoryTextField.text()
-        document = Application.activeDocument()
+    def getExportProperties(self, file_format, transparency=True):
+        """Get the format-specific export settings as a plain dict"""
+        return exportProperties(file_format, transparency)
 
-        self.exportMessage.setText(i18n("Exporting..."))
-        
+    def getPreset(self):
+        """Get the current docker settings as an export preset"""
+        return {
+            "directory": self.directoryTextField.text(),
+            "filename": self.getExportFilename(),
+            "rows": [formatRow.getExportSettings() for formatRow in self._formatRows],
+            "batchmode": self.batchmodeCheckBox.isChecked(),
+            "exportOnlySelected": self.exportOnlySelectedCheckBox.isChecked(),
+            "createFileDirectory": self.createFileDirectoryCheckBox.isChecked(),
+            "layersSeparately": self.exportLayersSeparatelyCheckBox.isChecked(),
+            "groupAsLayer": self.groupAsLayerCheckBox.isChecked(),
+            "ignoreFilterLayers": self.ignoreFilterLayersCheckBox.isChecked(),
+            "ignoreInvisibleLayers": self.ignoreInvisibleLayersCheckBox.isChecked(),
+            "cropToContent": self.cropToContentCheckBox.isChecked(),
+            "cropPadding": self.cropPaddingSpinBox.value(),
+            "skipUnchanged": self.skipUnchangedCheckBox.isChecked(),
+            "parallelEncoding": self.parallelEncodingCheckBox.isChecked(),
+            "tiledExport": self.tiledExportCheckBox.isChecked(),
+            "tilePyramid": self.tilePyramidCheckBox.isChecked(),
+            "profile": self.profileCheckBox.isChecked(),
+            "compressionBudget": self.compressionBudgetSpinBox.value(),
+            "archive": self.archiveComboBox.currentData(),
+            "atlas": self.atlasCheckBox.isChecked(),
+            "atlasSize": self.atlasSizeSpinBox.value(),
+            "dedupe": self.dedupeComboBox.currentData(),
+            "resume": self.resumeCheckBox.isChecked(),
+            "snapshot": self.snapshotCheckBox.isChecked(),
+            "pixelMemoryLimit": self.pixelMemorySpinBox.value(),
+            "optimize": self.optimizeCheckBox.isChecked(),
+            "optimizeCommands": {file_format: commandInput.text().strip()
+                                 for file_format, commandInput in self.optimizeCommandInputs.items()},
+        }
+
+    def savePresetAction(self):
+        """Save the current settings to a preset file for headless batch exports"""
+        path, _ = QFileDialog.getSaveFileName(
+            self, i18n("Save Export Preset"),
+            os.path.join(self.directoryTextField.text(), "quickexport-preset.json"),
+            i18n("Export presets (*.json)"))
+        if not path:
+            return
+        try:
+            savePreset(path, self.getPreset())
+            self.exportMessage.setText(i18n(f"Preset saved to {path}"))
+        except OSError as e:
+            self.exportMessage.setText(i18n(f"Could not save preset: {str(e)}"))
+
+    def createSession(self, overrides=None, document=None):
+        """Create an export session for a document (the active one by default), or show why it can't start"""
+        activeDocument = Application.activeDocument()
+        if document is None:
+            document = activeDocument
         if not document:
             self.exportMessage.setText(i18n("No document open."))
-            self._isExporting = False
-            return 
-        elif not directory:
-            self.exportMessage.setText(i18n("Select an export directory."))
-            self._isExporting = False
-            return 
-        elif not os.path.exists(directory) or not os.path.isdir(directory):
-            self.exportMessage.setText(i18n("Export directory doesn't exist."))
-            self._isExporting = False
+            return None
+        preset = self.getPreset()
+        preset.update(overrides or {})
+        if activeDocument and document != activeDocument:
+            preset = self.getDocumentPreset(preset, activeDocument)
+        session = ExportSession(document, preset, self._encoder, self._optimizer)
+        error = session.validate()
+        if error:
+            self.exportMessage.setText(error)
+            return None
+        return session
+
+    def getDocumentPreset(self, preset, active_document):
+        """Adapt a preset made for the active document to another open document.
+
+        Format row sizes become scales of the active document's size, and
+        the filename falls back to the other document's own name.
+        """
+        preset = dict(preset, filename="")
+        rows = []
+        for row in preset["rows"]:
+            row = dict(row)
+            if active_document.width() > 0:
+                row["scale"] = row.pop("width") / active_document.width()
+                row.pop("height")
+            rows.append(row)
+        preset["rows"] = rows
+        return preset
+
+    def dryRunAction(self):
+        """Show what an export would write without encoding anything"""
+        session = self.createSession()
+        if session is None:
             return
         
-        if not self._formatRows:
-            self.exportMessage.setText(i18n("No formats to export."))
-            self._isExporting = False
-            return
+        plan = session.buildPlan()
+        session.plan = plan
+        preflightError = session.preflight()
+        collisions = plan.collisions()
+        summary = i18n(f"{len(plan)} files, {plan.totalPixels() / 1e6:.1f} megapixels, "
+                       f"about {formatBytes(plan.estimatedBytes())}.")
+        if session.preset["archive"]:
+            summary += "\n" + i18n(f"Written into {plan.exportName}.{session.preset['archive']}.")
+        if collisions:
+            summary += "\n" + i18n(f"{len(collisions)} output paths would be written more than once.")
+        for note in [preflightError] + session.preflightNotes:
+            if note:
+                summary += "\n" + note
+        report = session.estimate.report(availableMemory(), freeDiskSpace(session.directory))
+        
+        box = QMessageBox(self)
+        box.setWindowTitle(i18n("Quick Export - Dry Run"))
+        warning = collisions or preflightError or session.preflightNotes
+        box.setIcon(QMessageBox.Warning if warning else QMessageBox.Information)
+        box.setText(summary)
+        box.setDetailedText(plan.dryRunReport() + "\n" + "\n".join(report))
+        box.exec_()
 
-        # Get the user-specified filename
-        exportName = self.getExportFilename()
-        
-        exportDir = ""
+    def exportAction(self):
+        """Main export action - plans all format rows and starts the export engine"""
+        self.startExport()
 
-        baseNode = document.rootNode()
+    def exportAllAction(self):
+        """Export every open document with the current settings in one queue"""
+        documents = Application.documents()
+        if not documents:
+            self.exportMessage.setText(i18n("No document open."))
+            return
+        self.startExport(documents=documents)
 
-        if self.exportOnlySelectedCheckBox.isChecked():
-            baseNode = document.activeNode()
-            if baseNode:
-                exportName = baseNode.name()
+    def onImageSaved(self, filename):
+        """Schedule an export when the active document is saved in watch mode"""
+        if not self.watchCheckBox.isChecked() or not filename:
+            return
+        savedPath = os.path.normcase(os.path.abspath(filename))
+        # Ignore saves made by the export itself (KRA outputs and the part files they are written to)
+        for session in self._sessions:
+            for job in session.plan.jobs:
+                outputPath = os.path.join(session.directory, job.relativePath)
+                for path in (outputPath, partialPath(outputPath)):
+                    if os.path.normcase(os.path.abspath(path)) == savedPath:
+                        return
+        document = Application.activeDocument()
+        if not document or not document.fileName():
+            return
+        if os.path.normcase(os.path.abspath(document.fileName())) != savedPath:
+            return
+        # Restarting the timer collapses bursts of saves into one export
+        self._watchTimer.start()
 
-        if self.createFileDirectoryCheckBox.isChecked():
-            exportDir = exportName
-            self.createDirectory(exportDir)
+    def watchExport(self):
+        """Export after a save, writing only the outputs that changed"""
+        if not self.watchCheckBox.isChecked():
+            return
+        if self._exportEngine.isRunning():
+            # Try again once the running export is done
+            self._watchTimer.start()
+            return
+        self.startExport({"skipUnchanged": True})
 
-        Application.setBatchmode(self.batchmodeCheckBox.isChecked())
+    def startExport(self, overrides=None, documents=None):
+        """Plan the export of the active document, or of several documents, and start the export engine.
 
-        exportedFormats = []
-        
-        # Count format occurrences to detect duplicates
-        formatCounts = {}
-        for formatRow in self._formatRows:
-            settings = formatRow.getExportSettings()
-            ext = self.getFileExtension(settings['format'])
-            formatCounts[ext] = formatCounts.get(ext, 0) + 1
+        The tasks of all documents share one queue and one encoder pool, so
+        background encoding of one document overlaps the next one. Each
+        document's snapshot is taken right before its first task and its
+        scaled clones are closed after its last task, so only one document's
+        copies are held at once.
+        """
+        if self._exportEngine.isRunning():
+            return
+        self._isExporting = True
+        # Optimizer passes of the last export go on, the message is this export's now
+        self._optimizeTimer.stop()
         
-        # Track which formats need unique suffixes
-        formatNeedsSuffix = {ext: count > 1 for ext, count in formatCounts.items()}
+        self.exportMessage.setText(i18n("Exporting..."))
         
+        sessions = []
+        for document in documents or [None]:
+            session = self.createSession(overrides, document)
+            if session is None:
+                self._isExporting = False
+                return
+            sessions.append(session)
+
+        tasks = []
         try:
-            # Export each format row
-            for formatRow in self._formatRows:
-                settings = formatRow.getExportSettings()
-                formatText = settings['format']
-                fileExtension = self.getFileExtension(formatText)
-                targetWidth = settings['width']
-                targetHeight = settings['height']
-                transparency = settings['transparency']
-                
-                # Calculate effective PPI based on scale ratio
-                originalWidth = document.width()
-                originalHeight = document.height()
-                originalPPI = int(document.resolution())
-                
-                # Calculate scale factor and effective PPI
-                scaleX = targetWidth / originalWidth if originalWidth > 0 else 1.0
-                effectivePPI = int(round(originalPPI * scaleX))
-                
-                # Create filename with PPI suffix if there are duplicate formats or different resolution
-                if formatNeedsSuffix.get(fileExtension, False):
-                    sizedExportName = f"{exportName}_{effectivePPI}ppi"
-                elif targetWidth != originalWidth or targetHeight != originalHeight:
-                    sizedExportName = f"{exportName}_{effectivePPI}ppi"
-                else:
-                    sizedExportName = exportName
-                
-                if self.exportLayersSeparatelyCheckBox.isChecked():
-                    self.exportLayers(baseNode, exportDir, fileExtension, 
-                                     targetWidth, targetHeight, transparency)
-                else:
-                    self.exportNodeWithScale(baseNode, exportDir, sizedExportName, 
-                                            fileExtension, targetWidth, targetHeight, 
-                                            transparency)
-                
-                exportedFormats.append(f"{sizedExportName}.{fileExtension}")
-                
-            self.exportMessage.setText(i18n(f"Exported: {', '.join(exportedFormats)}"))
+            for session in sessions:
+                sessionTasks = session.start(defer_snapshot=len(sessions) > 1)
+                if len(sessions) > 1 and sessionTasks:
+                    firstTask = sessionTasks[0]
+                    sessionTasks[0] = ExportTask(firstTask.label, self.runAfterSnapshot,
+                                                 firstTask, session)
+                    lastTask = sessionTasks[-1]
+                    sessionTasks[-1] = ExportTask(lastTask.label, self.runAndReleaseClones,
+                                                  lastTask, session)
+                tasks.extend(sessionTasks)
         except Exception as e:
+            for session in sessions:
+                if session.plan is not None:
+                    session.finish(False)
             self.exportMessage.setText(i18n(f"Export failed: {str(e)}"))
-        finally:
-            Application.setBatchmode(True)
             self._isExporting = False
+            return
+        
+        self._sessions = sessions
+        # The preflight may have lowered how many encodes can wait at once
+        self._exportEngine.maxPending = min(session.maxPending for session in sessions)
+        Application.setBatchmode(sessions[0].preset["batchmode"])
+        self.setExportRunning(True)
+        self._exportEngine.start(tasks)
 
-    def exportNodeWithScale(self, node, export_folder, filename, file_format, 
-                            target_width, target_height, transparency=True):
-        """Export a single node with scaling and format-specific settings"""
-        export_file_path = os.path.join(
-            self.directoryTextField.text(), 
-            export_folder, 
-            f"{filename}.{file_format}"
-        )
+    def runAfterSnapshot(self, task, session):
+        """Take a document's snapshot, then run its first task"""
+        session.captureSnapshot()
+        return task.run()
 
-        document = Application.activeDocument()
-        originalWidth = document.width()
-        originalHeight = document.height()
-        
-        # Handle native format exports differently
-        formatUpper = file_format.upper()
-        
-        # Check if we need to scale
-        needsScaling = (target_width != originalWidth or target_height != originalHeight)
-        
-        if needsScaling:
-            # Clone the document for scaling
-            clonedDoc = document.clone()
-            clonedDoc.scaleImage(target_width, target_height, 
-                                int(clonedDoc.xRes()), int(clonedDoc.yRes()), "Bilinear")
-            clonedDoc.refreshProjection()
-            clonedDoc.waitForDone()
-            
-            if formatUpper == "KRA":
-                clonedDoc.saveAs(export_file_path)
-            elif formatUpper == "PSD":
-                info = self.createExportInfoObject(file_format, transparency)
-                clonedDoc.exportImage(export_file_path, info)
-            else:
-                bounds = QRect(0, 0, target_width, target_height)
-                info = self.createExportInfoObject(file_format, transparency)
-                clonedDoc.rootNode().save(export_file_path,
-                                         clonedDoc.resolution() / 72.,
-                                         clonedDoc.resolution() / 72.,
-                                         info, bounds)
-            
-            clonedDoc.close()
+    def runAndReleaseClones(self, task, session):
+        """Run a document's last task, then close its scaled clones to free their memory"""
+        try:
+            return task.run()
+        finally:
+            # Background encodes work on copied pixels, tiled exports on the document
+            session.closeScaledDocuments()
+
+    def setExportRunning(self, running):
+        """Toggle the docker between its idle and exporting states"""
+        self.exportButton.setEnabled(not running)
+        self.exportAllButton.setEnabled(not running)
+        self.exportProgressBar.setVisible(running)
+        self.cancelButton.setVisible(running)
+        self.cancelButton.setEnabled(running)
+        if running:
+            self.exportProgressBar.setValue(0)
         else:
-            if formatUpper == "KRA":
-                document.saveAs(export_file_path)
-            elif formatUpper == "PSD":
-                info = self.createExportInfoObject(file_format, transparency)
-                document.exportImage(export_file_path, info)
-            else:
-                bounds = QRect(0, 0, document.width(), document.height())
-                info = self.createExportInfoObject(file_format, transparency)
-                
-                node.save(export_file_path, 
-                          document.resolution() / 72.,
-                          document.resolution() / 72., 
-                          info, bounds)
-
-    def exportNode(self, node, export_folder, filename, file_format, transparency=True):
-        """Export a single node with format-specific settings (no scaling)"""
-        export_file_path = os.path.join(
-            self.directoryTextField.text(), 
-            export_folder, 
-            f"{filename}.{file_format}"
-        )
+            self.adjustDockToContents()
 
-        document = Application.activeDocument()
-        
-        # Handle native format exports differently
-        formatUpper = file_format.upper()
-        
-        if formatUpper == "KRA":
-            # For KRA, save the document directly
-            document.saveAs(export_file_path)
-        elif formatUpper == "PSD":
-            # For PSD, use exportImage with mime type
-            info = self.createExportInfoObject(file_format, transparency)
-            document.exportImage(export_file_path, info)
+    def cancelExport(self):
+        """Ask the export engine to stop between tasks"""
+        self.cancelButton.setEnabled(False)
+        self.exportMessage.setText(i18n("Cancelling..."))
+        self._exportEngine.cancel()
+
+    def onExportProgress(self, done, total, secondsLeft):
+        """Update the progress bar and ETA while the export runs"""
+        self.exportProgressBar.setMaximum(max(total, 1))
+        self.exportProgressBar.setValue(done)
+        if not self.cancelButton.isEnabled():
+            return
+        message = i18n(f"Exporting {done}/{total}")
+        if secondsLeft >= 0 and done < total:
+            message += i18n(f" - about {self.formatDuration(secondsLeft)} left")
+        self.exportMessage.setText(message)
+
+    def onExportFinished(self, cancelled, error):
+        """Clean up after the export engine stops and report the result"""
+        sessions = self._sessions
+        self._sessions = []
+        for session in sessions:
+            session.finish(not cancelled and not error)
+        Application.setBatchmode(True)
+        self._isExporting = False
+        self.setExportRunning(False)
+        
+        done = self._exportEngine.doneCount()
+        total = self._exportEngine.totalCount()
+        if error:
+            self.exportMessage.setText(i18n(f"Export failed: {error}"))
+        elif cancelled:
+            self.exportMessage.setText(i18n(f"Export cancelled after {done} of {total} files."))
+        elif len(sessions) > 1:
+            skipped = sum(session.skippedCount for session in sessions)
+            resumed = sum(session.resumedCount for session in sessions)
+            # Identical outputs are linked or copied, the dedupe summary counts them
+            deduped = sum(session.dedupedCount for session in sessions)
+            megapixels = sum(session.plan.totalPixels() for session in sessions) / 1e6
+            elapsed = self._exportEngine.elapsed()
+            message = i18n(f"Exported {len(sessions)} documents, {total - skipped - resumed - deduped} files "
+                           f"in {self.formatDuration(elapsed)} "
+                           f"({megapixels / max(elapsed, 0.001):.1f} megapixels/s)")
+            if skipped:
+                message += i18n(f" ({skipped} unchanged files skipped)")
+            if resumed:
+                message += i18n(f" ({resumed} files kept from the interrupted export)")
+            message += self.formatDedupeSummary(sessions)
+            message += self.formatOverBudget(sessions)
+            message += self.formatCollisions(sessions)
+            self.exportMessage.setText(message + self.formatPreflightNotes(sessions))
         else:
-            # For image formats, export the node
-            bounds = QRect(0, 0, document.width(), document.height())
-            info = self.createExportInfoObject(file_format, transparency)
-            
-            node.save(export_file_path, 
-                      document.resolution() / 72.,
-                      document.resolution() / 72., 
-                      info, bounds)
-
-    def exportLayers(self, parentNode, parentDir, file_format, 
-                     target_width, target_height, transparency=True):
-        """Export layers separately with scaling"""
-        for node in parentNode.childNodes():
-            if node.name() == "Selection Mask":
-                continue
-            elif self.ignoreFilterLayersCheckBox.isChecked() and 'filter' in node.type():
-                continue
-            elif self.ignoreInvisibleLayersCheckBox.isChecked() and not node.visible():
-                continue
-            elif node.type() == 'grouplayer' and node.childNodes() and not self.groupAsLayerCheckBox.isChecked():
-                newDir = os.path.join(parentDir, node.name())
-                self.createDirectory(newDir)
-                self.exportLayers(node, newDir, file_format, 
-                                 target_width, target_height, transparency)
-            else:
-                node_name = node.name()
-                # Check for format override tags in layer name
-                export_format = file_format
-                if '[jpeg]' in node_name.lower() or '[jpg]' in node_name.lower():
-                    export_format = 'jpg'
-                elif '[png]' in node_name.lower():
-                    export_format = 'png'
-                elif '[jxl]' in node_name.lower():
-                    export_format = 'jxl'
-                self.exportNodeWithScale(node, parentDir, node_name, export_format,
-                                        target_width, target_height, transparency)
-
-    def createDirectory(self, directory):
-        """Create export directory if it doesn't exist"""
-        target_directory = os.path.join(self.directoryTextField.text(), directory)
-        if os.path.exists(target_directory) and os.path.isdir(target_directory):
+            session = sessions[0]
+            message = i18n(f"Exported: {', '.join(session.plan.summaryNames)}")
+            if session.preset["archive"]:
+                message += i18n(f" into {os.path.basename(session.archivePath())}")
+            if session.skippedCount:
+                message += i18n(f" ({session.skippedCount} unchanged files skipped)")
+            if session.resumedCount:
+                message += i18n(f" ({session.resumedCount} files kept from the interrupted export)")
+            message += self.formatDedupeSummary(sessions)
+            message += self.formatOverBudget(sessions)
+            message += self.formatCollisions(sessions)
+            if session.preset["profile"]:
+                message += "\n" + i18n(f"Profile: {session.profiler.summary()}")
+            self.exportMessage.setText(message + self.formatPreflightNotes(sessions))
+        self.watchOptimizer(sessions)
+
+    def watchOptimizer(self, sessions):
+        """Follow the optimizer passes of an export's files under its result message"""
+        self._optimizeStats = [session.optimizeStats for session in sessions if session.optimizeStats.queued]
+        if not self._optimizeStats:
             return
-        try:
-            os.makedirs(target_directory)
-        except OSError as e:
-            raise e
-        
+        self._optimizeMessage = self.exportMessage.text()
+        self.updateOptimizeProgress()
+
+    def updateOptimizeProgress(self):
+        """Show how many files are optimized, and the space saved once they all are"""
+        queued = sum(stats.queued for stats in self._optimizeStats)
+        done = sum(stats.done for stats in self._optimizeStats)
+        if done < queued:
+            self.exportMessage.setText(self._optimizeMessage + "\n" + i18n(f"Optimizing {done}/{queued} files..."))
+            if not self._optimizeTimer.isActive():
+                self._optimizeTimer.start()
+            return
+        self._optimizeTimer.stop()
+        self.exportMessage.setText(self._optimizeMessage + self.formatOptimizeSummary(self._optimizeStats))
+
+    def formatOptimizeSummary(self, allStats):
+        """How many files the optimizer made smaller and the space it saved"""
+        done = sum(stats.done for stats in allStats)
+        optimized = sum(stats.optimized for stats in allStats)
+        failed = sum(stats.failed for stats in allStats)
+        bytesBefore = sum(stats.bytesBefore for stats in allStats)
+        bytesSaved = sum(stats.bytesSaved for stats in allStats)
+        elapsed = max(stats.elapsed for stats in allStats)
+        message = "\n" + i18n(f"Optimized {optimized} of {done} files in {self.formatDuration(elapsed)}, "
+                              f"{formatBytes(bytesSaved)} saved")
+        if bytesBefore:
+            message += f" ({100.0 * bytesSaved / bytesBefore:.1f}%)"
+        if failed:
+            errors = [stats.lastError for stats in allStats if stats.lastError]
+            message += i18n(f"\n{failed} files could not be optimized: {errors[-1]}")
+        return message
+
+    def formatDedupeSummary(self, sessions):
+        """How many identical files were linked or copied instead of exported, and the space saved"""
+        count = sum(session.dedupedCount for session in sessions)
+        if not count:
+            return ""
+        savedBytes = sum(session.dedupedBytes for session in sessions)
+        if sessions[0].preset["dedupe"] == "copy":
+            return i18n(f" ({count} identical files copied, {formatBytes(savedBytes)} not encoded)")
+        return i18n(f" ({count} identical files hardlinked, {formatBytes(savedBytes)} saved)")
+
+    def formatOverBudget(self, sessions):
+        """How many files didn't fit their size limit even at the lowest quality"""
+        count = sum(len(session.overBudget) for session in sessions)
+        if not count:
+            return ""
+        return i18n(f" ({count} files over their size limit)")
+
+    def formatCollisions(self, sessions):
+        """How many archive outputs were left out for a later one of the same name"""
+        count = sum(session.collidedCount for session in sessions)
+        if not count:
+            return ""
+        return i18n(f" ({count} files left out of the archive, a later file has the same name)")
+
+    def formatPreflightNotes(self, sessions):
+        """What the preflight changed to fit the export in memory, one note per line"""
+        notes = dict.fromkeys(note for session in sessions for note in session.preflightNotes)
+        return "".join("\n" + note for note in notes)
+
+    def formatDuration(self, seconds):
+        """Format a duration in seconds as a short human readable string"""
+        seconds = int(round(seconds))
+        if seconds < 60:
+            return f"{seconds}s"
+        minutes, seconds = divmod(seconds, 60)
+        if minutes < 60:
+            return f"{minutes}m {seconds:02d}s"
+        hours, minutes = divmod(minutes, 60)
+        return f"{hours}h {minutes:02d}m"
@@ -0,0 +1,204 @@
+# Quick Export Plugin for Krita
+# Based on Quick Export Layers Docker by fullmontis (public domain)
+
+# Tiled export for huge canvases. The projection is read in fixed-size tiles
+# and streamed into the PNG encoder one row band at a time, so memory use
+# stays around one band of tiles no matter how large the canvas is.
+
+import math
+import os
+import struct
+import zlib
+
+from PyQt5.QtCore import Qt
+from PyQt5.QtGui import QImage, QPainter
+
+from .exportencoders import flattenImage, imageFromPixels, packedRows, partialPath
+
+
+DEFAULT_TILE_SIZE = 256
+
+
+class PngStreamWriter(object):
+    """Writes a PNG file row band by row band, compressing as the rows arrive.
+
+    The rows go to a partial file that replaces path only once it is complete.
+    """
+
+    def __init__(self, path, width, height, alpha=True, compression=9,
+                 pixels_per_meter=None, srgb=True):
+        self.path = path
+        self.width = width
+        self.height = height
+        self.alpha = alpha
+        self.rowsWritten = 0
+        self._compressor = zlib.compressobj(compression)
+        self._partPath = partialPath(path)
+        self._file = open(self._partPath, "wb")
+
+        self._file.write(b"\x89PNG\r\n\x1a\n")
+        colorType = 6 if alpha else 2  # RGBA or RGB, 8 bits per channel
+        self._writeChunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, colorType, 0, 0, 0))
+        if srgb:
+            self._writeChunk(b"sRGB", b"\x00")  # Perceptual rendering intent
+        if pixels_per_meter:
+            ppm = int(round(pixels_per_meter))
+            self._writeChunk(b"pHYs", struct.pack(">IIB", ppm, ppm, 1))
+
+    def _writeChunk(self, chunk_type, data):
+        self._file.write(struct.pack(">I", len(data)))
+        self._file.write(chunk_type)
+        self._file.write(data)
+        self._file.write(struct.pack(">I", zlib.crc32(data, zlib.crc32(chunk_type)) & 0xffffffff))
+
+    def writeRows(self, data, row_count):
+        """Append rows of packed RGBA (or RGB) bytes, top to bottom"""
+        rowBytes = self.width * (4 if self.alpha else 3)
+        # Every row starts with its filter type; 0 keeps the rows as they are
+        filtered = b"".join(b"\x00" + data[i * rowBytes:(i + 1) * rowBytes] for i in range(row_count))
+        compressed = self._compressor.compress(filtered)
+        if compressed:
+            self._writeChunk(b"IDAT", compressed)
+        self.rowsWritten += row_count
+
+    def close(self):
+        """Finish the image data and close the file"""
+        if self._file is None:
+            return
+        if self.rowsWritten != self.height:
+            self.abort()
+            raise IOError(f"{self.path}: wrote {self.rowsWritten} of {self.height} rows")
+        self._writeChunk(b"IDAT", self._compressor.flush())
+        self._writeChunk(b"IEND", b"")
+        self._file.close()
+        self._file = None
+        os.replace(self._partPath, self.path)
+
+    def abort(self):
+        """Close and delete a partially written file"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            try:
+                os.remove(self._partPath)
+            except OSError:
+                pass
+
+
+def exportTiled(node, rect, path, properties, resolution,
+                tile_size=DEFAULT_TILE_SIZE, pyramid=False):
+    """Stream a node's 8-bit RGBA projection to a PNG file, one band of tiles per step.
+
+    This is a generator: every next() reads and encodes one band, so the
+    caller can keep the UI responsive between bands. With pyramid, the
+    tiles are also written as a DeepZoom tile pyramid next to the file.
+    """
+    x, y, width, height = rect
+    alpha = properties.get("alpha", True)
+    fillColor = properties.get("transparencyFillcolor", [255, 255, 255])
+    writer = PngStreamWriter(path, width, height, alpha,
+                             properties.get("compression", 9),
+                             resolution / 0.0254 if resolution else None,
+                             properties.get("saveSRGBProfile", True))
+    pyramidDir = None
+    maxLevel = 0
+    if pyramid:
+        pyramidDir = os.path.splitext(path)[0] + "_files"
+        maxLevel = pyramidLevelCount(width, height) - 1
+        os.makedirs(os.path.join(pyramidDir, str(maxLevel)), exist_ok=True)
+
+    try:
+        for row, bandTop in enumerate(range(0, height, tile_size)):
+            bandHeight = min(tile_size, height - bandTop)
+            band = QImage(width, bandHeight, QImage.Format_ARGB32)
+            painter = QPainter(band)
+            painter.setCompositionMode(QPainter.CompositionMode_Source)
+            for column, tileLeft in enumerate(range(0, width, tile_size)):
+                tileWidth = min(tile_size, width - tileLeft)
+                data = node.projectionPixelData(x + tileLeft, y + bandTop, tileWidth, bandHeight)
+                tile = imageFromPixels(data, tileWidth, bandHeight, copy=False)
+                painter.drawImage(tileLeft, 0, tile)
+                if pyramidDir:
+                    saveTile(tile if alpha else flattenImage(tile, fillColor),
+                             os.path.join(pyramidDir, str(maxLevel), f"{column}_{row}.png"))
+                del tile, data
+            painter.end()
+
+            if not alpha:
+                band = flattenImage(band, fillColor)
+            writer.writeRows(packedRows(band, alpha), bandHeight)
+            del band
+            yield
+
+        writer.close()
+        if pyramidDir:
+            for _ in buildPyramidLevels(pyramidDir, width, height, tile_size):
+                yield
+            writeDziDescriptor(os.path.splitext(path)[0] + ".dzi", width, height, tile_size)
+    except BaseException:
+        # Also runs when the generator is closed early, e.g. on cancel
+        writer.abort()
+        raise
+
+
+def saveTile(image, path):
+    if not image.save(path, "PNG"):
+        raise IOError(f"Could not write tile {path}")
+
+
+def pyramidLevelCount(width, height):
+    """Number of DeepZoom levels, from 1x1 up to the full size"""
+    return int(math.ceil(math.log(max(width, height, 1), 2))) + 1
+
+
+def levelSize(width, height, level, max_level):
+    scale = 2 ** (max_level - level)
+    return int(math.ceil(width / scale)), int(math.ceil(height / scale))
+
+
+def buildPyramidLevels(pyramid_dir, width, height, tile_size=DEFAULT_TILE_SIZE):
+    """Build every lower DeepZoom level from the tiles of the level above it.
+
+    Each output tile is made from at most four tiles of the previous level,
+    so only a handful of tiles are in memory at once. Yields once per level.
+    """
+    maxLevel = pyramidLevelCount(width, height) - 1
+    for level in range(maxLevel - 1, -1, -1):
+        levelWidth, levelHeight = levelSize(width, height, level, maxLevel)
+        sourceDir = os.path.join(pyramid_dir, str(level + 1))
+        targetDir = os.path.join(pyramid_dir, str(level))
+        os.makedirs(targetDir, exist_ok=True)
+        columns = int(math.ceil(levelWidth / tile_size))
+        rows = int(math.ceil(levelHeight / tile_size))
+        for row in range(rows):
+            for column in range(columns):
+                tileWidth = min(tile_size, levelWidth - column * tile_size)
+                tileHeight = min(tile_size, levelHeight - row * tile_size)
+                # Stitch the children at the previous level's scale, then halve
+                combined = QImage(tile_size * 2, tile_size * 2, QImage.Format_ARGB32)
+                combined.fill(Qt.transparent)
+                painter = QPainter(combined)
+                usedWidth = usedHeight = 0
+                for dy in (0, 1):
+                    for dx in (0, 1):
+                        child = QImage(os.path.join(sourceDir, f"{column * 2 + dx}_{row * 2 + dy}.png"))
+                        if child.isNull():
+                            continue
+                        painter.drawImage(dx * tile_size, dy * tile_size, child)
+                        usedWidth = max(usedWidth, dx * tile_size + child.width())
+                        usedHeight = max(usedHeight, dy * tile_size + child.height())
+                painter.end()
+                tile = combined.copy(0, 0, usedWidth, usedHeight).scaled(
+                    tileWidth, tileHeight, Qt.IgnoreAspectRatio, Qt.SmoothTransformation)
+                saveTile(tile, os.path.join(targetDir, f"{column}_{row}.png"))
+        yield
+
+
+def writeDziDescriptor(path, width, height, tile_size=DEFAULT_TILE_SIZE):
+    """Write the .dzi file web viewers such as OpenSeadragon load the pyramid from"""
+    with open(path, "w", encoding="utf-8") as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+                '<Image xmlns="http://schemas.microsoft.com/deepzoom/2008"\n'
+                f'       Format="png" Overlap="0" TileSize="{tile_size}">\n'
+                f'  <Size Width="{width}" Height="{height}"/>\n'
+                '</Image>\n')
@@ -0,0 +1,72 @@
+# Quick Export Plugin for Krita
+# Based on Quick Export Layers Docker by fullmontis (public domain)
+
+# The tests run outside Krita, against the stub krita module in benchmarks/.
+# Its layers are filled with one colour each, so the pixels of every output
+# are known.
+#
+#   python -m pytest tests
+
+import os
+import sys
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, os.path.join(ROOT_DIR, "benchmarks"))
+
+import pytest
+from PyQt5.QtWidgets import QApplication
+
+import krita  # The stub in benchmarks/
+
+
+@pytest.fixture(scope="session")
+def layerColor():
+    """The (red, green, blue) of a stub layer filled with a colour number"""
+    def color(number):
+        blue, green, red = [(number * 37 + i * 61) % 256 for i in range(3)]
+        return red, green, blue
+    return color
+
+
+@pytest.fixture(scope="session")
+def app():
+    return QApplication.instance() or QApplication([])
+
+
+@pytest.fixture(autouse=True)
+def stubKrita():
+    """Give every test a Krita without documents or saved settings"""
+    krita.Application.document = None
+    krita.Application.otherDocuments = []
+    krita.Application.settings = {}
+    krita.resetCalls()
+    yield krita
+    krita.Application.document = None
+    krita.Application.otherDocuments = []
+
+
+@pytest.fixture
+def makeDocker(app, tmp_path):
+    """Create a docker exporting a document into tmp_path"""
+    from quickexportdocker.quickexportdocker import QuickExportDocker
+
+    def make(document):
+        krita.Application.document = document
+        docker = QuickExportDocker()
+        docker.directoryTextField.setText(str(tmp_path))
+        return docker
+    return make
+
+
+@pytest.fixture
+def runExport(app):
+    """Run an export of a docker to the end and return its message"""
+    def run(docker, action=None):
+        (action or docker.exportAction)()
+        while docker._isExporting:
+            app.processEvents()
+        return docker.exportMessage.text()
+    return run
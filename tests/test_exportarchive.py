@@ -0,0 +1,91 @@
+# Quick Export Plugin for Krita
+# Based on Quick Export Layers Docker by fullmontis (public domain)
+
+import os
+import tarfile
+import zipfile
+
+import pytest
+from PyQt5.QtGui import QImage
+
+from krita import Document, Node
+from quickexportdocker.exportarchive import ExportArchive
+
+
+def test_zipEntriesKeepTheirFolders(tmp_path):
+    source = tmp_path / "source.txt"
+    source.write_bytes(b"from disk")
+    path = str(tmp_path / "out.zip")
+    archive = ExportArchive(path)
+    assert archive.writeChunks("Group/a.png", [b"pn", memoryview(b"g")]) == 3
+    assert archive.writeFile(os.path.join("Group", "b.txt"), str(source)) == 9
+    assert not os.path.exists(path)
+    archive.close()
+
+    assert sorted(os.listdir(tmp_path)) == ["out.zip", "source.txt"]
+    with zipfile.ZipFile(path) as z:
+        assert z.read("Group/a.png") == b"png"
+        assert z.read("Group/b.txt") == b"from disk"
+        # Compressed formats are stored, the rest is deflated
+        assert z.getinfo("Group/a.png").compress_type == zipfile.ZIP_STORED
+        assert z.getinfo("Group/b.txt").compress_type == zipfile.ZIP_DEFLATED
+
+
+def test_tarEntriesCanBeLinks(tmp_path):
+    path = str(tmp_path / "out.tar")
+    archive = ExportArchive(path, "tar")
+    archive.writeChunks("a.png", [b"png", b"data"])
+    assert archive.writeLink("copy/a.png", "a.png") == 7
+    with pytest.raises(ValueError):
+        archive.writeLink("b.png", "missing.png")
+    archive.close()
+
+    with tarfile.open(path) as tar:
+        assert tar.extractfile("a.png").read() == b"pngdata"
+        assert tar.getmember("copy/a.png").islnk()
+        assert tar.extractfile("copy/a.png").read() == b"pngdata"
+
+
+def test_zipArchivesCantLink(tmp_path):
+    archive = ExportArchive(str(tmp_path / "out.zip"))
+    with pytest.raises(ValueError):
+        archive.writeLink("b.png", "a.png")
+    archive.abort()
+
+
+def test_aNameIsOnlyWrittenOnce(tmp_path):
+    path = str(tmp_path / "out.zip")
+    archive = ExportArchive(path)
+    archive.writeChunks("a.png", [b"first"])
+    assert archive.writeChunks("./a.png", [b"second"]) == 0
+    assert archive.duplicateNames == 1
+    archive.close()
+    with zipfile.ZipFile(path) as z:
+        assert z.namelist() == ["a.png"]
+        assert z.read("a.png") == b"first"
+
+
+def test_anAbortedArchiveLeavesNothing(tmp_path):
+    archive = ExportArchive(str(tmp_path / "out.tar"), "tar")
+    archive.writeChunks("a.png", [b"png"])
+    archive.abort()
+    archive.abort()
+    assert os.listdir(tmp_path) == []
+
+
+def test_theArchiveKeepsTheLastOfLayersWithTheSameName(makeDocker, runExport, tmp_path, layerColor):
+    document = Document(Node("root", "grouplayer", [Node("A", color=1), Node("A", color=2)]), 16, 8)
+    docker = makeDocker(document)
+    docker.exportLayersSeparatelyCheckBox.setChecked(True)
+    docker.parallelEncodingCheckBox.setChecked(True)
+    docker.archiveComboBox.setCurrentIndex(1)
+    message = runExport(docker)
+    assert "(1 files left out of the archive" in message
+
+    archives = [name for name in os.listdir(tmp_path) if name.endswith(".zip")]
+    assert len(archives) == 1
+    with zipfile.ZipFile(str(tmp_path / archives[0])) as z:
+        assert z.namelist() == ["A.png"]
+        image = QImage.fromData(z.read("A.png"))
+    # Written to disk, the second layer would replace the first one too
+    assert image.pixelColor(0, 0).getRgb()[:3] == layerColor(2)
@@ -0,0 +1,91 @@
+# Quick Export Plugin for Krita
+# Based on Quick Export Layers Docker by fullmontis (public domain)
+
+import json
+import os
+import random
+
+from PyQt5.QtGui import QImage
+
+from krita import Document, Node
+from quickexportdocker.exportatlas import packFrames, planAtlases
+from quickexportdocker.exportplan import buildExportPlan
+
+
+def overlaps(a, b, spacing=0):
+    (ax, ay, aw, ah), (bx, by, bw, bh) = a, b
+    return ax < bx + bw + spacing and bx < ax + aw + spacing and ay < by + bh + spacing and by < ay + ah + spacing
+
+
+def test_framesDontOverlapAndFitThePage():
+    generator = random.Random(4)
+    sizes = [(generator.randint(1, 60), generator.randint(1, 60)) for _ in range(200)]
+    placements, pages = packFrames(sizes, 256, spacing=2)
+    assert len(pages) > 1
+    for page, (pageWidth, pageHeight) in enumerate(pages):
+        rects = [(x, y, width, height) for (p, x, y), (width, height) in zip(placements, sizes) if p == page]
+        assert rects
+        # Pages are trimmed to the frames they hold
+        assert pageWidth == max(x + width for x, _, width, _ in rects) <= 256
+        assert pageHeight == max(y + height for _, y, _, height in rects) <= 256
+        for i, a in enumerate(rects):
+            assert not any(overlaps(a, b, 2) for b in rects[i + 1:])
+
+
+def test_oversizedFramesGetAPageOfTheirOwn():
+    placements, pages = packFrames([(10, 10), (300, 20), (10, 10)], 256)
+    assert placements[1] == (0, 0, 0)
+    assert pages == [(300, 20), (20, 10)]
+
+
+def test_framesFillTheShelvesLeftToRight():
+    placements, pages = packFrames([(10, 20), (10, 10), (10, 10)], 31, spacing=1)
+    assert placements == [(0, 0, 0), (0, 11, 0), (0, 0, 21)]
+    assert pages == [(21, 31)]
+
+
+def layerJobs(rows, *layers):
+    document = Document(Node("root", "grouplayer", list(layers)), 100, 50)
+    rows = [dict(row, width=row.get("width", 100), height=row.get("height", 50), transparency=True)
+            for row in rows]
+    return buildExportPlan(document.rootNode(), "drawing", "", 100, 50, 300, rows,
+                           {"layersSeparately": True, "cropToContent": True}).jobs
+
+
+def test_rowsWithDifferentSettingsGetTheirOwnAtlas():
+    jobs = layerJobs([{"format": "JPEG"}, {"format": "JPEG", "maxSize": 10}, {"format": "JXL"}],
+                     Node("A", bounds=(0, 0, 10, 10)), Node("B", bounds=(20, 0, 5, 5)))
+    atlases, remaining = planAtlases(jobs, "drawing", "", 100, 300,
+                                     can_pack=lambda file_format, properties: file_format == "jpg")
+    assert [job.format for job in remaining] == ["jxl", "jxl"]
+    assert len(atlases) == 2
+    assert [atlas.name for atlas in atlases] == ["drawing_300ppi", "drawing_300ppi_2"]
+    assert [len(atlas.frames) for atlas in atlases] == [2, 2]
+    assert [atlas.properties.get("maxBytes") for atlas in atlases] == [None, 10 * 1024]
+
+
+def test_canPackSeesTheProperties():
+    jobs = layerJobs([{"format": "JPEG"}], Node("A", bounds=(0, 0, 10, 10)))
+    seen = []
+    planAtlases(jobs, "drawing", "", 100, 300,
+                can_pack=lambda file_format, properties: seen.append((file_format, properties)))
+    assert seen == [("jpg", jobs[0].properties)]
+
+
+def test_theFrameMapPointsIntoThePages(makeDocker, runExport, tmp_path, layerColor):
+    document = Document(Node("root", "grouplayer", [Node("A", color=1, bounds=(0, 0, 10, 10)),
+                                                    Node("B", color=2, bounds=(40, 20, 6, 4))]), 64, 32)
+    docker = makeDocker(document)
+    docker.exportLayersSeparatelyCheckBox.setChecked(True)
+    docker.cropToContentCheckBox.setChecked(True)
+    docker.atlasCheckBox.setChecked(True)
+    assert runExport(docker).startswith("Exported")
+    assert sorted(os.listdir(tmp_path)) == ["benchmark_atlas.json", "benchmark_atlas_0.png"]
+
+    frameMap = json.loads((tmp_path / "benchmark_atlas.json").read_text())
+    page = QImage(str(tmp_path / "benchmark_atlas_0.png"))
+    assert (page.width(), page.height()) == (frameMap["pages"][0]["width"], frameMap["pages"][0]["height"])
+    for frame, color in zip(frameMap["frames"], [1, 2]):
+        assert (frame["sourceX"], frame["sourceY"]) == [(0, 0), (40, 20)][color - 1]
+        corner = page.pixelColor(frame["x"] + frame["width"] - 1, frame["y"] + frame["height"] - 1)
+        assert corner.getRgb()[:3] == layerColor(color)
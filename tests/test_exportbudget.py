@@ -0,0 +1,89 @@
+# Quick Export Plugin for Krita
+# Based on Quick Export Layers Docker by fullmontis (public domain)
+
+from krita import Document, Node
+from quickexportdocker.exportbudget import (KRITA_ENCODER, RAW_ENCODER, EncodeThroughput,
+                                            budgetJobs, fingerprintProperties)
+from quickexportdocker.exportplan import buildExportPlan
+
+
+def planJobs(rows, width=2000, height=1000):
+    document = Document(Node("root", "grouplayer", [Node("A")]), width, height)
+    rows = [dict(row, width=row.get("width", width), height=row.get("height", height), transparency=True)
+            for row in rows]
+    return buildExportPlan(document.rootNode(), "drawing", "", width, height, 300, rows).jobs
+
+
+def test_onlyAutoJobsAreBudgeted():
+    jobs = planJobs([{"format": "PNG", "profile": "auto"}, {"format": "PNG", "profile": "fast"},
+                     {"format": "JPEG", "profile": "auto"}])
+    budgeted = budgetJobs(jobs, 1000, EncodeThroughput())
+    # With time to spare the auto row gets the strongest compression, the others are kept
+    assert [job.properties.get("compression") for job in budgeted] == [9, 1, None]
+    assert budgeted[2].properties == jobs[2].properties
+
+
+def test_aTightBudgetPicksAFasterLevel():
+    jobs = planJobs([{"format": "PNG", "profile": "auto"}])
+    throughput = EncodeThroughput({KRITA_ENCODER: {"png": {str(level): level * 0.1 for level in range(1, 10)}}})
+    # 2 megapixels: level 5 takes 1 second
+    assert budgetJobs(jobs, 1.0, throughput)[0].properties["compression"] == 5
+    assert budgetJobs(jobs, 0.01, throughput)[0].properties["compression"] == 1
+    # Two workers encode twice as much in the same time
+    assert budgetJobs(jobs, 1.0, throughput, workers=2)[0].properties["compression"] == 9
+
+
+def test_theBudgetIsSharedByPixelCount():
+    jobs = planJobs([{"format": "PNG", "profile": "auto"},
+                     {"format": "PNG", "profile": "auto", "width": 200, "height": 100}])
+    throughput = EncodeThroughput({KRITA_ENCODER: {"png": {str(level): level * 0.1 for level in range(1, 10)}}})
+    levels = [job.properties["compression"] for job in budgetJobs(jobs, 1.0, throughput)]
+    assert levels == [4, 4]
+
+
+def test_eachEncoderHasItsOwnSpeeds():
+    jobs = planJobs([{"format": "PNG", "profile": "auto"}])
+    throughput = EncodeThroughput()
+    for _ in range(20):
+        throughput.record(RAW_ENCODER, "png", {"compression": 9}, 1000000, 0.01)
+        throughput.record(KRITA_ENCODER, "png", {"compression": 9}, 1000000, 10.0)
+    assert budgetJobs(jobs, 1.0, throughput, encoder_of=lambda file_format: RAW_ENCODER)[0].properties[
+        "compression"] == 9
+    assert budgetJobs(jobs, 1.0, throughput)[0].properties["compression"] < 9
+
+
+def test_unmeasuredLevelsFollowTheMeasuredOnes():
+    throughput = EncodeThroughput()
+    default = throughput.secondsPerMegapixel(KRITA_ENCODER, "jxl", 7)
+    for _ in range(30):
+        throughput.record(KRITA_ENCODER, "jxl", {"effort": 3}, 1000000,
+                          2 * throughput.secondsPerMegapixel(KRITA_ENCODER, "jxl", 3))
+    assert throughput.secondsPerMegapixel(KRITA_ENCODER, "jxl", 7) > default * 1.5
+    assert throughput.secondsPerMegapixel(RAW_ENCODER, "jxl", 7) == default
+
+
+def test_smallImagesAndUnknownLevelsAreNotMeasured():
+    throughput = EncodeThroughput()
+    throughput.record(KRITA_ENCODER, "png", {"compression": 9}, 1000, 5.0)
+    throughput.record(KRITA_ENCODER, "png", {"compression": "auto"}, 1000000, 5.0)
+    throughput.record(KRITA_ENCODER, "jpg", {"quality": 90}, 1000000, 5.0)
+    assert throughput.toJson() == "{}"
+
+
+def test_speedsSurviveJson():
+    throughput = EncodeThroughput()
+    throughput.record(RAW_ENCODER, "png", {"compression": 6}, 1000000, 0.25)
+    loaded = EncodeThroughput.fromJson(throughput.toJson())
+    assert loaded.secondsPerMegapixel(RAW_ENCODER, "png", 6) == 0.25
+
+
+def test_speedsSavedPerFormatOnlyLoadAsKritas():
+    loaded = EncodeThroughput.fromJson('{"png": {"6": 0.5}}')
+    assert loaded.secondsPerMegapixel(KRITA_ENCODER, "png", 6) == 0.5
+    assert EncodeThroughput.fromJson("not json").toJson() == "{}"
+
+
+def test_fingerprintsDontChangeWithTheLevelAutoPicked():
+    assert fingerprintProperties("png", "auto", {"compression": 3, "alpha": True}) == {
+        "compression": "auto", "alpha": True}
+    assert fingerprintProperties("png", "max", {"compression": 9}) == {"compression": 9}
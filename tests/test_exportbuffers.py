@@ -0,0 +1,84 @@
+# Quick Export Plugin for Krita
+# Based on Quick Export Layers Docker by fullmontis (public domain)
+
+import os
+
+from PyQt5.QtGui import QImage
+
+from krita import Document, Node
+from quickexportdocker.exportbuffers import PixelBuffers
+
+
+def test_buffersWithinTheLimitStayInMemory(tmp_path):
+    buffers = PixelBuffers(10, str(tmp_path))
+    data = b"0123456789"
+    buffer = buffers.store(data)
+    assert not buffer.spilled
+    assert buffer.view() == data
+    assert (buffers.memoryBytes, buffers.spilledBytes) == (10, 0)
+    buffer.release()
+    assert buffers.memoryBytes == 0
+    assert buffers.peakMemoryBytes == 10
+
+
+def test_buffersOverTheLimitSpill(tmp_path):
+    buffers = PixelBuffers(4, str(tmp_path), segment_size=16)
+    kept = buffers.store(b"abcd")
+    first = buffers.store(b"0123456789")
+    second = buffers.store(bytearray(b"ABCDEF"))
+    assert not kept.spilled and first.spilled and second.spilled
+    assert first.view() == b"0123456789" and second.view() == b"ABCDEF"
+    assert (buffers.memoryBytes, buffers.spilledBytes) == (4, 16)
+    # Both fill one segment, the next spill needs another
+    assert first._segment is second._segment
+    third = buffers.store(b"xyz")
+    assert third._segment is not first._segment
+    assert third.view() == b"xyz"
+    buffers.close()
+    assert buffers.memoryBytes == 0
+
+
+def test_theLastReleaseFreesABuffer(tmp_path):
+    buffers = PixelBuffers(0, str(tmp_path), segment_size=16)
+    buffer = buffers.store(b"pixels")
+    segment = buffer._segment
+    assert buffer.retain() is buffer
+    buffer.release()
+    assert buffer.view() == b"pixels"
+    buffer.release()
+    assert buffer.refs == 0 and not buffer.spilled
+    # The current segment is emptied and used again
+    assert segment.used == 0 and segment.live == 0
+    assert buffers.store(b"again")._segment is segment
+
+
+def test_fullSegmentsAreClosedWithTheirLastBuffer(tmp_path):
+    buffers = PixelBuffers(0, str(tmp_path), segment_size=8)
+    first = buffers.store(b"12345678")
+    second = buffers.store(b"abc")
+    assert len(buffers._segments) == 2
+    first.release()
+    assert buffers._segments == {second._segment}
+    assert first._segment is None
+    second.release()
+    buffers.close()
+    assert buffers._segments == set()
+
+
+def test_emptyBuffersAreNeverSpilled(tmp_path):
+    buffers = PixelBuffers(0, str(tmp_path))
+    buffer = buffers.store(b"")
+    assert not buffer.spilled and len(buffer.view()) == 0
+
+
+def test_spilledCapturesExportTheSamePixels(makeDocker, runExport, tmp_path, layerColor):
+    document = Document(Node("root", "grouplayer", [Node("A", color=1), Node("B", color=2)]), 64, 32)
+    docker = makeDocker(document)
+    docker.exportLayersSeparatelyCheckBox.setChecked(True)
+    docker.parallelEncodingCheckBox.setChecked(True)
+    docker.pixelMemorySpinBox.setValue(0)
+    assert runExport(docker).startswith("Exported")
+    # Spill files are temporary and leave nothing behind
+    assert sorted(os.listdir(tmp_path)) == ["A.png", "B.png"]
+    for name, color in [("A.png", 1), ("B.png", 2)]:
+        assert QImage(str(tmp_path / name)).pixelColor(63, 31).getRgb()[:3] == layerColor(color)
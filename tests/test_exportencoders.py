@@ -0,0 +1,113 @@
+# Quick Export Plugin for Krita
+# Based on Quick Export Layers Docker by fullmontis (public domain)
+
+import os
+import struct
+
+import pytest
+from PyQt5.QtGui import QImage
+
+from krita import Document, Node
+from quickexportdocker.exportencoders import (atomicOutput, canEncodeRaw, encodeImage, npyHeader, pixelBytes,
+                                              pixelFileChunks, rawHeader)
+
+# Two pixels in Krita's byte order: opaque red, then half transparent blue
+BGRA = bytes([0, 0, 255, 255, 255, 0, 0, 0])
+
+
+def test_rawHeaderIsSixteenBytes():
+    header = rawHeader(640, 480, 4)
+    assert len(header) == 16
+    assert struct.unpack("<4sHHII", header) == (b"QEXR", 1, 4, 640, 480)
+
+
+def test_npyDataStartsOnSixtyFourBytes():
+    for width in [1, 10, 1000, 100000]:
+        header = npyHeader(width, 3, 4)
+        assert len(header) % 64 == 0
+        assert header.startswith(b"\x93NUMPY\x01\x00")
+        assert header.endswith(b"\n")
+        assert f"'shape': (3, {width}, 4)".encode() in header
+
+
+def test_npyFilesLoadWithNumpy(tmp_path):
+    numpy = pytest.importorskip("numpy")
+    path = tmp_path / "out.npy"
+    path.write_bytes(b"".join(pixelFileChunks(BGRA * 3, 2, 3, "NPY", {"alpha": True})))
+    array = numpy.load(str(path))
+    assert array.shape == (3, 2, 4) and array.dtype == numpy.uint8
+    assert array[2, 0].tolist() == [255, 0, 0, 255]
+    assert array[2, 1].tolist() == [0, 0, 255, 0]
+
+
+def test_pixelBytesAreRgba():
+    assert bytes(pixelBytes(BGRA, 2, 1)) == bytes([255, 0, 0, 255, 0, 0, 255, 0])
+    # The buffer Krita gave is left alone
+    assert BGRA == bytes([0, 0, 255, 255, 255, 0, 0, 0])
+
+
+def test_pixelBytesWithoutAlphaAreFlattened():
+    assert bytes(pixelBytes(BGRA, 2, 1, alpha=False, fill_color=(0, 255, 0))) == \
+        bytes([255, 0, 0, 0, 255, 0])
+
+
+def test_rawFilesHaveHeaderAndRows():
+    header, pixels = pixelFileChunks(BGRA, 2, 1, "RAW", {"alpha": False})
+    assert struct.unpack("<4sHHII", header)[2:] == (3, 2, 1)
+    assert bytes(pixels) == bytes([255, 0, 0, 255, 255, 255])
+
+
+def test_pngAndJpegKeepThePixels(tmp_path):
+    for name, properties in [("out.png", {"alpha": True, "compression": 1}), ("out.jpg", {"quality": 100})]:
+        path = str(tmp_path / name)
+        assert encodeImage(BGRA[:4] * 128, 16, 8, path, name[-3:], properties) > 0
+        image = QImage(path)
+        assert (image.width(), image.height()) == (16, 8)
+        red, green, blue, _ = image.pixelColor(0, 0).getRgb()
+        assert red > 240 and green < 15 and blue < 15
+
+
+def test_onlyEightBitSrgbDocumentsAreEncodedRaw(monkeypatch):
+    document = Document(Node("root", "grouplayer", [Node("A")]), 10, 10)
+    assert canEncodeRaw(document, "PNG") and canEncodeRaw(document, "raw")
+    assert not canEncodeRaw(document, "jxl")
+    assert not canEncodeRaw(document, "jpg", {"subsampling": 3})
+    assert canEncodeRaw(document, "jpg", {"subsampling": 1, "quality": 80})
+
+    monkeypatch.setattr(Document, "colorProfile", lambda self: "Rec2020-elle-V4-g10.icc")
+    assert not canEncodeRaw(document, "png")
+    assert canEncodeRaw(document, "npy")
+    monkeypatch.setattr(Document, "colorDepth", lambda self: "U16")
+    assert not canEncodeRaw(document, "npy")
+
+
+def test_atomicOutputReplacesTheOldFile(tmp_path):
+    path = tmp_path / "a.png"
+    path.write_bytes(b"old")
+    with atomicOutput(str(path)) as partPath:
+        assert os.path.dirname(partPath) == str(tmp_path)
+        assert partPath.endswith(".png")
+        with open(partPath, "wb") as f:
+            f.write(b"new")
+        assert path.read_bytes() == b"old"
+    assert path.read_bytes() == b"new"
+    assert os.listdir(tmp_path) == ["a.png"]
+
+
+def test_atomicOutputKeepsTheOldFileOnErrors(tmp_path):
+    path = tmp_path / "a.png"
+    path.write_bytes(b"old")
+    with pytest.raises(ValueError):
+        with atomicOutput(str(path)) as partPath:
+            with open(partPath, "wb") as f:
+                f.write(b"half")
+            raise ValueError("encoder failed")
+    assert os.listdir(tmp_path) == ["a.png"]
+    assert path.read_bytes() == b"old"
+
+
+def test_atomicOutputFailsWhenNothingWasWritten(tmp_path):
+    with pytest.raises(IOError):
+        with atomicOutput(str(tmp_path / "a.png")):
+            pass
+    assert os.listdir(tmp_path) == []
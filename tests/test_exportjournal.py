@@ -0,0 +1,50 @@
+# Quick Export Plugin for Krita
+# Based on Quick Export Layers Docker by fullmontis (public domain)
+
+import os
+
+from quickexportdocker.exportjournal import ExportJournal
+
+
+def test_finishedOutputsAreReadBack(tmp_path):
+    journal = ExportJournal(str(tmp_path), "drawing")
+    journal.open()
+    journal.record("a.png", "f1")
+    journal.record(os.path.join("Group", "b.png"), "f2")
+    journal.record("a.png", "f3")
+    # Read back while the export is still running, like after a crash
+    assert ExportJournal(str(tmp_path), "drawing").load() == {"a.png": "f3", "Group/b.png": "f2"}
+    journal.close(False)
+
+
+def test_aLineCutShortIsIgnored(tmp_path):
+    journal = ExportJournal(str(tmp_path), "drawing")
+    journal.open()
+    journal.record("a.png", "f1")
+    journal.close(False)
+    with open(journal.path, "a", encoding="utf-8") as f:
+        f.write('{"path": "b.png", "finger')
+    assert journal.load() == {"a.png": "f1"}
+
+
+def test_everyExportNameHasItsOwnJournal(tmp_path):
+    journal = ExportJournal(str(tmp_path), "Sky/Sea")
+    assert os.path.dirname(journal.path) == str(tmp_path)
+    assert os.path.basename(journal.path) == ".quickexport-journal-Sky_Sea.jsonl"
+    assert ExportJournal(str(tmp_path), "other").path != journal.path
+
+
+def test_onlyUnfinishedExportsKeepTheirJournal(tmp_path):
+    journal = ExportJournal(str(tmp_path), "drawing")
+    journal.open()
+    journal.record("a.png", "f1")
+    journal.close(False)
+    assert os.path.exists(journal.path)
+    # Nothing is logged after closing
+    journal.record("b.png", "f2")
+    assert journal.load() == {"a.png": "f1"}
+
+    journal.open()
+    journal.close(True)
+    assert os.listdir(tmp_path) == []
+    assert journal.load() == {}
@@ -0,0 +1,101 @@
+# Quick Export Plugin for Krita
+# Based on Quick Export Layers Docker by fullmontis (public domain)
+
+import json
+
+from krita import Document, Node
+from quickexportdocker.exportmanifest import ExportManifest
+
+
+def fingerprint(**changes):
+    settings = dict(pixel_hash="abc", bounds=(0, 0, 10, 10), target_size=(10, 10), file_format="PNG",
+                    properties={"alpha": True}, resolution=300)
+    settings.update(changes)
+    return ExportManifest.fingerprint(**settings)
+
+
+def test_recordedOutputsSurviveASave(tmp_path):
+    (tmp_path / "a.png").write_bytes(b"png")
+    manifest = ExportManifest(str(tmp_path)).load()
+    manifest.record("a.png", "f1", bytes=3)
+    manifest.save()
+
+    loaded = ExportManifest(str(tmp_path)).load()
+    assert loaded.isUpToDate("a.png", "f1")
+    assert not loaded.isUpToDate("a.png", "f2")
+    data = json.loads((tmp_path / ExportManifest.FILENAME).read_text())
+    assert data == {"version": 1, "outputs": {"a.png": {"fingerprint": "f1", "bytes": 3}}}
+
+
+def test_anOutputMustStillExist(tmp_path):
+    manifest = ExportManifest(str(tmp_path)).load()
+    manifest.record("missing.png", "f1")
+    assert not manifest.isUpToDate("missing.png", "f1")
+
+
+def test_pathsAreNormalized(tmp_path):
+    (tmp_path / "Group").mkdir()
+    (tmp_path / "Group" / "a.png").write_bytes(b"png")
+    manifest = ExportManifest(str(tmp_path)).load()
+    manifest.record("Group/./a.png", "f1")
+    assert manifest.isUpToDate("Group/a.png", "f1")
+
+
+def test_forgottenOutputsAreDroppedOnSave(tmp_path):
+    (tmp_path / "a.png").write_bytes(b"png")
+    manifest = ExportManifest(str(tmp_path)).load()
+    manifest.record("a.png", "f1")
+    manifest.save()
+    manifest.forget("a.png")
+    assert not manifest.isUpToDate("a.png", "f1")
+    manifest.save()
+    assert ExportManifest(str(tmp_path)).load()._entries == {}
+
+
+def test_savingKeepsEntriesWrittenByOtherExports(tmp_path):
+    first = ExportManifest(str(tmp_path)).load()
+    second = ExportManifest(str(tmp_path)).load()
+    first.record("a.png", "f1")
+    first.save()
+    second.record("b.png", "f2")
+    second.save()
+    assert set(ExportManifest(str(tmp_path)).load()._entries) == {"a.png", "b.png"}
+
+
+def test_anUnreadableManifestStartsEmpty(tmp_path):
+    (tmp_path / ExportManifest.FILENAME).write_text("{not json")
+    assert ExportManifest(str(tmp_path)).load()._entries == {}
+    (tmp_path / ExportManifest.FILENAME).write_text('{"version": 0, "outputs": {"a.png": {}}}')
+    assert ExportManifest(str(tmp_path)).load()._entries == {}
+
+
+def test_nothingIsWrittenWithoutRecords(tmp_path):
+    ExportManifest(str(tmp_path)).load().save()
+    assert not (tmp_path / ExportManifest.FILENAME).exists()
+
+
+def test_fingerprintsChangeWithEveryInput():
+    base = fingerprint()
+    assert fingerprint() == base
+    assert fingerprint(file_format="png") == base
+    for changes in [{"pixel_hash": "abd"}, {"bounds": (1, 0, 10, 10)}, {"target_size": (5, 5)},
+                    {"file_format": "JPEG"}, {"properties": {"alpha": False}}, {"resolution": 72},
+                    {"crop": (0, 0, 5, 5)}]:
+        assert fingerprint(**changes) != base, changes
+
+
+def test_hashPixelsTakesAnyBuffer():
+    assert ExportManifest.hashPixels(b"abc") == ExportManifest.hashPixels(memoryview(b"abc"))
+    assert ExportManifest.hashPixels(b"abc") != ExportManifest.hashPixels(b"abd")
+
+
+def test_unchangedLayersAreSkipped(makeDocker, runExport, tmp_path):
+    document = Document(Node("root", "grouplayer", [Node("A", color=1), Node("B", color=2)]), 64, 32)
+    docker = makeDocker(document)
+    docker.exportLayersSeparatelyCheckBox.setChecked(True)
+    docker.skipUnchangedCheckBox.setChecked(True)
+    assert "skipped" not in runExport(docker)
+    assert "(2 unchanged files skipped)" in runExport(docker)
+
+    document.rootNode().childNodes()[1]._color = 3
+    assert "(1 unchanged files skipped)" in runExport(docker)
@@ -0,0 +1,106 @@
+# Quick Export Plugin for Krita
+# Based on Quick Export Layers Docker by fullmontis (public domain)
+
+import os
+
+from PyQt5.QtCore import QRect
+
+from krita import Document, Node
+from quickexportdocker.exportplan import buildExportPlan, cropRect
+
+
+def row(file_format="PNG", width=100, height=50, transparency=True, **settings):
+    return dict(settings, format=file_format, width=width, height=height, transparency=transparency)
+
+
+def makeDocument(*layers):
+    return Document(Node("root", "grouplayer", list(layers)), 100, 50)
+
+
+def plan(document, rows, **options):
+    return buildExportPlan(document.rootNode(), "drawing", "", document.width(), document.height(),
+                           300, rows, options)
+
+
+def test_wholeDocumentIsOneFilePerRow():
+    document = makeDocument(Node("A"))
+    exportPlan = plan(document, [row(), row("JPEG")])
+    assert [job.relativePath for job in exportPlan.jobs] == ["drawing.png", "drawing.jpg"]
+    assert exportPlan.summaryNames == ("drawing.png", "drawing.jpg")
+    assert all(job.node is document.rootNode() and job.crop is None for job in exportPlan.jobs)
+
+
+def test_repeatedFormatAndScaledRowsGetThePPIInTheName():
+    document = makeDocument(Node("A"))
+    exportPlan = plan(document, [row(), row(width=50, height=25)])
+    assert [job.relativePath for job in exportPlan.jobs] == ["drawing_300ppi.png", "drawing_150ppi.png"]
+    assert [job.scaled for job in exportPlan.jobs] == [False, True]
+
+
+def test_jobsAreOrderedFromTheLargestSize():
+    document = makeDocument(Node("A"))
+    exportPlan = plan(document, [row(width=20, height=10), row(width=100, height=50),
+                                 row("JPEG", width=50, height=25)])
+    assert [job.width for job in exportPlan.jobs] == [100, 50, 20]
+
+
+def test_layersSeparatelyWritesGroupsIntoFolders():
+    document = makeDocument(Node("Back"),
+                            Node("Group", "grouplayer", [Node("Inner"), Node("Hidden", visible=False)]),
+                            Node("Blur", "filterlayer"),
+                            Node("Logo [jpg]"))
+    exportPlan = plan(document, [row()], layersSeparately=True, groupAsLayer=False)
+    assert [job.relativePath for job in exportPlan.jobs] == [
+        "Back.png", os.path.join("Group", "Inner.png"), "Logo [jpg].jpg"]
+    assert exportPlan.directories == ("Group",)
+
+
+def test_groupAsLayerAndHiddenLayersCanBeKept():
+    document = makeDocument(Node("Group", "grouplayer", [Node("Inner")]), Node("Hidden", visible=False))
+    exportPlan = plan(document, [row()], layersSeparately=True, ignoreInvisibleLayers=False)
+    assert [job.relativePath for job in exportPlan.jobs] == ["Group.png", "Hidden.png"]
+
+
+def test_cropToContentSkipsEmptyLayers():
+    document = makeDocument(Node("Part", bounds=(10, 10, 20, 10)), Node("Outside", bounds=(200, 0, 10, 10)))
+    exportPlan = plan(document, [row(), row(width=50, height=25)],
+                      layersSeparately=True, cropToContent=True, cropPadding=1)
+    assert [(job.filename, job.crop) for job in exportPlan.jobs] == [
+        ("Part", (9, 9, 22, 12)), ("Part", (4, 4, 12, 7))]
+    assert exportPlan.jobs[0].outputSize == (22, 12)
+    assert exportPlan.totalPixels() == 22 * 12 + 12 * 7
+
+
+def test_rowSettingsGoIntoTheProperties():
+    document = makeDocument(Node("A"))
+    png, jpg = plan(document, [row(transparency=False, profile="fast"), row("JPEG", maxSize=100)]).jobs
+    assert png.properties["alpha"] is False
+    assert png.properties["compression"] == 1
+    assert png.profile == "fast"
+    assert jpg.properties["maxBytes"] == 100 * 1024
+    assert jpg.estimatedBytes <= 100 * 1024
+
+
+def test_collisionsAreFoundIgnoringCase():
+    document = makeDocument(Node("Sky"), Node("sky"), Node("Sea"))
+    exportPlan = plan(document, [row()], layersSeparately=True)
+    collisions = exportPlan.collisions()
+    assert [[job.filename for job in jobs] for jobs in collisions] == [["Sky", "sky"]]
+    assert "1 output paths are written more than once" in exportPlan.dryRunReport()
+
+
+def test_cropRectScalesOutwardsAndClips():
+    assert cropRect(QRect(10, 10, 21, 11), 100, 50, 50, 25) == (5, 5, 11, 6)
+    assert cropRect(QRect(-5, 40, 20, 20), 100, 50, 100, 50, padding=2) == (0, 38, 17, 12)
+
+
+def test_cropRectIsNoneWithoutVisiblePixels():
+    assert cropRect(QRect(), 100, 50, 100, 50) is None
+    assert cropRect(QRect(120, 0, 10, 10), 100, 50, 100, 50) is None
+
+
+def test_layoutListsEveryOutputInItsCanvas():
+    document = makeDocument(Node("Part", bounds=(10, 10, 20, 10)))
+    layout = plan(document, [row()], layersSeparately=True, cropToContent=True).layout()
+    assert layout["outputs"] == [{"file": "Part.png", "layer": "Part", "x": 10, "y": 10,
+                                  "width": 20, "height": 10, "canvasWidth": 100, "canvasHeight": 50}]
@@ -0,0 +1,78 @@
+# Quick Export Plugin for Krita
+# Based on Quick Export Layers Docker by fullmontis (public domain)
+
+import os
+
+from PyQt5.QtGui import QImage
+
+import krita
+from krita import Document, Node
+from quickexportdocker.exportsession import linkOrCopyFile
+
+
+def makeDocument(*layers, width=64, height=32):
+    return Document(Node("root", "grouplayer", list(layers)), width, height)
+
+
+def test_parallelEncodingWritesTheLayerPixels(makeDocker, runExport, tmp_path, layerColor):
+    docker = makeDocker(makeDocument(Node("A", color=1), Node("B", color=2, bounds=(8, 4, 16, 8))))
+    docker.exportLayersSeparatelyCheckBox.setChecked(True)
+    docker.parallelEncodingCheckBox.setChecked(True)
+    docker.cropToContentCheckBox.setChecked(True)
+    docker.addFormatRow()
+    docker._formatRows[1].widthInput.setText("32")
+    docker._formatRows[1].widthInput.editingFinished.emit()
+    docker._formatRows[1].setFormatIndex(1)
+
+    assert runExport(docker).startswith("Exported")
+    # Cropped layers also get a layout file with their place on the canvas
+    assert sorted(os.listdir(tmp_path)) == ["A.jpg", "A.png", "B.jpg", "B.png", "benchmark_layout.json"]
+    for name, size, color in [("A.png", (64, 32), 1), ("B.png", (16, 8), 2), ("B.jpg", (8, 4), 2)]:
+        image = QImage(str(tmp_path / name))
+        assert (image.width(), image.height()) == size
+        pixel = image.pixelColor(0, 0).getRgb()[:3]
+        assert all(abs(a - b) <= 2 for a, b in zip(pixel, layerColor(color))), name
+    # Nothing went through Krita's exporter
+    assert "save" not in krita.CALLS
+
+
+def test_otherFormatsGoThroughKritasExporter(makeDocker, runExport, tmp_path):
+    docker = makeDocker(makeDocument(Node("A")))
+    docker._formatRows[0].setFormatIndex(2)
+    assert runExport(docker).startswith("Exported")
+    assert krita.CALLS["save"] == 1
+    assert os.listdir(tmp_path) == ["benchmark.jxl"]
+
+
+def test_aFailedOutputFailsTheExport(makeDocker, runExport, tmp_path, monkeypatch):
+    monkeypatch.setattr(Node, "save", lambda self, *args: True)
+    docker = makeDocker(makeDocument(Node("A")))
+    docker._formatRows[0].setFormatIndex(2)
+    assert runExport(docker).startswith("Export failed")
+    assert os.listdir(tmp_path) == []
+
+
+def test_linkOrCopyFileReplacesTheTarget(tmp_path):
+    source, target = tmp_path / "a.png", tmp_path / "b.png"
+    source.write_bytes(b"new")
+    target.write_bytes(b"old")
+    assert linkOrCopyFile(str(source), str(target)) == 3
+    assert os.path.samefile(str(source), str(target))
+    linkOrCopyFile(str(source), str(target), hardlink=False)
+    assert not os.path.samefile(str(source), str(target))
+    assert target.read_bytes() == b"new"
+
+
+def test_identicalLayersAreEncodedOnce(makeDocker, runExport, tmp_path):
+    for index, sameFile in [(1, True), (2, False)]:
+        document = makeDocument(Node("A", color=5), Node("B", color=5), Node("C", color=6))
+        docker = makeDocker(document)
+        docker.exportLayersSeparatelyCheckBox.setChecked(True)
+        docker.parallelEncodingCheckBox.setChecked(True)
+        docker.dedupeComboBox.setCurrentIndex(index)
+        message = runExport(docker)
+        assert "(1 identical files" in message, message
+
+        first, second, other = (str(tmp_path / name) for name in ["A.png", "B.png", "C.png"])
+        assert os.path.samefile(first, second) == sameFile
+        assert open(first, "rb").read() == open(second, "rb").read() != open(other, "rb").read()
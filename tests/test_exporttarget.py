@@ -0,0 +1,98 @@
+# Quick Export Plugin for Krita
+# Based on Quick Export Layers Docker by fullmontis (public domain)
+
+import os
+
+from krita import Document, Node
+from quickexportdocker.exporttarget import (MIN_QUALITY, QualityCache, hasTargetSize, proxySize,
+                                            qualityProperties, searchQuality)
+
+
+def fakeEncoder(bytes_per_quality=10):
+    """An encode() whose size grows with the quality, recording what it was asked"""
+    calls = []
+
+    def encode(quality):
+        calls.append(quality)
+        return quality * bytes_per_quality, f"q{quality}"
+    return encode, calls
+
+
+def test_theSearchFindsTheHighestFittingQuality():
+    encode, calls = fakeEncoder()
+    assert searchQuality(encode, 555) == (55, "q55", True)
+    assert len(calls) == len(set(calls)) <= 8
+
+
+def test_aGoodGuessTakesTwoEncodes():
+    encode, calls = fakeEncoder()
+    assert searchQuality(encode, 555, guess=55) == (55, "q55", True)
+    assert calls == [55, 56]
+    encode, calls = fakeEncoder()
+    assert searchQuality(encode, 545, guess=55) == (54, "q54", True)
+    assert calls == [55, 54]
+
+
+def test_aBadGuessStillFindsTheQuality():
+    encode, calls = fakeEncoder()
+    assert searchQuality(encode, 555, guess=90)[0] == 55
+    encode, calls = fakeEncoder()
+    assert searchQuality(encode, 555, guess=5)[0] == 55
+    assert searchQuality(fakeEncoder()[0], 2000, guess=100) == (100, "q100", True)
+
+
+def test_whenNothingFitsTheLowestQualityIsReturned():
+    encode, calls = fakeEncoder()
+    assert searchQuality(encode, 1) == (MIN_QUALITY, f"q{MIN_QUALITY}", False)
+    assert searchQuality(fakeEncoder()[0], 1, guess=50) == (MIN_QUALITY, f"q{MIN_QUALITY}", False)
+
+
+def test_onlyLargeImagesGetAProxy():
+    assert proxySize(512, 512) is None
+    assert proxySize(700, 700) is None
+    width, height = proxySize(4000, 2000)
+    assert abs(width * height - 512 * 512) < 2000
+    assert abs(width / height - 2) < 0.01
+    assert proxySize(2000000, 1)[1] == 1
+
+
+def test_qualityGoesIntoTheFormatsSetting():
+    assert qualityProperties("jpg", {"quality": 100, "maxBytes": 5}, 70) == {"quality": 70, "maxBytes": 5}
+    assert qualityProperties("jxl", {}, 70) == {"lossyQuality": 70}
+    assert hasTargetSize("jpg", {"maxBytes": 5})
+    assert not hasTargetSize("jpg", {"maxBytes": 0})
+    assert not hasTargetSize("png", {"maxBytes": 5})
+
+
+def test_qualitiesSurviveJson():
+    cache = QualityCache()
+    cache.set("a", 80)
+    assert QualityCache.fromJson(cache.toJson()).get("a") == 80
+    assert QualityCache.fromJson("").get("a") is None
+    assert QualityCache.fromJson("[1, 2]").get("a") is None
+    assert QualityCache.fromJson("{broken").get("a") is None
+
+
+def test_theOldestQualitiesAreDropped(monkeypatch):
+    monkeypatch.setattr(QualityCache, "MAX_ENTRIES", 3)
+    cache = QualityCache()
+    for key in "abcd":
+        cache.set(key, 50)
+    cache.set("b", 60)
+    cache.set("e", 70)
+    assert [cache.get(key) for key in "abcde"] == [None, 60, None, 50, 70]
+
+
+def test_filesOverTheirLimitAreStillWritten(makeDocker, runExport, tmp_path):
+    # A stub layer is one solid colour, its JPEG is about as big at every quality
+    docker = makeDocker(Document(Node("root", "grouplayer", [Node("A")]), 1024, 1024))
+    docker.parallelEncodingCheckBox.setChecked(True)
+    docker._formatRows[0].setFormatIndex(1)
+    docker._formatRows[0].maxSizeInput.setText("7")
+    message = runExport(docker)
+    assert message.startswith("Exported") and "over their size limit" not in message
+    assert os.path.getsize(str(tmp_path / "benchmark.jpg")) <= 7 * 1024
+
+    docker._formatRows[0].maxSizeInput.setText("1")
+    assert "(1 files over their size limit" in runExport(docker)
+    assert os.path.getsize(str(tmp_path / "benchmark.jpg")) > 1024
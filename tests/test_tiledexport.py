@@ -0,0 +1,74 @@
+# Quick Export Plugin for Krita
+# Based on Quick Export Layers Docker by fullmontis (public domain)
+
+import os
+
+import pytest
+from PyQt5.QtGui import QColor, QImage
+
+from krita import Document, Node
+from quickexportdocker.tiledexport import PngStreamWriter, exportTiled, levelSize, pyramidLevelCount
+
+
+def test_streamedRowsMakeAValidPng(tmp_path):
+    path = str(tmp_path / "out.png")
+    writer = PngStreamWriter(path, 3, 2, alpha=True, pixels_per_meter=11811)
+    writer.writeRows(bytes([255, 0, 0, 255, 0, 255, 0, 128, 0, 0, 255, 0]), 1)
+    writer.writeRows(bytes([10, 20, 30, 255] * 3), 1)
+    writer.close()
+
+    image = QImage(path)
+    assert (image.width(), image.height()) == (3, 2)
+    assert image.pixelColor(0, 0) == QColor(255, 0, 0, 255)
+    assert image.pixelColor(1, 0).alpha() == 128
+    assert image.pixelColor(2, 1) == QColor(10, 20, 30, 255)
+    assert image.dotsPerMeterX() == 11811
+    assert os.listdir(tmp_path) == ["out.png"]
+
+
+def test_rgbRowsHaveNoAlpha(tmp_path):
+    path = str(tmp_path / "out.png")
+    writer = PngStreamWriter(path, 2, 1, alpha=False)
+    writer.writeRows(bytes([1, 2, 3, 4, 5, 6]), 1)
+    writer.close()
+    image = QImage(path)
+    assert not image.hasAlphaChannel()
+    assert image.pixelColor(1, 0) == QColor(4, 5, 6)
+
+
+def test_missingRowsLeaveNoFile(tmp_path):
+    path = str(tmp_path / "out.png")
+    (tmp_path / "out.png").write_bytes(b"old")
+    writer = PngStreamWriter(path, 2, 2)
+    writer.writeRows(bytes(8), 1)
+    with pytest.raises(IOError):
+        writer.close()
+    assert os.listdir(tmp_path) == ["out.png"]
+    assert (tmp_path / "out.png").read_bytes() == b"old"
+
+
+def test_tiledExportMatchesTheLayer(app, tmp_path, layerColor):
+    node = Node("A", color=4)
+    Document(Node("root", "grouplayer", [node]), 300, 200)
+    path = str(tmp_path / "tiled.png")
+    steps = list(exportTiled(node, (0, 0, 300, 200), path, {"alpha": True, "compression": 1}, 72,
+                             tile_size=64, pyramid=True))
+    assert len(steps) == 4 + pyramidLevelCount(300, 200) - 1
+
+    image = QImage(path)
+    assert (image.width(), image.height()) == (300, 200)
+    assert image.pixelColor(299, 199).getRgb()[:3] == layerColor(4)
+    maxLevel = pyramidLevelCount(300, 200) - 1
+    assert sorted(os.listdir(tmp_path / "tiled_files" / str(maxLevel)))[:2] == ["0_0.png", "0_1.png"]
+    assert QImage(str(tmp_path / "tiled_files" / "0" / "0_0.png")).size().width() == \
+        levelSize(300, 200, 0, maxLevel)[0]
+    assert (tmp_path / "tiled.dzi").exists()
+
+
+def test_closingTheExportEarlyDeletesThePartialFile(app, tmp_path):
+    node = Node("A")
+    Document(Node("root", "grouplayer", [node]), 100, 100)
+    steps = exportTiled(node, (0, 0, 100, 100), str(tmp_path / "tiled.png"), {}, 72, tile_size=32)
+    next(steps)
+    steps.close()
+    assert os.listdir(tmp_path) == []